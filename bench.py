@@ -0,0 +1,314 @@
+"""
+Benchmarks for assemble, disassemble and roundtrip throughput.
+Run with: python3 bench.py --sizes 1000,100000 --output results.json
+
+Sources are synthesized deterministically from a seed, with a chosen
+R/I/J instruction mix and label density ('straight' puts a label every
+256 instructions, 'labels' every 4). Each benchmark reports wall time,
+instructions/sec and peak traced memory; edit-line and insert-line time
+one edit in an incremental session and decode-cache reports the
+disassembler's decode cache hit rate. Results are written as JSON and can
+be compared against an earlier run with --compare.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from mips import Assembler, Disassembler
+from mips.core import DECODE_CACHE_SIZE
+from mips.session import AssemblySession
+
+R_CHOICES = ['add', 'sub', 'and', 'or', 'xor', 'slt', 'sll', 'srl']
+I_CHOICES = ['addi', 'slti', 'lw', 'sw', 'lui', 'beq', 'bne']
+J_CHOICES = ['j', 'jal']
+REGISTER_CHOICES = ['$t0', '$t1', '$t2', '$t3', '$s0', '$s1', '$a0', '$v0', '$sp']
+
+SHAPES = {'straight': 256, 'labels': 4}
+
+# Wall-clock target for a one-shot CLI assemble of a tiny program
+STARTUP_BUDGET = 0.1
+
+# Subsystems the CLI must not load before a subcommand asks for them
+LAZY_MODULES = ['asyncio', 'concurrent.futures', 'multiprocessing', 'numpy', 'json',
+                'mips.batch', 'mips.cache', 'mips.server', 'mips.simulator', 'mips.profiler',
+                'mips.linker', 'mips.cfg', 'mips.formats', 'mips.search', 'mips.diff',
+                'mips.session']
+
+# Library users get the core only: 'import mips' must not load these either
+CLI_MODULES = ['argparse', 'mips.cli']
+
+DEFAULT_MIX = {'r': 0.5, 'i': 0.4, 'j': 0.1}
+
+
+def parse_mix(text):
+    """Parse 'r=0.5,i=0.4,j=0.1' into normalized weights"""
+    mix = dict(DEFAULT_MIX)
+    if text:
+        for part in text.split(','):
+            key, value = part.split('=')
+            mix[key.strip().lower()] = float(value)
+    total = sum(mix.values())
+    return {key: value / total for key, value in mix.items()}
+
+
+def synthesize_lines(count, shape='straight', mix=DEFAULT_MIX, seed=0):
+    """Yield `count` instructions of source with labels every SHAPES[shape] lines"""
+    rng = random.Random(seed)
+    spacing = SHAPES[shape]
+    label_count = max(1, (count + spacing - 1) // spacing)
+    reg = REGISTER_CHOICES
+    r_weight, i_weight = mix['r'], mix['r'] + mix['i']
+    for n in range(count):
+        prefix = f"L{n // spacing}: " if n % spacing == 0 else "    "
+        # Keep branch targets within the 16-bit word offset of a branch
+        here = n // spacing
+        reach = max(1, 30000 // spacing)
+        near = f"L{rng.randrange(max(0, here - reach), min(label_count, here + reach))}"
+        target = f"L{rng.randrange(label_count)}"
+        kind = rng.random()
+        if kind < r_weight:
+            name = rng.choice(R_CHOICES)
+            if name in ('sll', 'srl'):
+                operands = f"{rng.choice(reg)}, {rng.choice(reg)}, {rng.randrange(32)}"
+            else:
+                operands = f"{rng.choice(reg)}, {rng.choice(reg)}, {rng.choice(reg)}"
+        elif kind < i_weight:
+            name = rng.choice(I_CHOICES)
+            if name in ('lw', 'sw'):
+                operands = f"{rng.choice(reg)}, {4 * rng.randrange(-64, 64)}({rng.choice(reg)})"
+            elif name in ('beq', 'bne'):
+                operands = f"{rng.choice(reg)}, {rng.choice(reg)}, {near}"
+            elif name == 'lui':
+                operands = f"{rng.choice(reg)}, {rng.randrange(0x10000)}"
+            else:
+                operands = f"{rng.choice(reg)}, {rng.choice(reg)}, {rng.randrange(-32768, 32768)}"
+        else:
+            name = rng.choice(J_CHOICES)
+            operands = target
+        yield f"{prefix}{name} {operands}\n"
+
+
+def measure(func, count, memory=True):
+    """Time func() and optionally rerun it under tracemalloc for peak memory"""
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    result = {'seconds': seconds, 'instructions_per_sec': count / seconds if seconds else None}
+    if memory:
+        tracemalloc.start()
+        func()
+        result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def bench_paths(count, shape, mix, seed, memory=True):
+    """Benchmark assemble, disassemble and roundtrip on one synthesized program"""
+    source = ''.join(synthesize_lines(count, shape, mix, seed))
+    code = Assembler().assemble_text(source)
+    results = []
+
+    def assemble():
+        Assembler().assemble_text(source)
+
+    def disassemble():
+        Disassembler().disassemble_bytes(code)
+
+    def roundtrip():
+        lines = Disassembler().disassemble_bytes(Assembler().assemble_text(source))
+        if Assembler().assemble_lines(lines) != code:
+            raise AssertionError("Roundtrip mismatch")
+
+    for name, func in [('assemble', assemble), ('disassemble', disassemble),
+                       ('roundtrip', roundtrip)]:
+        entry = {'bench': name, 'instructions': count, 'shape': shape}
+        entry.update(measure(func, count, memory))
+        results.append(entry)
+    return results
+
+
+def bench_edits(count, shape, mix, seed):
+    """Time single-line edits in the middle and at the top of an incremental session"""
+    lines = list(synthesize_lines(count, shape, mix, seed))
+    session = AssemblySession(lines)
+    middle = count // 2
+    edits = [('edit-line', middle, middle + 1, ['    addi $t0, $t1, 5\n']),
+             ('insert-line', 1, 1, ['    add $t0, $t1, $t2\n'])]
+    results = []
+    for name, start, end, new_lines in edits:
+        begin = time.perf_counter()
+        session.edit(start, end, new_lines)
+        results.append({'bench': name, 'instructions': count, 'shape': shape,
+                        'seconds': time.perf_counter() - begin})
+    return results
+
+
+def bench_decode_cache(count, shape, mix, seed):
+    """Disassemble one synthesized program with and without the decode cache"""
+    code = Assembler().assemble_text(''.join(synthesize_lines(count, shape, mix, seed)))
+    uncached = measure(lambda: Disassembler().disassemble_bytes(code), count, False)
+    disassembler = Disassembler(cache_size=DECODE_CACHE_SIZE)
+    entry = {'bench': 'decode-cache', 'instructions': count, 'shape': shape,
+             'uncached_seconds': uncached['seconds']}
+    entry.update(measure(lambda: disassembler.disassemble_bytes(code), count, False))
+    entry.update(disassembler.cache.stats())
+    return entry
+
+
+def bench_startup(runs=5, budget=STARTUP_BUDGET):
+    """Median wall time of a one-shot CLI assemble of a tiny program"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source = os.path.join(tmpdir, 'tiny.asm')
+        with open(source, 'w') as f:
+            f.writelines(synthesize_lines(16))
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+        command = [sys.executable, script, 'assemble', source,
+                   os.path.join(tmpdir, 'tiny.bin'), '--no-cache']
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+            times.append(time.perf_counter() - start)
+    times.sort()
+    seconds = times[len(times) // 2]
+    return {'bench': 'startup', 'seconds': seconds, 'budget': budget,
+            'within_budget': seconds <= budget, 'imports': import_profile()}
+
+
+def import_profile(top=8):
+    """Slowest imports behind 'import mips.cli' from -X importtime, and any eager subsystems
+
+    'library' lists the CLI and subsystem modules that a plain 'import mips'
+    loads, which should be none.
+    """
+    code = (f"import sys, mips.cli; eager = [m for m in {LAZY_MODULES!r} if m in sys.modules]; "
+            "import json; print(json.dumps(eager))")
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          capture_output=True, text=True, check=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    modules = []
+    for line in proc.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[0].startswith('import time:'):
+            continue
+        try:
+            self_us = int(fields[0].split(':')[1])
+        except ValueError:
+            continue
+        modules.append({'module': fields[2].strip(), 'self_us': self_us,
+                        'cumulative_us': int(fields[1])})
+    modules.sort(key=lambda entry: -entry['self_us'])
+    code = (f"import sys, mips; eager = [m for m in {LAZY_MODULES + CLI_MODULES!r} if m in sys.modules]; "
+            "import json; print(json.dumps(eager))")
+    library = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                             check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    return {'slowest': modules[:top], 'eager': json.loads(proc.stdout),
+            'library': json.loads(library.stdout)}
+
+
+def result_key(entry):
+    return (entry['bench'], entry.get('instructions'), entry.get('shape'))
+
+
+def compare(results, baseline):
+    """Format a table of seconds relative to a baseline run"""
+    old = {result_key(entry): entry for entry in baseline['results']}
+    lines = [f"{'bench':<12} {'instructions':>12} {'shape':<9} {'old s':>9} {'new s':>9} {'change':>8}"]
+    for entry in results:
+        before = old.get(result_key(entry))
+        if before is None:
+            continue
+        change = (entry['seconds'] - before['seconds']) / before['seconds'] * 100
+        lines.append(f"{entry['bench']:<12} {entry.get('instructions') or '':>12} "
+                     f"{entry.get('shape') or '':<9} {before['seconds']:>9.4f} "
+                     f"{entry['seconds']:>9.4f} {change:>+7.1f}%")
+    return '\n'.join(lines)
+
+
+def format_result(entry):
+    rate = entry.get('instructions_per_sec')
+    peak = entry.get('peak_bytes')
+    parts = [f"{entry['bench']:<12}"]
+    if 'instructions' in entry:
+        parts.append(f"{entry['instructions']:>10} {entry['shape']:<9}")
+    parts.append(f"{entry['seconds']:>9.4f}s")
+    if rate:
+        parts.append(f"{rate:>12.0f} instr/s")
+    if 'hit_rate' in entry:
+        parts.append(f"({entry['hit_rate']:.1%} decode cache hits, "
+                     f"{entry['uncached_seconds']:.4f}s uncached)")
+    if 'budget' in entry:
+        verdict = 'within' if entry['within_budget'] else 'OVER'
+        parts.append(f"({verdict} {entry['budget']:.3f}s budget)")
+    if peak is not None:
+        parts.append(f"{peak / 1e6:>9.1f} MB peak")
+    return ' '.join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,100000',
+                        help='comma-separated instruction counts (up to 10M)')
+    parser.add_argument('--shapes', default='straight,labels', help='straight and/or labels')
+    parser.add_argument('--mix', help="instruction mix, e.g. 'r=0.5,i=0.4,j=0.1'")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    parser.add_argument('--startup-budget', type=float, default=STARTUP_BUDGET,
+                        help='fail if CLI startup exceeds this many seconds')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    startup = bench_startup(budget=args.startup_budget)
+    results = [startup]
+    print(format_result(startup))
+    for entry in startup['imports']['slowest']:
+        print(f"    import {entry['module']:<28} {entry['self_us'] / 1000:>7.2f} ms")
+    if startup['imports']['eager']:
+        print(f"    loaded eagerly: {', '.join(startup['imports']['eager'])}")
+    if startup['imports']['library']:
+        print(f"    loaded by 'import mips': {', '.join(startup['imports']['library'])}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        for shape in args.shapes.split(','):
+            for entry in bench_paths(size, shape, mix, args.seed, not args.no_memory):
+                print(format_result(entry))
+                results.append(entry)
+            for entry in bench_edits(size, shape, mix, args.seed):
+                print(format_result(entry))
+                results.append(entry)
+            entry = bench_decode_cache(size, shape, mix, args.seed)
+            print(format_result(entry))
+            results.append(entry)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'seed': args.seed,
+            'mix': mix,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            print()
+            print(compare(results, json.load(f)))
+    if not startup['within_budget'] or startup['imports']['eager'] or startup['imports']['library']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+"""
+Roundtrip fuzzer over the whole instruction encoding space.
+Run with: python3 fuzz.py --words 100000000 --jobs 0
+
+Two properties are checked, in batches generated from (seed, batch number)
+so any failure can be replayed:
+
+- words: random canonical words for every instruction (fields its syntax
+  does not show are zero), placed at a random base address, disassemble
+  and reassemble to the same words
+- source: random source lines for every instruction, with register
+  aliases, decimal and hex immediates and labels, assemble, disassemble
+  and reassemble to the same words
+
+A batch is checked whole: its disassembly is reassembled with one
+assemble_lines call and compared as bytes, and only batches that differ
+are examined word by word. Failing words are minimized by clearing bits
+while the failure persists. Batches run in a process pool and the run
+reports words/sec.
+"""
+
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+
+from mips.core import (I_TYPE_INSTRUCTIONS, IMMEDIATE_RANGES, J_TYPE_INSTRUCTIONS,
+                       R_TYPE_INSTRUCTIONS, REGISTERS, SPECIAL_INSTRUCTIONS, Assembler,
+                       AssemblyError, Disassembler, OPCODE_DECODERS, tokenize_line,
+                       words_to_bytes)
+from mips.diff import changed_runs
+
+RS, RT, RD, SHAMT = 0x1F << 21, 0x1F << 16, 0x1F << 11, 0x1F << 6
+IMM = 0xFFFF
+TARGET = 0x03FFFFFF
+
+# Branch offsets are relative to the word index, so batches sit at
+# multiples of 2^18 bytes, where absolute branch targets decoded at the
+# base address re-encode to the same 16-bit offset when assembled from 0
+BASE_ALIGN = 1 << 18
+
+# Fields that are set to an edge value (zero, all ones, only or all but
+# the top bit) in a quarter of the words, so rare encodings like an srl
+# with every field zero come up
+EDGE_FIELDS = [RS, RT, RD, SHAMT, IMM]
+
+DEFAULT_BATCH = 1 << 16
+
+# Failures kept per instruction in a report
+MAX_EXAMPLES = 3
+
+REGISTER_NAMES = sorted(REGISTERS)
+
+
+def word_templates():
+    """(mnemonic, fixed bits, free bits) for every instruction"""
+    templates = []
+    for name, info in R_TYPE_INSTRUCTIONS.items():
+        if name in ('sll', 'srl'):
+            free = RT | RD | SHAMT
+        elif name == 'jr':
+            free = RS
+        else:
+            free = RS | RT | RD
+        templates.append((name, (info['opcode'] << 26) | info['funct'], free))
+    for name, info in I_TYPE_INSTRUCTIONS.items():
+        templates.append((name, info['opcode'] << 26, RS | RT | IMM))
+    for name, info in J_TYPE_INSTRUCTIONS.items():
+        templates.append((name, info['opcode'] << 26, TARGET))
+    templates.append(('lui', SPECIAL_INSTRUCTIONS['lui']['opcode'] << 26, RT | IMM))
+    templates.append(('nop', 0, 0))
+    return templates
+
+
+TEMPLATES = word_templates()
+
+
+EDGE_VALUES = [(field, [0, field, 1 << (field.bit_length() - 1),
+                         field & ~(1 << (field.bit_length() - 1))]) for field in EDGE_FIELDS]
+
+
+def random_words(rng, count):
+    """count random canonical words, instructions chosen uniformly"""
+    templates = TEMPLATES
+    choice = rng.choice
+    bits = rng.getrandbits
+    words = []
+    for _ in range(count):
+        name, fixed, free = choice(templates)
+        value = bits(32)
+        if not bits(2):
+            for field, values in EDGE_VALUES:
+                if bits(1):
+                    value = (value & ~field) | choice(values)
+        words.append(fixed | (value & free))
+    return words
+
+
+def random_base(rng, count):
+    """A BASE_ALIGN-aligned address with room for count words below 2^32, often 0 or the top"""
+    top = ((1 << 32) - 4 * count) // BASE_ALIGN * BASE_ALIGN
+    return rng.choice([0, top, rng.randrange(0, top + 1, BASE_ALIGN)])
+
+
+def random_register(rng):
+    return rng.choice(REGISTER_NAMES)
+
+
+def number_text(rng, value):
+    """value in decimal or hex"""
+    if rng.random() < 0.5:
+        return str(value)
+    return f"-0x{-value:x}" if value < 0 else f"0x{value:x}"
+
+
+def random_line(rng, n, count, labels):
+    """Source for a random instruction at word n of count, labels every 8 words"""
+    name = rng.choice(TEMPLATES)[0]
+    if name in ('add', 'sub', 'and', 'or', 'xor', 'slt'):
+        operands = [random_register(rng), random_register(rng), random_register(rng)]
+    elif name in ('addi', 'slti', 'sll', 'srl'):
+        operands = [random_register(rng), random_register(rng),
+                    number_text(rng, rng.randint(*IMMEDIATE_RANGES[name]))]
+    elif name == 'jr':
+        operands = [random_register(rng)]
+    elif name in ('lw', 'sw'):
+        offset = number_text(rng, rng.randint(*IMMEDIATE_RANGES[name]))
+        operands = [random_register(rng), f"{offset}({random_register(rng)})"]
+    elif name == 'lui':
+        operands = [random_register(rng), number_text(rng, rng.randint(*IMMEDIATE_RANGES[name]))]
+    elif name in ('beq', 'bne'):
+        if rng.random() < 0.5:
+            target = f"L{rng.randrange(labels)}"
+        else:
+            # Any word whose offset from the branch fits in 16 bits
+            target = number_text(rng, 4 * rng.randint(max(0, n - 0x7FFF), n + 0x8000))
+        operands = [random_register(rng), random_register(rng), target]
+    elif name in ('j', 'jal'):
+        if rng.random() < 0.5:
+            operands = [f"L{rng.randrange(labels)}"]
+        else:
+            operands = [number_text(rng, 4 * rng.getrandbits(26))]
+    else:
+        operands = []
+    mnemonic = name.upper() if rng.random() < 0.1 else name
+    separator = rng.choice([', ', ',', ' ,  '])
+    prefix = f"L{n // 8}: " if n % 8 == 0 else '    '
+    comment = '  # note' if rng.random() < 0.05 else ''
+    return f"{prefix}{mnemonic} {separator.join(operands)}{comment}".rstrip()
+
+
+def random_lines(rng, count):
+    labels = (count + 7) // 8
+    return [random_line(rng, n, count, labels) for n in range(count)]
+
+
+def reencode(word, address):
+    """Disassemble word at address and assemble the text there; (text, word or error message)"""
+    text = OPCODE_DECODERS[word >> 26](word, address)
+    assembler = Assembler()
+    assembler.current_address = address
+    try:
+        _, token = tokenize_line(text)
+        return text, assembler.encode_line(token)
+    except AssemblyError as e:
+        return text, str(e)
+
+
+def word_fails(word, address):
+    return reencode(word, address)[1] != word
+
+
+def mnemonic_of(word, address=0):
+    return OPCODE_DECODERS[word >> 26](word, address).split()[0]
+
+
+def minimize(word, address):
+    """Clear bits of a failing word (and its address) while it keeps failing as the same instruction"""
+    name = mnemonic_of(word, address)
+    if word_fails(word, 0):
+        address = 0
+    for bit in range(31, -1, -1):
+        smaller = word & ~(1 << bit)
+        if (smaller != word and mnemonic_of(smaller, address) == name
+                and word_fails(smaller, address)):
+            word = smaller
+    for bit in range(31, 1, -1):
+        smaller = address & ~(1 << bit)
+        if smaller != address and word_fails(word, smaller):
+            address = smaller
+    return word, address
+
+
+def failure(word, address, line=None):
+    """Report entry for a failing word, minimized"""
+    small, small_address = minimize(word, address) if word_fails(word, address) else (word, address)
+    text, result = reencode(small, small_address)
+    entry = {'word': word, 'address': address, 'minimized': small,
+             'minimized_address': small_address, 'text': text,
+             'result': result if isinstance(result, str) else f"0x{result:08x}"}
+    if line is not None:
+        entry['line'] = line
+    return entry
+
+
+def check_words(seed, batch, count):
+    """Fuzz one batch of words; return (words checked, failures)"""
+    rng = random.Random(f"words-{seed}-{batch}")
+    words = random_words(rng, count)
+    base = random_base(rng, count)
+    data = words_to_bytes(words)
+    lines = Disassembler().disassemble_bytes(data, base)
+    try:
+        code = Assembler().assemble_lines(lines)
+    except AssemblyError:
+        rerun = range(count)
+    else:
+        if code == data:
+            return count, []
+        rerun = [i for start, stop in changed_runs(data, code, 0, 0, count)
+                 for i in range(start, stop)]
+    failures = [failure(words[i], base + 4 * i) for i in rerun
+                if word_fails(words[i], base + 4 * i)]
+    return count, failures
+
+
+def check_source(seed, batch, count):
+    """Fuzz one batch of source lines; return (lines checked, failures)"""
+    rng = random.Random(f"source-{seed}-{batch}")
+    lines = random_lines(rng, count)
+    data = Assembler().assemble_lines(lines)
+    text = Disassembler().disassemble_bytes(data)
+    try:
+        code = Assembler().assemble_lines(text)
+    except AssemblyError:
+        rerun = range(count)
+    else:
+        if code == data:
+            return count, []
+        rerun = [i for start, stop in changed_runs(data, code, 0, 0, count)
+                 for i in range(start, stop)]
+    # Every word of a differing run is reported, even one that roundtrips
+    # alone, since the batch disagreeing with it is itself a bug
+    words = [word for (word,) in struct.iter_unpack('>I', data)]
+    return count, [failure(words[i], 4 * i, lines[i]) for i in rerun
+                   if word_fails(words[i], 4 * i) or not isinstance(rerun, range)]
+
+
+CHECKS = {'words': check_words, 'source': check_source}
+
+
+def run_check(job):
+    mode, seed, batch, count = job
+    return mode, CHECKS[mode](seed, batch, count)
+
+
+def fuzz(total, modes=('words', 'source'), seed=0, batch_size=DEFAULT_BATCH, jobs=1):
+    """Check total words per mode; return {mode: (checked, failures, seconds)}"""
+    results = {}
+    for mode in modes:
+        batches = [(mode, seed, n, min(batch_size, total - n * batch_size))
+                   for n in range((total + batch_size - 1) // batch_size)]
+        start = time.perf_counter()
+        if jobs == 1:
+            outcomes = map(run_check, batches)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            executor = ProcessPoolExecutor(max_workers=jobs or os.cpu_count() or 1)
+            outcomes = executor.map(run_check, batches)
+        checked = 0
+        failures = []
+        try:
+            for _, (count, found) in outcomes:
+                checked += count
+                failures.extend(found)
+        finally:
+            if jobs != 1:
+                executor.shutdown()
+        results[mode] = (checked, failures, time.perf_counter() - start)
+    return results
+
+
+def examples(failures, limit=MAX_EXAMPLES):
+    """Failures grouped by the minimized word's decoded mnemonic, limit each"""
+    groups = {}
+    for entry in failures:
+        group = groups.setdefault(entry['text'].split()[0], [])
+        if len(group) < limit:
+            group.append(entry)
+    return groups
+
+
+def format_failure(entry):
+    line = f"  word 0x{entry['word']:08x} @ 0x{entry['address']:x}"
+    if 'line' in entry:
+        line += f" from {entry['line'].strip()!r}"
+    return (f"{line}\n    minimized 0x{entry['minimized']:08x} @ 0x{entry['minimized_address']:x}: "
+            f"{entry['text']!r} -> {entry['result']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--words', type=int, default=1000000, help='words checked per mode')
+    parser.add_argument('--mode', choices=['words', 'source', 'both'], default='both')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='worker processes (0 = all CPUs)')
+    args = parser.parse_args()
+
+    modes = ['words', 'source'] if args.mode == 'both' else [args.mode]
+    failed = False
+    for mode, (checked, failures, seconds) in fuzz(args.words, modes, args.seed,
+                                                   args.batch_size, args.jobs).items():
+        rate = checked / seconds if seconds else 0
+        print(f"{mode:<7} {checked:>12} checked {seconds:>9.2f}s {rate:>12.0f} words/s "
+              f"{len(failures)} failures")
+        for name, group in sorted(examples(failures).items()):
+            print(f"{name}:")
+            for entry in group:
+                print(format_failure(entry))
+        failed = failed or bool(failures)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
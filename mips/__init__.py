@@ -0,0 +1,8 @@
+"""MIPS32 assembler, disassembler and tooling
+
+Importing the package loads only the core; the command line lives in
+mips.cli, which main.py and python -m mips import directly.
+"""
+
+from .core import (Assembler, AssemblyError, Disassembler, Instruction, InstructionArray,
+                   tokenize_line)
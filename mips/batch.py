@@ -0,0 +1,170 @@
+"""
+Batch assembly/disassembly of many files in one process pool.
+
+Inputs can be plain paths, directories (searched recursively), glob
+patterns, or '@manifest' files listing one path per line.
+"""
+
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from .core import Assembler, Disassembler
+
+GLOB_CHARS = '*?['
+
+
+def read_manifest(path):
+    """Read one path per line, skipping blanks and # comments"""
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if line:
+                yield line
+
+
+def expand_inputs(specs, extension):
+    """Expand paths, directories, globs and @manifests into a file list"""
+    files = []
+    for spec in specs:
+        if spec.startswith('@'):
+            files.extend(read_manifest(spec[1:]))
+        elif os.path.isdir(spec):
+            for root, dirs, names in os.walk(spec):
+                dirs.sort()
+                files.extend(os.path.join(root, name) for name in sorted(names)
+                             if name.endswith(extension))
+        elif any(c in spec for c in GLOB_CHARS):
+            files.extend(sorted(glob.glob(spec, recursive=True)))
+        else:
+            files.append(spec)
+    return files
+
+
+def output_path(input_file, extension, out_dir=None):
+    """Output file for an input: same name with a new extension"""
+    output_file = os.path.splitext(input_file)[0] + extension
+    if out_dir is None:
+        return output_file
+    relative = os.path.relpath(output_file)
+    if relative.startswith(os.pardir):
+        relative = os.path.basename(output_file)
+    return os.path.join(out_dir, relative)
+
+
+def assemble_file(input_file, output_file, cache_dir=None, output_format='raw-be'):
+    """Pool worker: assemble one file, returning (input, instructions, error)
+
+    cache_dir None disables the build cache; '' selects the default directory.
+    """
+    try:
+        if cache_dir is None:
+            assembler = Assembler()
+        else:
+            from .cache import AssemblyCache
+            assembler = Assembler(cache=AssemblyCache(cache_dir or None))
+        with open(input_file, 'r') as f:
+            code = assembler.assemble_text(f.read())
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        assembler.write_output(code, output_file, output_format)
+        return input_file, len(code) // 4, None
+    except Exception as e:
+        return input_file, 0, str(e)
+
+
+def object_file(input_file, output_file):
+    """Pool worker: assemble one file to a relocatable object"""
+    try:
+        from .linker import assemble_object_file
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        obj = assemble_object_file(input_file, output_file)
+        return input_file, len(obj.words), None
+    except Exception as e:
+        return input_file, 0, str(e)
+
+
+def disassemble_file(input_file, output_file, input_format='raw-be', labels=False):
+    """Pool worker: disassemble one file, returning (input, instructions, error)
+
+    labels recovers the control-flow graph and writes a labeled listing.
+    """
+    try:
+        if input_format == 'raw-be':
+            with open(input_file, 'rb') as f:
+                data = f.read()
+        else:
+            from .formats import read_image
+            data = read_image(input_file, input_format)
+        os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+        if labels:
+            graph = Disassembler().recover_cfg(data)
+            with open(output_file, 'w') as f:
+                f.writelines(graph.listing())
+            return input_file, len(graph.words), None
+        lines = Disassembler().disassemble_bytes(data)
+        with open(output_file, 'w') as f:
+            f.write("# Disassembled MIPS code\n\n")
+            f.writelines(f"    {line}\n" for line in lines)
+        return input_file, len(lines), None
+    except Exception as e:
+        return input_file, 0, str(e)
+
+
+def run_batch(operation, specs, out_dir=None, jobs=1, cache_dir=None, image_format='raw-be',
+              labels=False):
+    """Assemble, disassemble or build objects for every matching file and summarize
+
+    image_format is the output encoding when assembling and the input
+    encoding when disassembling; objects have their own format. labels
+    synthesizes labels in disassembled listings.
+    """
+    if operation == 'assemble':
+        worker = partial(assemble_file, cache_dir=cache_dir, output_format=image_format)
+        in_ext, out_ext = '.asm', '.bin'
+    elif operation == 'object':
+        if image_format != 'raw-be':
+            raise ValueError(f"--format {image_format} does not apply to .o objects")
+        worker, in_ext, out_ext = object_file, '.asm', '.o'
+    else:
+        worker = partial(disassemble_file, input_format=image_format, labels=labels)
+        in_ext, out_ext = '.bin', '.asm'
+
+    inputs = expand_inputs(specs, in_ext)
+    outputs = [output_path(path, out_ext, out_dir) for path in inputs]
+
+    start = time.perf_counter()
+    if jobs == 1:
+        results = map(worker, inputs, outputs)
+        summary = summarize(results)
+    else:
+        workers = jobs or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Batch many small files per task to keep IPC overhead down
+            chunksize = max(1, len(inputs) // (workers * 16))
+            summary = summarize(pool.map(worker, inputs, outputs, chunksize=chunksize))
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+def summarize(results):
+    """Fold (input, instructions, error) results into a summary dict"""
+    summary = {'files': 0, 'instructions': 0, 'errors': []}
+    for input_file, count, error in results:
+        summary['files'] += 1
+        summary['instructions'] += count
+        if error is not None:
+            summary['errors'].append((input_file, error))
+    return summary
+
+
+def print_summary(summary):
+    """Print a one-line summary followed by any per-file errors"""
+    seconds = summary['seconds'] or 1e-9
+    print(f"Processed {summary['files']} files: {summary['instructions']} instructions, "
+          f"{len(summary['errors'])} errors in {summary['seconds']:.2f}s "
+          f"({summary['files'] / seconds:.0f} files/s, "
+          f"{summary['instructions'] / seconds:.0f} instructions/s)")
+    for input_file, error in summary['errors']:
+        print(f"  {input_file}: {error}")
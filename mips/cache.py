@@ -0,0 +1,174 @@
+"""
+Content-addressed on-disk cache of assembled programs.
+
+Entries are keyed by a hash of the source text and the instruction
+tables, and hold the machine code plus the symbol table. The cache is
+bounded by total size; the least recently used entries are evicted
+first (reads refresh an entry's mtime). A running total of entry sizes
+is kept in a small manifest file, so a put only scans the directory
+once that total passes the bound (or the manifest is missing).
+
+The cache never fails a build: an entry that cannot be read is a miss,
+and a store that cannot be written is skipped (and counted in skipped).
+"""
+
+import hashlib
+import json
+import os
+import struct
+import tempfile
+
+from .core import (R_TYPE_INSTRUCTIONS, I_TYPE_INSTRUCTIONS, J_TYPE_INSTRUCTIONS,
+                  SPECIAL_INSTRUCTIONS, REGISTERS)
+
+# Bump when encoding changes in a way the tables below do not capture
+CACHE_FORMAT = 2
+
+TABLE_VERSION = hashlib.sha256(repr((
+    CACHE_FORMAT, R_TYPE_INSTRUCTIONS, I_TYPE_INSTRUCTIONS,
+    J_TYPE_INSTRUCTIONS, SPECIAL_INSTRUCTIONS, REGISTERS,
+)).encode('utf-8')).hexdigest()[:16]
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+HEADER = struct.Struct('>I')
+
+# Running total of entry bytes. Concurrent writers can make it drift; it
+# is only a hint for when to scan, and every scan rewrites it exactly.
+MANIFEST = 'size'
+
+
+def default_cache_dir():
+    """Cache directory from $MIPS_ASM_CACHE, else ~/.cache/mips-asm"""
+    return os.environ.get('MIPS_ASM_CACHE') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'mips-asm')
+
+
+class AssemblyCache:
+    """Size-bounded LRU cache of (machine code, labels) keyed by source text"""
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    def key(self, text):
+        """Content hash of a source text under the current instruction tables"""
+        digest = hashlib.sha256(TABLE_VERSION.encode('ascii'))
+        digest.update(text.encode('utf-8'))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.bin')
+
+    def get(self, text):
+        """Return (code, labels) for a source text, or None on a miss"""
+        path = self.path(self.key(text))
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        # A truncated or corrupt entry is a miss; the put that follows replaces it
+        try:
+            size, = HEADER.unpack_from(data)
+            labels = json.loads(data[HEADER.size:HEADER.size + size].decode('utf-8'))
+            code = data[HEADER.size + size:]
+            if not isinstance(labels, dict) or len(code) % 4:
+                raise ValueError("Corrupt cache entry")
+        except (struct.error, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return code, labels
+
+    def put(self, text, code, labels):
+        """Store the result of assembling a source text"""
+        path = self.path(self.key(text))
+        symbols = json.dumps(labels, separators=(',', ':')).encode('utf-8')
+        entry = HEADER.pack(len(symbols)) + symbols + code
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # A corrupt entry being rewritten, or another process's copy,
+            # is replaced and must come off the running total
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            # Write to a temporary file and rename so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(entry)
+                os.replace(tmp_path, path)
+            except OSError:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+        except OSError:
+            self.skipped += 1
+            return
+
+        total = self.read_total()
+        if total is None or total - replaced + len(entry) > self.max_bytes:
+            self.evict()
+        else:
+            self.write_total(total - replaced + len(entry))
+
+    def manifest_path(self):
+        return os.path.join(self.directory, MANIFEST)
+
+    def read_total(self):
+        """Running total of entry bytes from the manifest, or None if it is unreadable"""
+        try:
+            with open(self.manifest_path()) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def write_total(self, total):
+        try:
+            with open(self.manifest_path(), 'w') as f:
+                f.write(str(total))
+        except OSError:
+            pass
+
+    def entries(self):
+        """List (mtime, size, path) for every cached entry"""
+        entries = []
+        for root, dirs, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith('.bin'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits max_bytes"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= self.max_bytes:
+                    break
+        self.write_total(total)
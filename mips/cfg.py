@@ -0,0 +1,223 @@
+"""
+Control-flow recovery for disassembled images.
+
+One linear sweep over the words collects every branch/jump target and
+every instruction following a control transfer; those addresses, sorted
+once, are the basic block leaders. Targets get synthesized labels
+(F_xxxx for jal targets, L_xxxx otherwise) and a worklist pass from each
+function entry assigns blocks to functions. Everything is linear in the
+image size apart from sorting the leaders.
+"""
+
+import json
+from array import array
+
+from .core import (R_TYPE_INSTRUCTIONS, J_TYPE_INSTRUCTIONS, BRANCH_NAMES, OPCODE_DECODERS,
+                  REG_LIST, words_from_bytes)
+
+J_OPCODE = J_TYPE_INSTRUCTIONS['j']['opcode']
+JAL_OPCODE = J_TYPE_INSTRUCTIONS['jal']['opcode']
+JR_FUNCT = R_TYPE_INSTRUCTIONS['jr']['funct']
+
+# Edge kinds
+EDGE_FALLTHROUGH = 'fallthrough'
+EDGE_BRANCH = 'branch'
+EDGE_JUMP = 'jump'
+EDGE_CALL = 'call'
+
+
+def jump_target(word, address):
+    """Absolute target of a j/jal at address"""
+    return ((address + 4) & 0xF0000000) | ((word & 0x3FFFFFF) << 2)
+
+
+def branch_target(word, address):
+    """Absolute target of a beq/bne at address"""
+    return address + 4 + 4 * (((word & 0xFFFF) ^ 0x8000) - 0x8000)
+
+
+def scan(words, base_address=0):
+    """Linear sweep returning (leaders, branch/jump targets, call targets) as sets"""
+    leaders = {base_address}
+    targets = set()
+    calls = set()
+    address = base_address
+    for word in words:
+        opcode = word >> 26
+        if opcode in BRANCH_NAMES:
+            targets.add(branch_target(word, address))
+            leaders.add(address + 4)
+        elif opcode == J_OPCODE:
+            targets.add(jump_target(word, address))
+            leaders.add(address + 4)
+        elif opcode == JAL_OPCODE:
+            calls.add(jump_target(word, address))
+            leaders.add(address + 4)
+        elif opcode == 0 and word & 0x3F == JR_FUNCT:
+            leaders.add(address + 4)
+        address += 4
+    return leaders, targets, calls
+
+
+class ControlFlowGraph:
+    """Basic blocks, edges, functions and synthesized labels of an image"""
+
+    def __init__(self, words, base_address=0):
+        self.words = words
+        self.base_address = base_address
+        self.end_address = base_address + 4 * len(words)
+        leaders, targets, calls = scan(words, base_address)
+
+        def inside(address):
+            return base_address <= address < self.end_address
+
+        targets = {address for address in targets if inside(address)}
+        calls = {address for address in calls if inside(address)}
+        leaders = {address for address in leaders | targets | calls if inside(address)}
+
+        # Block i covers [starts[i], starts[i + 1])
+        self.starts = array('I', sorted(leaders))
+        self.index = {address: i for i, address in enumerate(self.starts)}
+
+        width = max(4, len(f"{max(self.end_address - 4, 0):x}"))
+        self.labels = {address: f"L_{address:0{width}x}" for address in targets}
+        self.labels.update((address, f"F_{address:0{width}x}") for address in calls)
+
+        self.successors = [self.block_successors(i) for i in range(len(self.starts))]
+        self.entries = sorted(calls | {base_address}) if words else []
+        self.block_functions = self.assign_functions()
+
+    def block_end(self, i):
+        """Address just past block i"""
+        return self.starts[i + 1] if i + 1 < len(self.starts) else self.end_address
+
+    def block_successors(self, i):
+        """(target address, kind) edges leaving block i"""
+        end = self.block_end(i)
+        address = end - 4
+        word = self.words[(address - self.base_address) >> 2]
+        opcode = word >> 26
+        fallthrough = [(end, EDGE_FALLTHROUGH)] if end < self.end_address else []
+        if opcode in BRANCH_NAMES:
+            return [(branch_target(word, address), EDGE_BRANCH)] + fallthrough
+        if opcode == J_OPCODE:
+            return [(jump_target(word, address), EDGE_JUMP)]
+        if opcode == JAL_OPCODE:
+            return [(jump_target(word, address), EDGE_CALL)] + fallthrough
+        if opcode == 0 and word & 0x3F == JR_FUNCT:
+            return []
+        return fallthrough
+
+    def assign_functions(self):
+        """Worklist from each function entry over non-call edges
+
+        Returns the entry address owning each block, or -1 for blocks no
+        entry reaches. A block reachable from several functions belongs to
+        the first entry (by address) that reaches it.
+        """
+        owner = array('q', [-1]) * len(self.starts)
+        for entry in self.entries:
+            owner[self.index[entry]] = entry
+        for entry in self.entries:
+            worklist = [self.index[entry]]
+            while worklist:
+                i = worklist.pop()
+                for target, kind in self.successors[i]:
+                    j = self.index.get(target)
+                    if kind == EDGE_CALL or j is None or owner[j] != -1:
+                        continue
+                    owner[j] = entry
+                    worklist.append(j)
+        return owner
+
+    def format_control(self, word, address):
+        """Disassemble a control transfer using a synthesized label if it has one"""
+        opcode = word >> 26
+        if opcode in BRANCH_NAMES:
+            label = self.labels.get(branch_target(word, address))
+            if label is not None:
+                return (f"{BRANCH_NAMES[opcode]} {REG_LIST[(word >> 21) & 0x1F]}, "
+                        f"{REG_LIST[(word >> 16) & 0x1F]}, {label}")
+        elif opcode == J_OPCODE or opcode == JAL_OPCODE:
+            label = self.labels.get(jump_target(word, address))
+            if label is not None:
+                return f"{'j' if opcode == J_OPCODE else 'jal'} {label}"
+        return OPCODE_DECODERS[opcode](word, address)
+
+    def listing(self):
+        """Yield a labeled listing that reassembles to the same image"""
+        decoders = OPCODE_DECODERS
+        words = self.words
+        base = self.base_address
+        yield "# Disassembled MIPS code\n\n"
+        for i, start in enumerate(self.starts):
+            label = self.labels.get(start)
+            if label is not None:
+                if label.startswith('F_') and i:
+                    yield "\n"
+                yield f"{label}:\n"
+            end = self.block_end(i)
+            # Only the last word of a block can be a control transfer
+            for address in range(start, end - 4, 4):
+                word = words[(address - base) >> 2]
+                yield f"    {decoders[word >> 26](word, address)}\n"
+            yield f"    {self.format_control(words[(end - 4 - base) >> 2], end - 4)}\n"
+
+    def to_dict(self):
+        """Plain-data form of the graph for JSON export"""
+        blocks = []
+        for i, start in enumerate(self.starts):
+            owner = self.block_functions[i]
+            blocks.append({
+                'start': start,
+                'end': self.block_end(i),
+                'label': self.labels.get(start),
+                'function': self.labels.get(owner, 'entry') if owner != -1 else None,
+                'successors': [{'target': target, 'kind': kind}
+                               for target, kind in self.successors[i]],
+            })
+        functions = [{'entry': entry, 'name': self.labels.get(entry, 'entry')}
+                     for entry in self.entries]
+        return {'base_address': self.base_address, 'end_address': self.end_address,
+                'functions': functions, 'blocks': blocks}
+
+    def write_json(self, out):
+        json.dump(self.to_dict(), out, indent=1)
+        out.write('\n')
+
+    def write_dot(self, out):
+        """Write the graph in Graphviz DOT form, one cluster per function"""
+        def node(address):
+            return f"b{address:x}"
+
+        def name(address):
+            return self.labels.get(address) or f"0x{address:x}"
+
+        out.write("digraph cfg {\n    node [shape=box, fontname=monospace];\n")
+        members = {}
+        for i, owner in enumerate(self.block_functions):
+            members.setdefault(owner, []).append(i)
+        for owner, blocks in members.items():
+            if owner != -1:
+                out.write(f"    subgraph cluster_{owner:x} {{\n"
+                          f"        label=\"{self.labels.get(owner, 'entry')}\";\n")
+            for i in blocks:
+                start = self.starts[i]
+                count = (self.block_end(i) - start) // 4
+                out.write(f"        {node(start)} [label=\"{name(start)}\\n{count} instr\"];\n")
+            if owner != -1:
+                out.write("    }\n")
+        styles = {EDGE_FALLTHROUGH: 'dashed', EDGE_BRANCH: 'solid',
+                  EDGE_JUMP: 'bold', EDGE_CALL: 'dotted'}
+        for i, start in enumerate(self.starts):
+            for target, kind in self.successors[i]:
+                if target in self.index:
+                    out.write(f"    {node(start)} -> {node(target)} [style={styles[kind]}];\n")
+        out.write("}\n")
+
+
+def recover(data, base_address=0):
+    """Build the control-flow graph of big-endian machine code"""
+    if len(data) % 4 != 0:
+        raise ValueError("Binary file size must be multiple of 4 bytes")
+    return ControlFlowGraph(words_from_bytes(data), base_address)
@@ -0,0 +1,385 @@
+"""
+Command line interface.
+
+Each subcommand's handler imports the subsystem it needs, so a one-shot
+assemble or disassemble loads only the core module.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from .core import Assembler, Disassembler, parse_int
+
+
+def default_output(args, old_ext, new_ext):
+    """Output path from the arguments, derived from the input if omitted"""
+    if args.output:
+        return args.output
+    if args.input == '-':
+        return '-'
+    return args.input.replace(old_ext, new_ext)
+
+
+def make_cache(args):
+    """Assembly cache selected by the command line, or None"""
+    if getattr(args, 'no_cache', True):
+        return None
+    from . import cache
+    return cache.AssemblyCache(args.cache_dir)
+
+
+def run_batch(args):
+    from . import batch
+    cache_dir = None if getattr(args, 'no_cache', True) else (args.cache_dir or '')
+    operation = 'object' if getattr(args, 'object', False) else args.command
+    summary = batch.run_batch(operation, [args.input], args.output, jobs=args.jobs or None,
+                              cache_dir=cache_dir, image_format=args.format,
+                              labels=getattr(args, 'labels', False))
+    batch.print_summary(summary)
+    if summary['errors']:
+        sys.exit(1)
+
+
+def is_batch_input(path):
+    """Whether the input is a directory, glob or @manifest rather than one file"""
+    return path.startswith('@') or os.path.isdir(path) or any(c in path for c in '*?[')
+
+
+def run_diagnostics(args):
+    """Assemble each input collecting every error; write outputs only for clean files"""
+    if is_batch_input(args.input):
+        from . import batch
+        inputs = batch.expand_inputs([args.input], '.asm')
+        outputs = [batch.output_path(path, '.bin', args.output) for path in inputs]
+    else:
+        inputs, outputs = [args.input], [default_output(args, '.asm', '.bin')]
+    found = []
+    for input_file, output_file in zip(inputs, outputs):
+        assembler = Assembler()
+        with open(input_file, 'r') as f:
+            code, diagnostics = assembler.assemble_checked(f)
+        found.extend((input_file, error) for error in diagnostics)
+        if not diagnostics:
+            os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+            assembler.write_output(code, output_file, args.format)
+    if args.diagnostics == 'json':
+        import json
+        print(json.dumps([{'file': path, **error.to_dict()} for path, error in found], indent=2))
+    else:
+        for path, error in found:
+            print(f"{path}:{error.lineno}:{error.column}: {error.code}: {error}")
+        print(f"{len(found)} errors in {len(inputs)} files")
+    if found:
+        sys.exit(1)
+
+
+def run_assemble(args):
+    if args.diagnostics:
+        return run_diagnostics(args)
+    if is_batch_input(args.input):
+        return run_batch(args)
+    if args.object:
+        if args.format != 'raw-be':
+            raise ValueError(f"--format {args.format} does not apply to .o objects")
+        from . import linker
+        output_file = default_output(args, '.asm', '.o')
+        obj = linker.assemble_object_file(args.input, output_file)
+        print(f"Assembled {len(obj.words)} instructions ({len(obj.imports)} imports, "
+              f"{len(obj.relocations)} relocations) to {output_file}")
+        return
+    assembler = Assembler(cache=make_cache(args))
+    assembler.assemble(args.input, default_output(args, '.asm', '.bin'), args.format)
+
+
+def run_disassemble(args):
+    if is_batch_input(args.input):
+        return run_batch(args)
+    output_file = default_output(args, '.bin', '.asm')
+    disassembler = Disassembler()
+    if args.labels:
+        disassembler.disassemble_labeled(args.input, output_file, args.format)
+    elif args.jobs != 1 and not args.batch and args.format == 'raw-be':
+        disassembler.disassemble_parallel(args.input, output_file,
+                                          jobs=args.jobs or None)
+    else:
+        if args.jobs != 1 and not args.batch:
+            # Workers map the raw file; other encodings are decoded up front
+            print(f"Note: -j applies to raw-be input; disassembling {args.format} serially",
+                  file=sys.stderr)
+        disassembler.disassemble(args.input, output_file, batch=args.batch,
+                                 input_format=args.format)
+
+
+def run_cfg(args):
+    with open(args.input, 'rb') as f:
+        graph = Disassembler().recover_cfg(f.read())
+    output_file = default_output(args, '.bin', '.' + args.format)
+    out = sys.stdout if output_file == '-' else open(output_file, 'w')
+    try:
+        if args.format == 'dot':
+            graph.write_dot(out)
+        else:
+            graph.write_json(out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    status = sys.stderr if output_file == '-' else sys.stdout
+    print(f"Recovered {len(graph.starts)} blocks in {len(graph.entries)} functions "
+          f"to {output_file}", file=status)
+
+
+def run_link(args):
+    from . import batch
+    from . import linker
+    inputs = batch.expand_inputs(args.inputs, '.o')
+    count = linker.link_files(inputs, args.output)
+    print(f"Linked {len(inputs)} objects ({count} instructions) to {args.output}")
+
+
+def run_search(args):
+    from . import batch
+    from . import search
+    query = search.Query.build(
+        mnemonic=args.mnemonic, opcode=args.opcode, funct=args.funct,
+        rs=args.rs, rt=args.rt, rd=args.rd, imm=args.imm, target=args.target,
+        masks=args.match)
+    total = 0
+    for path, matches in search.search_files(batch.expand_inputs(args.inputs, '.bin'),
+                                             query, args.index):
+        total += len(matches)
+        if args.count:
+            print(f"{path}: {len(matches)}")
+        else:
+            for address, word in matches:
+                print(search.format_match(path, address, word))
+    if not total:
+        sys.exit(1)
+
+
+def run_serve(args):
+    from . import server
+    server.serve(args.host, args.port, args.socket)
+
+
+def run_client(args):
+    from . import server
+    with server.Client(args.host, args.port, args.socket) as client:
+        if args.operation == 'assemble':
+            with open(args.input, 'r') as f:
+                code = client.assemble(f.read())
+            output_file = default_output(args, '.asm', '.bin')
+            with open(output_file, 'wb') as f:
+                f.write(code)
+            print(f"Assembled {len(code) // 4} instructions to {output_file}")
+        else:
+            with open(args.input, 'rb') as f:
+                lines = client.disassemble(f.read())
+            output_file = default_output(args, '.bin', '.asm')
+            with open(output_file, 'w') as f:
+                f.write("# Disassembled MIPS code\n\n")
+                f.writelines(f"    {line}\n" for line in lines)
+            print(f"Disassembled {len(lines)} instructions to {output_file}")
+
+
+def load_program(path):
+    """Machine code from a binary, or assembled from a .asm source"""
+    if path.endswith('.asm'):
+        with open(path, 'r') as f:
+            return Assembler().assemble_text(f.read())
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def load_image(path, fmt):
+    """Machine code from an image in the given format, or assembled from a .asm source"""
+    if fmt == 'raw-be' or path.endswith('.asm'):
+        return load_program(path)
+    from . import formats
+    return formats.read_image(path, fmt)
+
+
+def run_diff(args):
+    from . import diff
+    old = load_image(args.old, args.format)
+    new = load_image(args.new, args.format)
+    hunks = diff.diff_words(old, new)
+    if not args.stat:
+        for hunk in hunks:
+            for line in diff.format_hunk(old, new, hunk):
+                print(line)
+    summary = diff.summarize(hunks)
+    print(f"{summary['hunks']} hunks: {summary['replaced']} words replaced, "
+          f"{summary['deleted']} deleted, {summary['inserted']} inserted")
+    if hunks:
+        sys.exit(1)
+
+
+def run_simulate(args):
+    from . import simulator
+    sim = simulator.Simulator(load_program(args.input), memory_size=args.memory)
+    start = time.perf_counter()
+    steps = sim.run(args.max_steps)
+    elapsed = time.perf_counter() - start
+    
+    print(f"Executed {steps} instructions in {elapsed:.3f}s "
+          f"({steps / (elapsed or 1e-9):.0f} instructions/s)")
+    if not sim.halted:
+        print(f"Stopped at step limit with pc=0x{sim.pc:x}")
+    print(sim.register_dump())
+
+
+def run_profile(args):
+    from . import profiler
+    prof = profiler.profile_file(args.input, args.max_steps, memory_size=args.memory)
+    results = prof.results()
+    print(prof.report(results, top=args.top))
+    if args.json:
+        profiler.write_json(results, args.json)
+
+
+def add_address_arguments(parser):
+    """Add the options locating the assembler service"""
+    parser.add_argument('--socket', help='Unix socket path (default: TCP)')
+    parser.add_argument('--host', default='127.0.0.1', help='TCP host')
+    parser.add_argument('--port', type=int, default=7474, help='TCP port')
+
+
+def search_register(text):
+    from . import search
+    return search.parse_register(text)
+
+
+def search_range(text):
+    from . import search
+    return search.parse_range(text)
+
+
+def search_mask(text):
+    from . import search
+    return search.parse_mask(text)
+
+
+# Mirrors formats.FORMATS, so building the parser does not import formats
+IMAGE_FORMATS = ['raw-be', 'raw-le', 'hex', 'memh', 'ihex']
+
+
+def build_parser():
+    """Build the command line parser"""
+    parser = argparse.ArgumentParser(
+        prog='main.py', description='MIPS32 assembler and disassembler')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+    
+    assemble = commands.add_parser('assemble', help='convert .asm to binary')
+    assemble.add_argument('input', help='input .asm file, directory, glob or @manifest')
+    assemble.add_argument('output', nargs='?', help='output .bin file (directory in batch mode)')
+    assemble.add_argument('-j', '--jobs', type=int, default=1,
+                          help='worker processes in batch mode (0 = one per CPU)')
+    assemble.add_argument('--no-cache', action='store_true',
+                          help='always re-assemble instead of using the build cache')
+    assemble.add_argument('--cache-dir', help='build cache directory (default ~/.cache/mips-asm)')
+    assemble.add_argument('--format', choices=IMAGE_FORMATS, default='raw-be',
+                          help='output encoding (default raw-be)')
+    assemble.add_argument('--diagnostics', choices=['text', 'json'],
+                          help='report every error (with line, column and code) instead '
+                               'of stopping at the first')
+    assemble.add_argument('-c', '--object', action='store_true',
+                          help='write a relocatable .o object for the link command')
+    assemble.set_defaults(handler=run_assemble)
+    
+    link = commands.add_parser('link', help='link .o objects into one binary')
+    link.add_argument('inputs', nargs='+', help='.o files, directories, globs or @manifests, in link order')
+    link.add_argument('-o', '--output', default='a.bin', help='output binary (default a.bin)')
+    link.set_defaults(handler=run_link)
+    
+    disassemble = commands.add_parser('disassemble', help='convert binary to .asm')
+    disassemble.add_argument('input', help="input .bin file ('-' for stdin), directory, glob or @manifest")
+    disassemble.add_argument('output', nargs='?',
+                             help="output .asm file ('-' for stdout; directory in batch mode)")
+    disassemble.add_argument('--batch', action='store_true',
+                             help='decode the whole image in bulk (uses NumPy if installed)')
+    disassemble.add_argument('-j', '--jobs', type=int, default=1,
+                             help='worker processes (0 = one per CPU)')
+    disassemble.add_argument('--format', choices=IMAGE_FORMATS, default='raw-be',
+                             help='input encoding (default raw-be)')
+    disassemble.add_argument('--labels', action='store_true',
+                             help='synthesize labels for branch and jump targets')
+    disassemble.set_defaults(handler=run_disassemble)
+    
+    cfg = commands.add_parser('cfg', help='export the control-flow graph of a binary')
+    cfg.add_argument('input', help='input .bin file')
+    cfg.add_argument('output', nargs='?', help="output file ('-' for stdout)")
+    cfg.add_argument('--format', choices=['json', 'dot'], default='json',
+                     help='JSON data or Graphviz DOT')
+    cfg.set_defaults(handler=run_cfg)
+    
+    search = commands.add_parser('search', help='find instructions by encoded fields')
+    search.add_argument('inputs', nargs='+', help='.bin files, directories, globs or @manifests')
+    search.add_argument('-m', '--mnemonic', help='instruction, e.g. jal or sw')
+    search.add_argument('--opcode', type=parse_int)
+    search.add_argument('--funct', type=parse_int)
+    search.add_argument('--rs', type=search_register, help='register name or number')
+    search.add_argument('--rt', type=search_register, help='register name or number')
+    search.add_argument('--rd', type=search_register, help='register name or number')
+    search.add_argument('--imm', type=search_range, help="signed immediate 'LO:HI' (either side optional)")
+    search.add_argument('--target', type=parse_int, help='jump or branch target address')
+    search.add_argument('--match', type=search_mask, action='append', default=[],
+                        metavar='MASK=VALUE', help='raw word constraint (repeatable)')
+    search.add_argument('--index', action='store_true',
+                        help='use (and build if needed) an IMAGE.idx opcode index')
+    search.add_argument('-c', '--count', action='store_true', help='print match counts per file')
+    search.set_defaults(handler=run_search)
+    
+    diff = commands.add_parser('diff', help='compare two images word by word')
+    diff.add_argument('old', help='.bin file, or .asm source to assemble first')
+    diff.add_argument('new', help='.bin file, or .asm source to assemble first')
+    diff.add_argument('--format', choices=IMAGE_FORMATS, default='raw-be',
+                      help='encoding of both images')
+    diff.add_argument('--stat', action='store_true', help='print only the summary')
+    diff.set_defaults(handler=run_diff)
+    
+    serve = commands.add_parser('serve', help='run a persistent assembler service')
+    add_address_arguments(serve)
+    serve.set_defaults(handler=run_serve)
+    
+    client = commands.add_parser('client', help='send a file to a running service')
+    client.add_argument('operation', choices=['assemble', 'disassemble'])
+    client.add_argument('input', help='input file')
+    client.add_argument('output', nargs='?', help='output file')
+    add_address_arguments(client)
+    client.set_defaults(handler=run_client)
+    
+    run = commands.add_parser('run', help='execute a program in the simulator')
+    run.add_argument('input', help='.bin file, or .asm source to assemble first')
+    run.add_argument('--max-steps', type=int, help='stop after this many instructions')
+    run.add_argument('--memory', type=int, default=1 << 20, help='memory size in bytes')
+    run.set_defaults(handler=run_simulate)
+    
+    profile = commands.add_parser('profile', help='execute a program and report hot spots')
+    profile.add_argument('input', help='.asm source (for line mapping) or .bin file')
+    profile.add_argument('--max-steps', type=int, help='stop after this many instructions')
+    profile.add_argument('--memory', type=int, default=1 << 20, help='memory size in bytes')
+    profile.add_argument('--top', type=int, default=20, help='rows per report section')
+    profile.add_argument('--json', help='also write the full profile as JSON')
+    profile.set_defaults(handler=run_profile)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    
+    try:
+        args.handler(args)
+    except BrokenPipeError:
+        # Reader went away (e.g. piped into head); stop quietly
+        sys.stderr.close()
+        sys.exit(0)
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
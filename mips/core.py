@@ -0,0 +1,1348 @@
+"""
+Core of the toolchain: instruction tables, lexer, Assembler, decode
+tables, the compact instruction model and Disassembler.
+
+Only modules every command needs are imported here; the process pool
+and optional subsystems are imported where they are used.
+"""
+
+import sys
+import os
+import io
+import mmap
+import struct
+import re
+from array import array
+from collections import namedtuple
+
+R_TYPE_INSTRUCTIONS = {
+    'add':  {'opcode': 0x00, 'funct': 0x20},
+    'sub':  {'opcode': 0x00, 'funct': 0x22},
+    'and':  {'opcode': 0x00, 'funct': 0x24},
+    'or':   {'opcode': 0x00, 'funct': 0x25},
+    'xor':  {'opcode': 0x00, 'funct': 0x26},
+    'slt':  {'opcode': 0x00, 'funct': 0x2a},
+    'sll':  {'opcode': 0x00, 'funct': 0x00},
+    'srl':  {'opcode': 0x00, 'funct': 0x02},
+    'jr':   {'opcode': 0x00, 'funct': 0x08},
+}
+
+I_TYPE_INSTRUCTIONS = {
+    'addi': {'opcode': 0x08},
+    'slti': {'opcode': 0x0a},
+    'lw':   {'opcode': 0x23},
+    'sw':   {'opcode': 0x2b},
+    'beq':  {'opcode': 0x04},
+    'bne':  {'opcode': 0x05},
+}
+
+J_TYPE_INSTRUCTIONS = {
+    'j':    {'opcode': 0x02},
+    'jal':  {'opcode': 0x03},
+}
+
+SPECIAL_INSTRUCTIONS = {
+    'lui':  {'opcode': 0x0f},
+    'nop':  {'opcode': 0x00},
+}
+
+# Register name to number mapping
+REGISTERS = {
+    '$zero': 0, '$0': 0,
+    '$at': 1,
+    '$v0': 2, '$v1': 3,
+    '$a0': 4, '$a1': 5, '$a2': 6, '$a3': 7,
+    '$t0': 8, '$t1': 9, '$t2': 10, '$t3': 11,
+    '$t4': 12, '$t5': 13, '$t6': 14, '$t7': 15,
+    '$s0': 16, '$s1': 17, '$s2': 18, '$s3': 19,
+    '$s4': 20, '$s5': 21, '$s6': 22, '$s7': 23,
+    '$t8': 24, '$t9': 25,
+    '$k0': 26, '$k1': 27,
+    '$gp': 28, '$sp': 29, '$fp': 30, '$ra': 31,
+}
+
+# Reverse mapping for disassembly
+REG_NAMES = {v: k for k, v in REGISTERS.items() if k.startswith('$') and len(k) <= 3}
+
+
+# Operand syntax: register, offset($base), immediate or label
+OPERAND_PATTERN = re.compile(
+    r'(?P<reg>\$\w+)$'
+    r'|(?P<offset>[-+]?(?:0[xX][0-9a-fA-F]+|\d+))\((?P<base>\$\w+)\)$'
+    r'|(?P<imm>[-+]?(?:0[xX][0-9a-fA-F]+|\d+))$'
+    r'|(?P<sym>[A-Za-z_.][\w.]*)$')
+
+# Operand kinds recorded by the lexer
+OPERAND_REG = 'r'
+OPERAND_IMM = 'i'
+OPERAND_MEM = 'm'
+OPERAND_SYM = 's'
+# Expected kind for branch/jump targets: a label or an absolute address
+OPERAND_TARGET = 't'
+
+# One lexed instruction: kinds has one OPERAND_* character per operand,
+# values holds the parsed register numbers, integers and label names and
+# text is the instruction with label and comment removed
+Token = namedtuple('Token', 'mnemonic kinds values text')
+
+# Token for blank and label-only lines
+EMPTY_TOKEN = Token(None, '', (), '')
+
+# Mnemonics whose encoding depends on the instruction's own address
+BRANCH_MNEMONICS = frozenset(['beq', 'bne'])
+
+
+# Diagnostic codes carried by AssemblyError.code
+UNKNOWN_INSTRUCTION = 'unknown-instruction'
+UNKNOWN_REGISTER = 'unknown-register'
+INVALID_OPERAND = 'invalid-operand'
+OPERAND_COUNT = 'operand-count'
+IMMEDIATE_RANGE = 'immediate-range'
+BRANCH_RANGE = 'branch-range'
+UNDEFINED_LABEL = 'undefined-label'
+DUPLICATE_LABEL = 'duplicate-label'
+MISALIGNED_TARGET = 'misaligned-target'
+
+# Immediate (or memory offset) values each mnemonic can encode without
+# truncation; only checked when collecting diagnostics
+SIGNED_16 = (-0x8000, 0x7FFF)
+IMMEDIATE_RANGES = {'addi': SIGNED_16, 'slti': SIGNED_16, 'lw': SIGNED_16, 'sw': SIGNED_16,
+                    'lui': (0, 0xFFFF), 'sll': (0, 31), 'srl': (0, 31)}
+
+
+class AssemblyError(ValueError):
+    """A source line that failed to assemble
+
+    code is one of the diagnostic codes above and text the part of the
+    line it is about, which locate() turns into a 1-based column.
+    """
+    def __init__(self, message, line='', lineno=0, code=INVALID_OPERAND, text='', column=0):
+        super().__init__(message)
+        self.line = line
+        self.lineno = lineno
+        self.code = code
+        self.text = text
+        self.column = column
+
+    def locate(self, source, lineno):
+        """Copy of this error placed at 1-based lineno of the raw source line"""
+        code = source.partition('#')[0]
+        start = code.find(':') + 1
+        column = 0
+        if self.text:
+            lowered, text = code.lower(), self.text.lower()
+            # Prefer a whole operand, so '3' is not found inside '$t3'
+            match = re.compile(r'(?<![\w$])' + re.escape(text) + r'(?!\w)').search(lowered, start)
+            if match:
+                column = match.start() + 1
+            else:
+                column = lowered.find(text, start) + 1 or lowered.find(text) + 1
+        if column == 0:
+            column = len(code) - len(code[start:].lstrip()) + 1
+        return AssemblyError(str(self), code[start:].strip(), lineno, self.code, self.text, column)
+
+    def to_dict(self):
+        return {'line': self.lineno, 'column': self.column, 'code': self.code,
+                'message': str(self)}
+
+
+def parse_int(text):
+    """Parse a decimal or 0x-prefixed hex integer"""
+    if 'x' in text or 'X' in text:
+        return int(text, 16)
+    return int(text)
+
+
+def tokenize_operand(text):
+    """Classify one operand as a (kind, value) pair"""
+    match = OPERAND_PATTERN.match(text)
+    if not match:
+        raise AssemblyError(f"Invalid operand: {text}", text=text)
+    kind = match.lastgroup
+    if kind == 'reg':
+        if text not in REGISTERS:
+            raise AssemblyError(f"Unknown register: {text}", code=UNKNOWN_REGISTER, text=text)
+        return OPERAND_REG, REGISTERS[text]
+    if kind == 'base':
+        base = match.group('base')
+        if base not in REGISTERS:
+            raise AssemblyError(f"Unknown register: {base}", code=UNKNOWN_REGISTER, text=base)
+        return OPERAND_MEM, (parse_int(match.group('offset')), REGISTERS[base])
+    if kind == 'imm':
+        return OPERAND_IMM, parse_int(text)
+    return OPERAND_SYM, text
+
+
+def tokenize_operands(text):
+    """Lex a comma/space separated operand field into (kinds, values)"""
+    kinds = []
+    values = []
+    for operand in text.replace(',', ' ').split():
+        kind, value = tokenize_operand(operand)
+        kinds.append(kind)
+        values.append(value)
+    return ''.join(kinds), tuple(values)
+
+
+def tokenize_instruction(code):
+    """Lex an instruction with its label and comment already removed"""
+    parts = code.split(None, 1)
+    if not parts:
+        return EMPTY_TOKEN
+    if len(parts) == 1:
+        return Token(parts[0].lower(), '', (), code)
+    kinds, values = tokenize_operands(parts[1])
+    return Token(parts[0].lower(), kinds, values, code)
+
+
+def tokenize_line(line):
+    """Lex one source line into (label, token); label is None if absent"""
+    code = line.partition('#')[0]
+    label = None
+    if ':' in code:
+        label, _, code = code.partition(':')
+        label = label.strip()
+    return label, tokenize_instruction(code)
+
+
+def _encode_r_normal(info):
+    """Build an encoder for add $rd, $rs, $rt"""
+    base = (info['opcode'] << 26) | info['funct']
+    def encode(values, assembler):
+        rd, rs, rt = values
+        return base | (rs << 21) | (rt << 16) | (rd << 11)
+    return OPERAND_REG * 3, encode
+
+
+def _encode_r_shift(info):
+    """Build an encoder for sll $rd, $rt, shamt"""
+    base = (info['opcode'] << 26) | info['funct']
+    def encode(values, assembler):
+        rd, rt, shamt = values
+        return base | (rt << 16) | (rd << 11) | ((shamt & 0x1F) << 6)
+    return OPERAND_REG + OPERAND_REG + OPERAND_IMM, encode
+
+
+def _encode_r_jump(info):
+    """Build an encoder for jr $rs"""
+    base = (info['opcode'] << 26) | info['funct']
+    def encode(values, assembler):
+        return base | (values[0] << 21)
+    return OPERAND_REG, encode
+
+
+def _encode_i_normal(info):
+    """Build an encoder for addi $rt, $rs, immediate"""
+    base = info['opcode'] << 26
+    def encode(values, assembler):
+        rt, rs, imm = values
+        return base | (rs << 21) | (rt << 16) | (imm & 0xFFFF)
+    return OPERAND_REG + OPERAND_REG + OPERAND_IMM, encode
+
+
+def _encode_i_memory(info):
+    """Build an encoder for lw $rt, offset($rs)"""
+    base = info['opcode'] << 26
+    def encode(values, assembler):
+        rt, (offset, rs) = values
+        return base | (rs << 21) | (rt << 16) | (offset & 0xFFFF)
+    return OPERAND_REG + OPERAND_MEM, encode
+
+
+def _encode_i_branch(info):
+    """Build an encoder for beq $rs, $rt, target"""
+    base = info['opcode'] << 26
+    def encode(values, assembler):
+        rs, rt, target = values
+        offset = (assembler.resolve_target(target) - (assembler.current_address + 4)) // 4
+        return base | (rs << 21) | (rt << 16) | (offset & 0xFFFF)
+    return OPERAND_REG + OPERAND_REG + OPERAND_TARGET, encode
+
+
+def _encode_lui(info):
+    """Build an encoder for lui $rt, immediate"""
+    base = info['opcode'] << 26
+    def encode(values, assembler):
+        rt, imm = values
+        return base | (rt << 16) | (imm & 0xFFFF)
+    return OPERAND_REG + OPERAND_IMM, encode
+
+
+def _encode_nop(info):
+    """Build an encoder for nop"""
+    def encode(values, assembler):
+        return 0
+    return '', encode
+
+
+def _encode_j(info):
+    """Build an encoder for j target"""
+    base = info['opcode'] << 26
+    def encode(values, assembler):
+        return base | ((assembler.resolve_target(values[0]) >> 2) & 0x3FFFFFF)
+    return OPERAND_TARGET, encode
+
+
+def _build_encode_table():
+    """Map each mnemonic to its operand layout and encoder"""
+    table = {}
+    for name, info in R_TYPE_INSTRUCTIONS.items():
+        if name in ['sll', 'srl']:
+            table[name] = _encode_r_shift(info)
+        elif name == 'jr':
+            table[name] = _encode_r_jump(info)
+        else:
+            table[name] = _encode_r_normal(info)
+    for name, info in I_TYPE_INSTRUCTIONS.items():
+        if name in ['lw', 'sw']:
+            table[name] = _encode_i_memory(info)
+        elif name in ['beq', 'bne']:
+            table[name] = _encode_i_branch(info)
+        else:
+            table[name] = _encode_i_normal(info)
+    for name, info in J_TYPE_INSTRUCTIONS.items():
+        table[name] = _encode_j(info)
+    table['lui'] = _encode_lui(SPECIAL_INSTRUCTIONS['lui'])
+    table['nop'] = _encode_nop(SPECIAL_INSTRUCTIONS['nop'])
+    
+    # Precompute every lexed kinds string that satisfies the layout, so
+    # well-formed lines skip operand checking entirely
+    for name, (kinds, encode) in table.items():
+        accepted = ['']
+        for kind in kinds:
+            options = OPERAND_SYM + OPERAND_IMM if kind == OPERAND_TARGET else kind
+            accepted = [prefix + option for prefix in accepted for option in options]
+        table[name] = (kinds, frozenset(accepted), encode)
+    return table
+
+
+# mnemonic -> (operand layout, accepted lexed kinds, encoder). Encoders
+# take the operand values and the assembler (for label and address
+# lookups) and OR the fields into pre-shifted opcode/funct bits
+ENCODERS = _build_encode_table()
+
+
+class Assembler:
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.labels = {}
+        self.instructions = []
+        self.words = array('I')
+        self.fixups = []
+        self.line_numbers = array('I')
+        self.current_address = 0
+        
+    def parse_register(self, reg_str):
+        """Convert register string to register number"""
+        reg_str = reg_str.strip().rstrip(',')
+        if reg_str not in REGISTERS:
+            raise ValueError(f"Unknown register: {reg_str}")
+        return REGISTERS[reg_str]
+    
+    def parse_immediate(self, imm_str):
+        """Parse immediate value (decimal or hex)"""
+        imm_str = imm_str.strip().rstrip(',')
+        if imm_str.startswith('0x'):
+            return int(imm_str, 16)
+        return int(imm_str)
+    
+    def first_pass(self, lines):
+        """First pass: lex every line, collect labels and encode what it can
+
+        Instructions are encoded straight into the self.words array. Those
+        referencing a label get a placeholder word and a (index, token)
+        entry in self.fixups for the second pass to patch. Identical
+        instruction text is lexed once, and encoded once too unless its
+        encoding depends on its address.
+        """
+        words = self.words = array('I')
+        fixups = self.fixups = []
+        line_numbers = self.line_numbers = array('I')
+        cache = {}
+        address = 0
+        for lineno, line in enumerate(lines, 1):
+            code = line.partition('#')[0]
+            if ':' in code:
+                label, _, code = code.partition(':')
+                # The first definition wins, as in assemble_checked and sessions
+                self.labels.setdefault(label.strip(), address)
+            
+            try:
+                entry = cache.get(code)
+                if entry is None:
+                    token = tokenize_instruction(code)
+                    word = None
+                    if token.mnemonic is not None:
+                        if OPERAND_SYM not in token.kinds and token.mnemonic not in BRANCH_MNEMONICS:
+                            word = self.encode_line(token)
+                        else:
+                            self.check_operands(token)
+                    entry = cache[code] = (token, word)
+                token, word = entry
+                if token.mnemonic is None:
+                    continue
+                
+                if word is None:
+                    if OPERAND_SYM in token.kinds:
+                        fixups.append((len(words), token))
+                        word = 0
+                    else:
+                        self.current_address = address
+                        word = self.encode_line(token)
+                words.append(word)
+            except AssemblyError as e:
+                raise e.locate(line, lineno) from e
+            
+            line_numbers.append(lineno)
+            address += 4
+        return words
+    
+    def second_pass(self):
+        """Second pass: patch label references now that every label is known"""
+        words = self.words
+        for index, token in self.fixups:
+            self.current_address = index * 4
+            try:
+                words[index] = self.encode_line(token)
+            except AssemblyError as e:
+                raise e.locate(token.text, self.line_numbers[index]) from e
+        return words
+    
+    def operand_values(self, token, kinds):
+        """Check a line's operands against the expected kinds and return their values"""
+        if token.kinds == kinds:
+            return token.values
+        
+        # Slow path: targets accept labels or addresses, anything else is an error
+        if len(token.kinds) != len(kinds):
+            raise AssemblyError(f"{token.mnemonic} expects {len(kinds)} operands, got {len(token.kinds)}",
+                                code=OPERAND_COUNT, text=token.mnemonic)
+        texts = token.text.split(None, 1)[1].replace(',', ' ').split()
+        for kind, expected, text in zip(token.kinds, kinds, texts):
+            if kind == expected:
+                continue
+            if expected == OPERAND_TARGET and kind in (OPERAND_SYM, OPERAND_IMM):
+                continue
+            if expected == OPERAND_MEM:
+                raise AssemblyError(f"Invalid memory format: {text}", text=text)
+            raise AssemblyError(f"Invalid operand for {token.mnemonic}: {text}", text=text)
+        return token.values
+    
+    def resolve_target(self, value):
+        """Get the address of a label or absolute target operand"""
+        if isinstance(value, int):
+            return value
+        return self.labels.get(value, 0)
+    
+    def check_operands(self, token):
+        """Raise the error encode_line would for a line that can only be encoded later"""
+        entry = ENCODERS.get(token.mnemonic)
+        if entry is None:
+            raise AssemblyError(f"Unknown instruction: {token.mnemonic}",
+                                code=UNKNOWN_INSTRUCTION, text=token.mnemonic)
+        if token.kinds not in entry[1]:
+            self.operand_values(token, entry[0])
+
+    def check_range(self, token):
+        """Raise if an immediate, offset or resolved target would be truncated by encoding"""
+        mnemonic = token.mnemonic
+        limits = IMMEDIATE_RANGES.get(mnemonic)
+        if limits is not None:
+            value = token.values[-1]
+            if isinstance(value, tuple):
+                value = value[0]
+            if limits[0] <= value <= limits[1]:
+                return
+            code, message = IMMEDIATE_RANGE, f"Immediate out of range for {mnemonic}"
+        elif mnemonic in BRANCH_MNEMONICS or mnemonic in J_TYPE_INSTRUCTIONS:
+            target = self.resolve_target(token.values[-1])
+            if target & 3:
+                # Encoding drops the low two bits
+                code, message = MISALIGNED_TARGET, "Target is not word aligned"
+            elif mnemonic in BRANCH_MNEMONICS:
+                offset = (target - self.current_address - 4) >> 2
+                if SIGNED_16[0] <= offset <= SIGNED_16[1]:
+                    return
+                code, message = BRANCH_RANGE, "Branch target out of range"
+            elif target >> 28 == (self.current_address + 4) >> 28:
+                return
+            else:
+                code, message = BRANCH_RANGE, "Jump target out of range"
+        else:
+            return
+        operand = token.text.replace(',', ' ').split()[-1]
+        raise AssemblyError(f"{message}: {operand}", code=code, text=operand)
+
+    def encode_line(self, token):
+        """Encode a lexed source line with its mnemonic's table entry"""
+        entry = ENCODERS.get(token.mnemonic)
+        if entry is None:
+            raise AssemblyError(f"Unknown instruction: {token.mnemonic}",
+                                code=UNKNOWN_INSTRUCTION, text=token.mnemonic)
+        kinds, accepted, encode = entry
+        if token.kinds in accepted:
+            return encode(token.values, self)
+        return encode(self.operand_values(token, kinds), self)
+    
+    def assemble_instruction(self, line):
+        """Assemble a single instruction"""
+        label, token = tokenize_line(line)
+        if token.mnemonic is None:
+            return None
+        return self.encode_line(token)
+    
+    def assemble_lines(self, lines):
+        """Assemble an iterable of source lines to big-endian machine code"""
+        self.labels = {}
+        self.first_pass(lines)
+        return words_to_bytes(self.second_pass())
+    
+    def assemble_instructions(self, lines):
+        """Assemble source lines to an InstructionArray"""
+        self.labels = {}
+        self.first_pass(lines)
+        return InstructionArray(self.second_pass())
+    
+    def assemble_checked(self, lines):
+        """Assemble every line, collecting AssemblyErrors instead of stopping at the first
+
+        Returns (code, diagnostics). Besides what assemble_lines rejects,
+        this reports out-of-range immediates and branch/jump targets,
+        misaligned numeric targets, undefined labels and duplicate labels
+        (the first definition is kept, as in assemble_lines). Lines that fail encode as 0 so later addresses still match.
+        """
+        labels = self.labels = {}
+        words = self.words = array('I')
+        line_numbers = self.line_numbers = array('I')
+        self.fixups = []
+        fixups = []
+        diagnostics = []
+        address = 0
+        for lineno, line in enumerate(lines, 1):
+            code = line.partition('#')[0]
+            if ':' in code:
+                label, _, code = code.partition(':')
+                label = label.strip()
+                if label in labels:
+                    diagnostics.append(AssemblyError(
+                        f"Duplicate label: {label}", code=DUPLICATE_LABEL,
+                        text=label).locate(line, lineno))
+                else:
+                    labels[label] = address
+            if not code.strip():
+                continue
+            try:
+                token = tokenize_instruction(code)
+                word = 0
+                if OPERAND_SYM in token.kinds:
+                    self.check_operands(token)
+                    fixups.append((len(words), token, line))
+                else:
+                    self.current_address = address
+                    word = self.encode_line(token)
+                    self.check_range(token)
+            except AssemblyError as e:
+                diagnostics.append(e.locate(line, lineno))
+                word = 0
+            words.append(word)
+            line_numbers.append(lineno)
+            address += 4
+
+        for index, token, line in fixups:
+            target = token.values[-1]
+            try:
+                if target not in labels:
+                    raise AssemblyError(f"Undefined label: {target}", code=UNDEFINED_LABEL,
+                                        text=target)
+                self.current_address = index * 4
+                word = self.encode_line(token)
+                self.check_range(token)
+                words[index] = word
+            except AssemblyError as e:
+                diagnostics.append(e.locate(line, line_numbers[index]))
+        diagnostics.sort(key=lambda error: error.lineno)
+        return words_to_bytes(words), diagnostics
+
+    def assemble_text(self, text):
+        """Assemble MIPS source text to big-endian machine code"""
+        if self.cache is not None:
+            cached = self.cache.get(text)
+            if cached is not None:
+                code, self.labels = cached
+                self.words = words_from_bytes(code)
+                self.fixups = []
+                self.line_numbers = array('I')
+                return code
+        
+        code = self.assemble_lines(text.splitlines())
+        if self.cache is not None:
+            self.cache.put(text, code, self.labels)
+        return code
+    
+    def assemble(self, input_file, output_file, output_format='raw-be'):
+        """Assemble MIPS assembly file to binary (see formats.FORMATS)"""
+        try:
+            with open(input_file, 'r') as f:
+                if self.cache is not None:
+                    code = self.assemble_text(f.read())
+                else:
+                    code = self.assemble_lines(f)
+        except AssemblyError as e:
+            print(f"Error assembling line '{e.line}': {e}")
+            raise
+        
+        self.write_output(code, output_file, output_format)
+        print(f"Assembled {len(self.words)} instructions to {output_file}")
+        return len(self.words)
+
+    def write_output(self, code, output_file, output_format='raw-be'):
+        """Write machine code in one go (see formats.FORMATS)"""
+        if output_format == 'raw-be':
+            with open(output_file, 'wb') as f:
+                f.write(code)
+        else:
+            from . import formats
+            formats.write_image(output_file, code, output_format)
+
+
+def words_to_bytes(words):
+    """Serialize an array('I') of instruction words as big-endian bytes"""
+    if sys.byteorder == 'little':
+        words = array('I', words)
+        words.byteswap()
+    return words.tobytes()
+
+
+def words_from_bytes(data):
+    """Load big-endian machine code into an array('I') of instruction words"""
+    words = array('I')
+    words.frombytes(data)
+    if sys.byteorder == 'little':
+        words.byteswap()
+    return words
+
+
+# Register names indexed by register number, used by the decode tables
+REG_LIST = [REG_NAMES.get(i, f"${i}") for i in range(32)]
+
+
+def _unknown(kind):
+    """Build a decoder for words with no matching instruction"""
+    def decode(word, address):
+        return f"unknown_{kind} 0x{word:08x}"
+    return decode
+
+
+def _decode_r_normal(name):
+    """Build a decoder for add $rd, $rs, $rt"""
+    prefix = name + ' '
+    def decode(word, address):
+        return (f"{prefix}{REG_LIST[(word >> 11) & 0x1F]}, "
+                f"{REG_LIST[(word >> 21) & 0x1F]}, {REG_LIST[(word >> 16) & 0x1F]}")
+    return decode
+
+
+def _decode_r_shift(name):
+    """Build a decoder for sll $rd, $rt, shamt"""
+    prefix = name + ' '
+    # sll with rt, rd and shamt all zero is the canonical nop
+    is_sll = name == 'sll'
+    def decode(word, address):
+        if is_sll and not word & 0x001FFFC0:
+            return 'nop'
+        return (f"{prefix}{REG_LIST[(word >> 11) & 0x1F]}, "
+                f"{REG_LIST[(word >> 16) & 0x1F]}, {(word >> 6) & 0x1F}")
+    return decode
+
+
+def _decode_r_jump(name):
+    """Build a decoder for jr $rs"""
+    prefix = name + ' '
+    def decode(word, address):
+        return prefix + REG_LIST[(word >> 21) & 0x1F]
+    return decode
+
+
+def _decode_i_normal(name):
+    """Build a decoder for addi $rt, $rs, immediate"""
+    prefix = name + ' '
+    def decode(word, address):
+        imm = ((word & 0xFFFF) ^ 0x8000) - 0x8000
+        return (f"{prefix}{REG_LIST[(word >> 16) & 0x1F]}, "
+                f"{REG_LIST[(word >> 21) & 0x1F]}, {imm}")
+    return decode
+
+
+def _decode_i_memory(name):
+    """Build a decoder for lw $rt, offset($rs)"""
+    prefix = name + ' '
+    def decode(word, address):
+        imm = ((word & 0xFFFF) ^ 0x8000) - 0x8000
+        return (f"{prefix}{REG_LIST[(word >> 16) & 0x1F]}, "
+                f"{imm}({REG_LIST[(word >> 21) & 0x1F]})")
+    return decode
+
+
+def _decode_i_branch(name):
+    """Build a decoder for beq $rs, $rt, target"""
+    prefix = name + ' '
+    def decode(word, address):
+        imm = ((word & 0xFFFF) ^ 0x8000) - 0x8000
+        target = (address + 4 + (imm * 4)) & 0xFFFFFFFF
+        return (f"{prefix}{REG_LIST[(word >> 21) & 0x1F]}, "
+                f"{REG_LIST[(word >> 16) & 0x1F]}, 0x{target:x}")
+    return decode
+
+
+def _decode_lui(name):
+    """Build a decoder for lui $rt, immediate"""
+    prefix = name + ' '
+    def decode(word, address):
+        return f"{prefix}{REG_LIST[(word >> 16) & 0x1F]}, {word & 0xFFFF}"
+    return decode
+
+
+def _decode_j(name):
+    """Build a decoder for j target"""
+    prefix = name + ' '
+    def decode(word, address):
+        return f"{prefix}0x{(word & 0x3FFFFFF) << 2:x}"
+    return decode
+
+
+def _build_decode_tables():
+    """Build the 64-entry funct and opcode dispatch tables"""
+    funct_table = [_unknown('r')] * 64
+    for name, info in R_TYPE_INSTRUCTIONS.items():
+        if name in ['sll', 'srl']:
+            funct_table[info['funct']] = _decode_r_shift(name)
+        elif name == 'jr':
+            funct_table[info['funct']] = _decode_r_jump(name)
+        else:
+            funct_table[info['funct']] = _decode_r_normal(name)
+
+    i_table = [_unknown('i')] * 64
+    for name, info in I_TYPE_INSTRUCTIONS.items():
+        if name in ['lw', 'sw']:
+            i_table[info['opcode']] = _decode_i_memory(name)
+        elif name in ['beq', 'bne']:
+            i_table[info['opcode']] = _decode_i_branch(name)
+        else:
+            i_table[info['opcode']] = _decode_i_normal(name)
+    i_table[SPECIAL_INSTRUCTIONS['lui']['opcode']] = _decode_lui('lui')
+
+    j_table = [_unknown('j')] * 64
+    for name, info in J_TYPE_INSTRUCTIONS.items():
+        j_table[info['opcode']] = _decode_j(name)
+
+    def decode_special(word, address):
+        return funct_table[word & 0x3F](word, address)
+
+    # Opcode 0 defers to the funct table, J opcodes to the J decoders and
+    # everything else is treated as I-type, matching the format dispatch
+    opcode_table = list(i_table)
+    opcode_table[0x00] = decode_special
+    for info in J_TYPE_INSTRUCTIONS.values():
+        opcode_table[info['opcode']] = j_table[info['opcode']]
+
+    return funct_table, i_table, j_table, opcode_table
+
+
+FUNCT_DECODERS, I_DECODERS, J_DECODERS, OPCODE_DECODERS = _build_decode_tables()
+
+# Branches are the only position-dependent encodings
+BRANCH_NAMES = {I_TYPE_INSTRUCTIONS[name]['opcode']: name for name in ['beq', 'bne']}
+
+# Compact instruction model: mnemonic ids index MNEMONICS; 0 is an
+# undecodable word
+MNEMONICS = (['unknown', 'nop'] + list(R_TYPE_INSTRUCTIONS) + list(I_TYPE_INSTRUCTIONS)
+             + ['lui'] + list(J_TYPE_INSTRUCTIONS))
+MNEMONIC_IDS = {name: i for i, name in enumerate(MNEMONICS)}
+NOP_ID = MNEMONIC_IDS['nop']
+SLL_ID = MNEMONIC_IDS['sll']
+
+FUNCT_IDS = [0] * 64
+for _name, _info in R_TYPE_INSTRUCTIONS.items():
+    FUNCT_IDS[_info['funct']] = MNEMONIC_IDS[_name]
+OPCODE_IDS = [0] * 64
+for _name, _info in list(I_TYPE_INSTRUCTIONS.items()) + list(J_TYPE_INSTRUCTIONS.items()):
+    OPCODE_IDS[_info['opcode']] = MNEMONIC_IDS[_name]
+OPCODE_IDS[SPECIAL_INSTRUCTIONS['lui']['opcode']] = MNEMONIC_IDS['lui']
+
+# Opcode (R-type: funct) of every known mnemonic id
+ID_OPCODES = [0] * len(MNEMONICS)
+ID_FUNCTS = [0] * len(MNEMONICS)
+for _name, _info in R_TYPE_INSTRUCTIONS.items():
+    ID_FUNCTS[MNEMONIC_IDS[_name]] = _info['funct']
+for _name, _info in list(I_TYPE_INSTRUCTIONS.items()) + list(J_TYPE_INSTRUCTIONS.items()):
+    ID_OPCODES[MNEMONIC_IDS[_name]] = _info['opcode']
+ID_OPCODES[MNEMONIC_IDS['lui']] = SPECIAL_INSTRUCTIONS['lui']['opcode']
+R_IDS = frozenset(MNEMONIC_IDS[name] for name in R_TYPE_INSTRUCTIONS)
+J_IDS = frozenset(MNEMONIC_IDS[name] for name in J_TYPE_INSTRUCTIONS)
+del _name, _info
+
+
+def mnemonic_id(word):
+    """Mnemonic id of an instruction word, matching how it disassembles"""
+    opcode = word >> 26
+    if opcode:
+        return OPCODE_IDS[opcode]
+    mnemonic = FUNCT_IDS[word & 0x3F]
+    if mnemonic == SLL_ID and not word & 0x001FFFC0:
+        return NOP_ID
+    return mnemonic
+
+
+class Instruction:
+    """One decoded instruction as a compact record
+
+    imm is sign-extended except for lui; target is the absolute byte
+    address of a j/jal. word keeps the original bits so undecodable words
+    still encode back to themselves.
+    """
+    __slots__ = ('mnemonic', 'rs', 'rt', 'rd', 'shamt', 'imm', 'target', 'address', 'word')
+
+    def __init__(self, mnemonic, rs=0, rt=0, rd=0, shamt=0, imm=0, target=0, address=0, word=0):
+        self.mnemonic = mnemonic
+        self.rs = rs
+        self.rt = rt
+        self.rd = rd
+        self.shamt = shamt
+        self.imm = imm
+        self.target = target
+        self.address = address
+        self.word = word
+
+    @classmethod
+    def decode(cls, word, address=0):
+        """Split an instruction word into fields"""
+        mnemonic = MNEMONICS[mnemonic_id(word)]
+        imm = word & 0xFFFF
+        if mnemonic != 'lui':
+            imm = (imm ^ 0x8000) - 0x8000
+        target = (word & 0x3FFFFFF) << 2 if mnemonic in J_TYPE_INSTRUCTIONS else 0
+        return cls(mnemonic, (word >> 21) & 0x1F, (word >> 16) & 0x1F, (word >> 11) & 0x1F,
+                   (word >> 6) & 0x1F, imm, target, address, word)
+
+    def encode(self):
+        """Pack the fields back into an instruction word"""
+        ident = MNEMONIC_IDS[self.mnemonic]
+        if ident == 0:
+            return self.word
+        if ident == NOP_ID:
+            # Shifts of $zero by 0 with a stray rs are also nops
+            return self.word if mnemonic_id(self.word) == NOP_ID else 0
+        if ident in R_IDS:
+            return ((self.rs << 21) | (self.rt << 16) | (self.rd << 11)
+                    | ((self.shamt & 0x1F) << 6) | ID_FUNCTS[ident])
+        if ident in J_IDS:
+            return (ID_OPCODES[ident] << 26) | ((self.target >> 2) & 0x3FFFFFF)
+        return (ID_OPCODES[ident] << 26) | (self.rs << 21) | (self.rt << 16) | (self.imm & 0xFFFF)
+
+    def format(self):
+        """Assembly text for the instruction at its address"""
+        word = self.encode()
+        return OPCODE_DECODERS[word >> 26](word, self.address)
+
+    def __eq__(self, other):
+        if not isinstance(other, Instruction):
+            return NotImplemented
+        return self.encode() == other.encode() and self.address == other.address
+
+    def __repr__(self):
+        return f"Instruction({self.format()!r}, address=0x{self.address:x})"
+
+
+class InstructionArray:
+    """Struct-of-arrays program: packed words plus one mnemonic id byte each
+
+    Every field is a bit range of the word, so a program costs five bytes
+    per instruction; field columns and Instruction records are derived on
+    demand.
+    """
+
+    def __init__(self, words=(), base_address=0):
+        self.words = array('I', words)
+        self.ids = array('B', map(mnemonic_id, self.words))
+        self.base_address = base_address
+
+    @classmethod
+    def from_bytes(cls, data, base_address=0):
+        """Load big-endian machine code"""
+        if len(data) % 4 != 0:
+            raise ValueError("Binary file size must be multiple of 4 bytes")
+        return cls(words_from_bytes(data), base_address)
+
+    def to_bytes(self):
+        return words_to_bytes(self.words)
+
+    @property
+    def nbytes(self):
+        return len(self.words) * self.words.itemsize + len(self.ids) * self.ids.itemsize
+
+    def __len__(self):
+        return len(self.words)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.words)
+        return Instruction.decode(self.words[index], self.base_address + 4 * index)
+
+    def __iter__(self):
+        base = self.base_address
+        for index, word in enumerate(self.words):
+            yield Instruction.decode(word, base + 4 * index)
+
+    def append(self, instruction):
+        """Add an Instruction record or a raw word"""
+        word = instruction if isinstance(instruction, int) else instruction.encode()
+        self.words.append(word)
+        self.ids.append(mnemonic_id(word))
+
+    def mnemonic(self, index):
+        return MNEMONICS[self.ids[index]]
+
+    def column(self, field):
+        """All values of one field as an array: opcode, rs, rt, rd, shamt, funct or imm"""
+        shift, mask, typecode = FIELD_LAYOUT[field]
+        if field == 'imm':
+            return array(typecode, [((word & mask) ^ 0x8000) - 0x8000 for word in self.words])
+        return array(typecode, [(word >> shift) & mask for word in self.words])
+
+    def count(self, mnemonic):
+        """Number of instructions with a mnemonic"""
+        return self.ids.count(MNEMONIC_IDS[mnemonic])
+
+    def format(self):
+        """Disassemble every instruction to a list of lines"""
+        decoders = OPCODE_DECODERS
+        base = self.base_address
+        return [decoders[word >> 26](word, base + 4 * index)
+                for index, word in enumerate(self.words)]
+
+
+# field -> (shift, mask, array typecode) for InstructionArray.column
+FIELD_LAYOUT = {
+    'opcode': (26, 0x3F, 'B'),
+    'rs': (21, 0x1F, 'B'),
+    'rt': (16, 0x1F, 'B'),
+    'rd': (11, 0x1F, 'B'),
+    'shamt': (6, 0x1F, 'B'),
+    'funct': (0, 0x3F, 'B'),
+    'imm': (0, 0xFFFF, 'h'),
+}
+
+# Bytes decoded per step when streaming (must be a multiple of 4)
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def read_chunks(input_file, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield a binary input in fixed-size chunks ('-' reads stdin)"""
+    if input_file == '-':
+        f = sys.stdin.buffer
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    
+    with open(input_file, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for start in range(0, size, chunk_size):
+                yield mm[start:start + chunk_size]
+
+
+# Distinct words a DecodeCache holds (at most twice this across its two
+# generations)
+DECODE_CACHE_SIZE = 1 << 16
+
+# Images at least this large are streamed through a DecodeCache even when
+# the Disassembler has none; below it the cache does not pay for itself
+DECODE_CACHE_MIN_BYTES = 1024 * 1024
+
+# Words looked up per pass; once the cache is full, a pass whose first
+# DECODE_SAMPLE words miss more often than MISS_LIMIT bypasses it
+DECODE_BLOCK = 1 << 14
+DECODE_SAMPLE = 256
+MISS_LIMIT = 0.75
+
+
+class DecodeCache:
+    """Bounded memo of decoded words with hit statistics
+
+    Position-independent words map to their text, so a repeated word
+    costs one dict lookup (done for a whole buffer at once with map).
+    Branch targets depend on the address, so branches only cache their
+    operand prefix, keyed by opcode/rs/rt, and format the target each
+    time. When the word table fills it becomes the old generation and
+    the previous old one is dropped; old entries that are hit again move
+    back, so the words in use survive the way they would in an LRU
+    without reordering on every hit.
+    """
+
+    def __init__(self, size=DECODE_CACHE_SIZE):
+        self.size = size
+        self.recent = {}
+        self.old = {}
+        self.prefixes = {}
+        self.lookups = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def hits(self):
+        return self.lookups - self.misses
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def stats(self):
+        """Lookups, hits, misses, evictions, hit rate and words held"""
+        return {'lookups': self.lookups, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hit_rate': self.hit_rate,
+                'entries': len(self.recent) + len(self.old)}
+
+    def clear(self):
+        self.__init__(self.size)
+
+    def rotate(self):
+        """Make the full word table the old generation, dropping the previous one"""
+        self.evictions += len(self.old)
+        self.old = self.recent
+        self.recent = {}
+
+    def decode(self, word, address):
+        """Text of one word at address"""
+        return self.decode_words(array('I', [word]), address)[0]
+
+    def decode_bytes(self, data, base_address=0):
+        """Texts of the big-endian words in data, the first at base_address"""
+        return self.decode_words(words_from_bytes(data), base_address)
+
+    def decode_words(self, words, base_address=0):
+        """Texts of a sequence of words, the first at base_address"""
+        decoders = OPCODE_DECODERS
+        texts = []
+        for start in range(0, len(words), DECODE_BLOCK):
+            block = words[start:start + DECODE_BLOCK]
+            address = base_address + 4 * start
+            if len(self.recent) + len(self.old) >= self.size:
+                # A block whose first words mostly miss a full cache is a
+                # scan through one-off words: decode it without evicting
+                # the words in use (and count it all as misses)
+                sample = block[:DECODE_SAMPLE]
+                if self.count_misses(sample) > MISS_LIMIT * len(sample):
+                    self.lookups += len(block)
+                    self.misses += len(block)
+                    texts += [decoders[word >> 26](word, address + 4 * i)
+                              for i, word in enumerate(block)]
+                    continue
+            found = list(map(self.recent.get, block))
+            self.lookups += len(found)
+            if None in found:
+                self.resolve(found, block, address)
+            texts += found
+        return texts
+
+    def count_misses(self, words):
+        """How many of words neither generation (or the branch prefixes) holds"""
+        recent, old, prefixes = self.recent, self.old, self.prefixes
+        misses = 0
+        for word in words:
+            if word >> 26 in BRANCH_NAMES:
+                misses += word >> 16 not in prefixes
+            elif word not in recent and word not in old:
+                misses += 1
+        return misses
+
+    def resolve(self, texts, words, base_address):
+        """Fill the None entries of texts with the decoded words, caching them"""
+        recent, old, prefixes, size = self.recent, self.old, self.prefixes, self.size
+        decoders = OPCODE_DECODERS
+        misses = 0
+        find = texts.index
+        index = -1
+        try:
+            while True:
+                index = find(None, index + 1)
+                word = words[index]
+                opcode = word >> 26
+                if opcode in BRANCH_NAMES:
+                    prefix = prefixes.get(word >> 16)
+                    if prefix is None:
+                        misses += 1
+                        prefix = prefixes[word >> 16] = (
+                            f"{BRANCH_NAMES[opcode]} {REG_LIST[(word >> 21) & 0x1F]}, "
+                            f"{REG_LIST[(word >> 16) & 0x1F]}, ")
+                    target = base_address + 4 * index + 4 + 4 * (((word & 0xFFFF) ^ 0x8000) - 0x8000)
+                    texts[index] = f"{prefix}0x{target & 0xFFFFFFFF:x}"
+                else:
+                    # Repeats of a word first seen earlier in this block hit here
+                    text = recent.get(word)
+                    if text is None:
+                        text = old.pop(word, None)
+                        if text is None:
+                            misses += 1
+                            text = decoders[opcode](word, 0)
+                        if len(recent) >= size:
+                            self.rotate()
+                            recent, old = self.recent, self.old
+                        recent[word] = text
+                    texts[index] = text
+        except ValueError:
+            pass
+        self.misses += misses
+
+
+# Bytes handed to each process pool task in parallel mode
+PARALLEL_CHUNK_SIZE = 1024 * 1024
+
+
+def _disassemble_range(input_file, start, stop, base_address):
+    """Pool worker: disassemble bytes [start, stop) of a file"""
+    # Every worker maps the same file, so the image is shared through the
+    # page cache rather than pickled to each process
+    with open(input_file, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = mm[start:stop]
+    if len(data) >= DECODE_CACHE_MIN_BYTES:
+        lines = DecodeCache().decode_bytes(data, base_address)
+    else:
+        lines = Disassembler().disassemble_bytes(data, base_address)
+    return len(lines), ''.join(f"    {line}\n" for line in lines)
+
+
+def write_listing(output_file, blocks):
+    """Write the listing header then (count, text) blocks ('-' for stdout)"""
+    if output_file == '-':
+        out = sys.stdout
+    else:
+        out = open(output_file, 'w', buffering=io.DEFAULT_BUFFER_SIZE * 8)
+    
+    count = 0
+    try:
+        out.write("# Disassembled MIPS code\n\n")
+        for block_count, text in blocks:
+            out.write(text)
+            count += block_count
+        out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return count
+
+
+class Disassembler:
+    def __init__(self, cache_size=0):
+        self.address = 0
+        # Opt-in: a cache pays off on long-lived instances and large
+        # images with repeated words, not on one-off small buffers
+        self.cache = DecodeCache(cache_size) if cache_size else None
+        
+    def get_register_name(self, reg_num):
+        """Get register name from number"""
+        return REG_NAMES.get(reg_num, f"${reg_num}")
+    
+    def disassemble_r_type(self, instruction):
+        """Disassemble R-type instruction"""
+        return FUNCT_DECODERS[instruction & 0x3F](instruction, self.address)
+    
+    def disassemble_i_type(self, instruction):
+        """Disassemble I-type instruction"""
+        return I_DECODERS[(instruction >> 26) & 0x3F](instruction, self.address)
+    
+    def disassemble_j_type(self, instruction):
+        """Disassemble J-type instruction"""
+        return J_DECODERS[(instruction >> 26) & 0x3F](instruction, self.address)
+    
+    def decode(self, word):
+        """Disassemble any instruction word at the current address"""
+        return OPCODE_DECODERS[(word >> 26) & 0x3F](word, self.address)
+    
+    def disassemble_bytes(self, data, base_address=0):
+        """Disassemble big-endian machine code (bytes or memoryview) to a list of lines"""
+        if len(data) % 4 != 0:
+            raise ValueError("Binary file size must be multiple of 4 bytes")
+        if self.cache is not None:
+            return self.cache.decode_bytes(data, base_address)
+        decoders = OPCODE_DECODERS
+        return [decoders[word >> 26](word, base_address + 4 * i)
+                for i, (word,) in enumerate(struct.iter_unpack('>I', data))]
+    
+    def disassemble_instructions(self, instructions):
+        """Disassemble an InstructionArray to a list of lines"""
+        self.address = instructions.base_address + 4 * len(instructions)
+        return instructions.format()
+    
+    def disassemble_words(self, data, base_address=0):
+        """Disassemble a whole buffer of big-endian words in bulk"""
+        if len(data) % 4 != 0:
+            raise ValueError("Binary file size must be multiple of 4 bytes")
+        try:
+            import numpy as np
+        except ImportError:
+            return self.disassemble_bytes(data, base_address)
+        
+        words = np.frombuffer(data, dtype='>u4').astype(np.uint32)
+        opcode = words >> 26
+        rs = (words >> 21) & 0x1F
+        rt = (words >> 16) & 0x1F
+        imm = ((words & 0xFFFF).astype(np.int64) ^ 0x8000) - 0x8000
+        is_branch = np.isin(opcode, list(BRANCH_NAMES))
+        lines = np.empty(len(words), dtype=object)
+        
+        # Everything but branches formats the same at any address, so each
+        # distinct word is decoded only once
+        static = ~is_branch
+        unique, inverse = np.unique(words[static], return_inverse=True)
+        decoders = OPCODE_DECODERS
+        formatted = np.empty(len(unique), dtype=object)
+        formatted[:] = [decoders[word >> 26](word, 0) for word in unique.tolist()]
+        lines[static] = formatted[inverse.ravel()]
+        
+        # Branch targets are computed in bulk; only the operand prefix is
+        # formatted per distinct opcode/rs/rt combination
+        index = np.nonzero(is_branch)[0]
+        targets = (base_address + 4 * index.astype(np.int64) + 4 + 4 * imm[index]) & 0xFFFFFFFF
+        prefixes = {}
+        branch_lines = []
+        for op, s, t, target in zip(opcode[index].tolist(), rs[index].tolist(),
+                                    rt[index].tolist(), targets.tolist()):
+            key = (op << 10) | (s << 5) | t
+            prefix = prefixes.get(key)
+            if prefix is None:
+                prefix = f"{BRANCH_NAMES[op]} {REG_LIST[s]}, {REG_LIST[t]}, "
+                prefixes[key] = prefix
+            branch_lines.append(f"{prefix}0x{target:x}")
+        branch_array = np.empty(len(branch_lines), dtype=object)
+        branch_array[:] = branch_lines
+        lines[index] = branch_array
+        
+        return lines.tolist()
+    
+    def iter_disassemble(self, chunks, base_address=0, cache=None):
+        """Yield one list of disassembled lines per chunk of input bytes
+
+        cache is a DecodeCache to decode through, by default self.cache.
+        """
+        cache = cache or self.cache
+        decoders = OPCODE_DECODERS
+        self.address = base_address
+        pending = b''
+        for chunk in chunks:
+            if pending:
+                chunk = pending + chunk
+            usable = len(chunk) & ~3
+            pending = chunk[usable:]
+            address = self.address
+            words = chunk[:usable] if pending else chunk
+            if cache is not None:
+                lines = [f"    {line}\n" for line in cache.decode_bytes(words, address)]
+            else:
+                lines = [f"    {decoders[word >> 26](word, address + 4 * i)}\n"
+                         for i, (word,) in enumerate(struct.iter_unpack('>I', words))]
+            self.address = address + 4 * len(lines)
+            yield lines
+        
+        if pending:
+            raise ValueError("Binary file size must be multiple of 4 bytes")
+    
+    def disassemble_stream(self, input_file, output_file):
+        """Disassemble binary to MIPS assembly chunk by chunk ('-' for stdin/stdout)"""
+        size = None if input_file == '-' else os.path.getsize(input_file)
+        if size is not None and size % 4 != 0:
+            raise ValueError("Binary file size must be multiple of 4 bytes")
+        
+        cache = None
+        if self.cache is None and size is not None and size >= DECODE_CACHE_MIN_BYTES:
+            cache = DecodeCache()
+        blocks = ((len(lines), ''.join(lines))
+                  for lines in self.iter_disassemble(read_chunks(input_file), cache=cache))
+        count = write_listing(output_file, blocks)
+        
+        status = sys.stderr if output_file == '-' else sys.stdout
+        print(f"Disassembled {count} instructions to {output_file}", file=status)
+        return count
+    
+    def disassemble_parallel(self, input_file, output_file, jobs=None,
+                             chunk_size=PARALLEL_CHUNK_SIZE):
+        """Disassemble binary to MIPS assembly across a process pool"""
+        if input_file == '-':
+            # A pipe cannot be shared between workers
+            return self.disassemble_stream(input_file, output_file)
+        
+        size = os.path.getsize(input_file)
+        if size % 4 != 0:
+            raise ValueError("Binary file size must be multiple of 4 bytes")
+        
+        # Chunks start on word boundaries so each worker knows its base address
+        chunk_size -= chunk_size % 4
+        starts = range(0, size, chunk_size)
+        stops = [min(start + chunk_size, size) for start in starts]
+        
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            # map() yields results in submission order, stitching the output
+            blocks = pool.map(_disassemble_range, [input_file] * len(starts),
+                              starts, stops, starts)
+            count = write_listing(output_file, blocks)
+        self.address = size
+        
+        status = sys.stderr if output_file == '-' else sys.stdout
+        print(f"Disassembled {count} instructions to {output_file}", file=status)
+        return count
+    
+    def recover_cfg(self, data, base_address=0):
+        """Recover basic blocks, functions and labels from machine code"""
+        from . import cfg
+        return cfg.recover(data, base_address)
+    
+    def disassemble_labeled(self, input_file, output_file, input_format='raw-be'):
+        """Disassemble binary to MIPS assembly with synthesized labels"""
+        from . import formats
+        graph = self.recover_cfg(formats.read_image(input_file, input_format))
+        out = sys.stdout if output_file == '-' else open(output_file, 'w')
+        try:
+            out.writelines(graph.listing())
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        self.address = graph.end_address
+        
+        count = len(graph.words)
+        status = sys.stderr if output_file == '-' else sys.stdout
+        print(f"Disassembled {count} instructions ({len(graph.starts)} blocks, "
+              f"{len(graph.labels)} labels) to {output_file}", file=status)
+        return count
+    
+    def disassemble(self, input_file, output_file, batch=False, input_format='raw-be'):
+        """Disassemble binary to MIPS assembly"""
+        if input_format == 'raw-be':
+            if not batch:
+                return self.disassemble_stream(input_file, output_file)
+            with open(input_file, 'rb') as f:
+                data = f.read()
+        else:
+            # Other encodings are decoded to big-endian code up front
+            from . import formats
+            data = formats.read_image(input_file, input_format)
+        
+        # Verify file size is multiple of 4
+        if len(data) % 4 != 0:
+            raise ValueError("Binary file size must be multiple of 4 bytes")
+        
+        instructions = [f"    {instr}" for instr in self.disassemble_words(data)]
+        self.address = len(data)
+        
+        # Write output
+        with open(output_file, 'w') as f:
+            f.write("# Disassembled MIPS code\n\n")
+            for instr in instructions:
+                f.write(instr + '\n')
+        
+        print(f"Disassembled {len(instructions)} instructions to {output_file}")
+        return len(instructions)
@@ -0,0 +1,256 @@
+"""
+Word-level differences between two images.
+
+Equal-length images are compared in place: the buffers are XORed (with
+NumPy when installed, otherwise as big integers a chunk at a time) and
+one regex scan over a byte per word finds the runs of changed words.
+Runs that might hide an inserted or deleted run of instructions, and
+images of different lengths, go through Myers' linear-space sequence
+diff, with snakes extended by galloping comparisons of the raw bytes so
+long unchanged stretches cost a few memcmps. Only changed words are
+decoded.
+
+Hunks are (tag, i1, i2, j1, j2) word ranges like difflib opcodes, with
+tag 'replace', 'delete' or 'insert'.
+"""
+
+import re
+import struct
+
+from .core import OPCODE_DECODERS
+
+# Words compared per XOR pass
+CHUNK_WORDS = 1 << 20
+
+# Changed runs separated by at most this many equal words are diffed
+# together, since a shifted stretch can line up by chance here and there
+MERGE_GAP = 4
+
+# Edit steps from each end before a sequence diff gives up and reports
+# the region word by word
+MAX_COST = 500
+
+CHANGED_RUN = re.compile(rb'[^\x00]+')
+CHANGED_SPAN = re.compile(rb'[^\x00]+(?:\x00{1,%d}[^\x00]+)*' % MERGE_GAP)
+
+
+def changed_flags(old, new, i, j, count):
+    """One byte per word of old[i:i+count] against new[j:j+count], nonzero where they differ"""
+    a = old[4 * i:4 * (i + count)]
+    b = new[4 * j:4 * (j + count)]
+    try:
+        import numpy as np
+    except ImportError:
+        x = (int.from_bytes(a, 'big') ^ int.from_bytes(b, 'big')).to_bytes(len(a), 'big')
+        flags = (int.from_bytes(x[0::4], 'big') | int.from_bytes(x[1::4], 'big')
+                 | int.from_bytes(x[2::4], 'big') | int.from_bytes(x[3::4], 'big'))
+        return flags.to_bytes(count, 'big')
+    return (np.frombuffer(a, dtype='>u4') != np.frombuffer(b, dtype='>u4')).view(np.uint8).tobytes()
+
+
+def changed_runs(old, new, i, j, count, gap=0):
+    """Offsets (start, stop) of runs of differing words, merging runs at most gap apart"""
+    pattern = CHANGED_SPAN if gap else CHANGED_RUN
+    runs = []
+    for chunk in range(0, count, CHUNK_WORDS):
+        size = min(CHUNK_WORDS, count - chunk)
+        for match in pattern.finditer(changed_flags(old, new, i + chunk, j + chunk, size)):
+            start, stop = chunk + match.start(), chunk + match.end()
+            if runs and start - runs[-1][1] <= gap:
+                runs[-1] = (runs[-1][0], stop)
+            else:
+                runs.append((start, stop))
+    return runs
+
+
+def common_run(a, b, x, y, limit):
+    """How many words from a[x] and b[y] on are equal, at most limit"""
+    if limit <= 0 or a[4 * x:4 * x + 4] != b[4 * y:4 * y + 4]:
+        return 0
+    # Gallop, then binary search the block holding the first difference
+    low = step = 1
+    while (low + step <= limit
+           and a[4 * (x + low):4 * (x + low + step)] == b[4 * (y + low):4 * (y + low + step)]):
+        low += step
+        step *= 2
+    high = min(low + step - 1, limit)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[4 * (x + low):4 * (x + mid)] == b[4 * (y + low):4 * (y + mid)]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def common_tail(a, b, x, y, limit):
+    """How many words ending just before a[x] and b[y] are equal, at most limit"""
+    if limit <= 0 or a[4 * x - 4:4 * x] != b[4 * y - 4:4 * y]:
+        return 0
+    low = step = 1
+    while (low + step <= limit
+           and a[4 * (x - low - step):4 * (x - low)] == b[4 * (y - low - step):4 * (y - low)]):
+        low += step
+        step *= 2
+    high = min(low + step - 1, limit)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[4 * (x - mid):4 * (x - low)] == b[4 * (y - mid):4 * (y - low)]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def middle_snake(a, b, a_lo, a_hi, b_lo, b_hi, max_cost=MAX_COST):
+    """Point (x, y) where a shortest edit script splits, or None past max_cost steps
+
+    Myers' bisection: forward and reverse searches along diagonals until
+    their furthest-reaching paths overlap.
+    """
+    n, m = a_hi - a_lo, b_hi - b_lo
+    max_d = min((n + m + 1) // 2, max_cost)
+    offset = max_d + 1
+    size = 2 * offset + 1
+    forward = [-1] * size
+    reverse = [-1] * size
+    forward[offset + 1] = reverse[offset + 1] = 0
+    delta = n - m
+    odd = delta % 2 != 0
+    # Diagonals that ran off the edges are trimmed from the ends of each sweep
+    k1_start = k1_end = k2_start = k2_end = 0
+    for d in range(max_d):
+        for k1 in range(-d + k1_start, d + 1 - k1_end, 2):
+            k1_offset = offset + k1
+            if k1 == -d or (k1 != d and forward[k1_offset - 1] < forward[k1_offset + 1]):
+                x1 = forward[k1_offset + 1]
+            else:
+                x1 = forward[k1_offset - 1] + 1
+            y1 = x1 - k1
+            x1 += common_run(a, b, a_lo + x1, b_lo + y1, min(n - x1, m - y1))
+            y1 = x1 - k1
+            forward[k1_offset] = x1
+            if x1 > n:
+                k1_end += 2
+            elif y1 > m:
+                k1_start += 2
+            elif odd:
+                k2_offset = offset + delta - k1
+                if 0 <= k2_offset < size and reverse[k2_offset] != -1:
+                    if x1 >= n - reverse[k2_offset]:
+                        return a_lo + x1, b_lo + y1
+        for k2 in range(-d + k2_start, d + 1 - k2_end, 2):
+            k2_offset = offset + k2
+            if k2 == -d or (k2 != d and reverse[k2_offset - 1] < reverse[k2_offset + 1]):
+                x2 = reverse[k2_offset + 1]
+            else:
+                x2 = reverse[k2_offset - 1] + 1
+            y2 = x2 - k2
+            x2 += common_tail(a, b, a_hi - x2, b_hi - y2, min(n - x2, m - y2))
+            y2 = x2 - k2
+            reverse[k2_offset] = x2
+            if x2 > n:
+                k2_end += 2
+            elif y2 > m:
+                k2_start += 2
+            elif not odd:
+                k1_offset = offset + delta - k2
+                if 0 <= k1_offset < size and forward[k1_offset] != -1:
+                    x1 = forward[k1_offset]
+                    y1 = offset + x1 - k1_offset
+                    if x1 >= n - x2:
+                        return a_lo + x1, b_lo + y1
+    return None
+
+
+def sequence_diff(a, b, a_lo, a_hi, b_lo, b_hi, hunks, max_cost=MAX_COST):
+    """Append (i1, i2, j1, j2) ranges turning a[a_lo:a_hi] into b[b_lo:b_hi]"""
+    pending = [(a_lo, a_hi, b_lo, b_hi)]
+    while pending:
+        a_lo, a_hi, b_lo, b_hi = pending.pop()
+        run = common_run(a, b, a_lo, b_lo, min(a_hi - a_lo, b_hi - b_lo))
+        a_lo += run
+        b_lo += run
+        run = common_tail(a, b, a_hi, b_hi, min(a_hi - a_lo, b_hi - b_lo))
+        a_hi -= run
+        b_hi -= run
+        if a_lo == a_hi and b_lo == b_hi:
+            continue
+        if a_lo == a_hi or b_lo == b_hi:
+            hunks.append((a_lo, a_hi, b_lo, b_hi))
+            continue
+        split = middle_snake(a, b, a_lo, a_hi, b_lo, b_hi, max_cost)
+        if split is not None:
+            x, y = split
+            pending.append((x, a_hi, y, b_hi))
+            pending.append((a_lo, x, b_lo, y))
+        elif a_hi - a_lo == b_hi - b_lo:
+            hunks.extend((a_lo + start, a_lo + stop, b_lo + start, b_lo + stop)
+                         for start, stop in changed_runs(a, b, a_lo, b_lo, a_hi - a_lo))
+        else:
+            hunks.append((a_lo, a_hi, b_lo, b_hi))
+
+
+def opcodes(hunks):
+    """Sort ranges, join touching ones and tag them"""
+    merged = []
+    for hunk in sorted(hunks):
+        if merged and merged[-1][1] == hunk[0] and merged[-1][3] == hunk[2]:
+            merged[-1] = (merged[-1][0], hunk[1], merged[-1][2], hunk[3])
+        else:
+            merged.append(hunk)
+    result = []
+    for i1, i2, j1, j2 in merged:
+        tag = 'replace' if i1 < i2 and j1 < j2 else 'delete' if i1 < i2 else 'insert'
+        result.append((tag, i1, i2, j1, j2))
+    return result
+
+
+def diff_words(old, new, max_cost=MAX_COST):
+    """Hunks turning big-endian image old into new"""
+    if len(old) % 4 or len(new) % 4:
+        raise ValueError("Binary file size must be multiple of 4 bytes")
+    n, m = len(old) // 4, len(new) // 4
+    hunks = []
+    if n == m:
+        first = common_run(old, new, 0, 0, n)
+        count = n - first - common_tail(old, new, n, n, n - first)
+        for start, stop in changed_runs(old, new, first, first, count, MERGE_GAP):
+            start += first
+            stop += first
+            if stop - start == 1:
+                hunks.append((start, stop, start, stop))
+            else:
+                sequence_diff(old, new, start, stop, start, stop, hunks, max_cost)
+    else:
+        sequence_diff(old, new, 0, n, 0, m, hunks, max_cost)
+    return opcodes(hunks)
+
+
+def summarize(hunks):
+    """Counts of hunks and of replaced, deleted and inserted words"""
+    summary = {'hunks': len(hunks), 'replaced': 0, 'deleted': 0, 'inserted': 0}
+    for tag, i1, i2, j1, j2 in hunks:
+        if tag == 'replace':
+            summary['replaced'] += max(i2 - i1, j2 - j1)
+        elif tag == 'delete':
+            summary['deleted'] += i2 - i1
+        else:
+            summary['inserted'] += j2 - j1
+    return summary
+
+
+def format_words(prefix, data, start, stop):
+    """Lines of decoded words start..stop of data, each marked with prefix"""
+    decoders = OPCODE_DECODERS
+    for i, (word,) in enumerate(struct.iter_unpack('>I', data[4 * start:4 * stop]), start):
+        address = 4 * i
+        yield f"{prefix}0x{address:x}: {word:08x}  {decoders[word >> 26](word, address)}"
+
+
+def format_hunk(old, new, hunk):
+    """diff-style lines for one hunk: a header, then old words (-) and new words (+)"""
+    tag, i1, i2, j1, j2 = hunk
+    yield f"@@ -0x{4 * i1:x},{i2 - i1} +0x{4 * j1:x},{j2 - j1} @@ {tag}"
+    yield from format_words('-', old, i1, i2)
+    yield from format_words('+', new, j1, j2)
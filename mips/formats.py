@@ -0,0 +1,174 @@
+"""
+Image encodings for assembled programs.
+
+The assembler produces big-endian machine code; these writers serialize
+it in bulk as raw big- or little-endian words, plain hex (one word per
+line), Verilog $readmemh text, or Intel HEX, and the matching readers
+turn each back into big-endian code for the disassembler. Text formats
+are produced with one hexlify call per chunk rather than per word.
+"""
+
+import binascii
+import re
+import sys
+from array import array
+
+FORMATS = ['raw-be', 'raw-le', 'hex', 'memh', 'ihex']
+
+# Bytes converted per hexlify call in the text writers (a multiple of 16)
+CHUNK_SIZE = 64 * 1024
+
+COMMENT_PATTERN = re.compile(r'//[^\n]*')
+
+# Intel HEX data bytes per record
+IHEX_RECORD_SIZE = 16
+
+
+def swap_words(data):
+    """Reverse the byte order of every 32-bit word"""
+    words = array('I')
+    words.frombytes(data)
+    words.byteswap()
+    return words.tobytes()
+
+
+def hex_lines(code):
+    """Yield one word per line as 8 hex digits, a chunk at a time"""
+    for start in range(0, len(code), CHUNK_SIZE):
+        chunk = code[start:start + CHUNK_SIZE]
+        yield binascii.hexlify(chunk, '\n', 4).decode('ascii') + '\n'
+
+
+def ihex_record(address, record_type, data):
+    """Format one Intel HEX record with its checksum"""
+    record = bytes([len(data), address >> 8, address & 0xFF, record_type]) + data
+    checksum = -sum(record) & 0xFF
+    return f":{binascii.hexlify(record).decode('ascii').upper()}{checksum:02X}\n"
+
+
+def ihex_lines(code):
+    """Yield Intel HEX records, with an extended linear address every 64 KB"""
+    for segment in range(0, len(code), 0x10000):
+        if segment:
+            yield ihex_record(0, 0x04, (segment >> 16).to_bytes(2, 'big'))
+        lines = []
+        stop = min(segment + 0x10000, len(code))
+        for start in range(segment, stop, IHEX_RECORD_SIZE):
+            lines.append(ihex_record(start & 0xFFFF, 0x00,
+                                     code[start:min(start + IHEX_RECORD_SIZE, stop)]))
+        yield ''.join(lines)
+    yield ihex_record(0, 0x01, b'')
+
+
+def encode_image(code, fmt):
+    """Serialize big-endian code: bytes for raw formats, else an iterator of text"""
+    if fmt == 'raw-be':
+        return code
+    if fmt == 'raw-le':
+        return swap_words(code)
+    if fmt == 'hex':
+        return hex_lines(code)
+    if fmt == 'memh':
+        header = f"// MIPS32 image, {len(code) // 4} words\n@00000000\n"
+        return iter([header, *hex_lines(code)])
+    if fmt == 'ihex':
+        return ihex_lines(code)
+    raise ValueError(f"Unknown format: {fmt}")
+
+
+def write_image(path, code, fmt='raw-be'):
+    """Write big-endian code to path in the given format"""
+    encoded = encode_image(code, fmt)
+    if isinstance(encoded, bytes):
+        with open(path, 'wb') as f:
+            f.write(encoded)
+    else:
+        with open(path, 'w') as f:
+            f.writelines(encoded)
+
+
+def place(image, address, data):
+    """Copy data into a growable bytearray at address, zero-filling gaps"""
+    end = address + len(data)
+    if end > len(image):
+        image.extend(bytes(end - len(image)))
+    image[address:end] = data
+
+
+def parse_words(text):
+    """Convert whitespace-separated hex words to big-endian bytes"""
+    words = text.split()
+    if all(len(word) == 8 for word in words):
+        return bytes.fromhex(''.join(words))
+    return b''.join(int(word, 16).to_bytes(4, 'big') for word in words)
+
+
+def parse_memh(text):
+    """Parse hex words, with optional // comments and @word-address records"""
+    if '//' in text:
+        text = COMMENT_PATTERN.sub('', text)
+    if '@' not in text:
+        return parse_words(text)
+
+    # Each @address starts a run of consecutive words, converted in bulk
+    segments = text.split('@')
+    image = bytearray(parse_words(segments[0]))
+    for segment in segments[1:]:
+        address, *words = segment.split(None, 1)
+        place(image, int(address, 16) * 4, parse_words(''.join(words)))
+    return bytes(image)
+
+
+def parse_ihex(text):
+    """Parse Intel HEX records, verifying checksums"""
+    image = bytearray()
+    base = 0
+    for lineno, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        if not line.startswith(':'):
+            raise ValueError(f"Invalid Intel HEX record on line {lineno}")
+        record = bytes.fromhex(line[1:])
+        if len(record) < 5 or len(record) != record[0] + 5:
+            raise ValueError(f"Invalid Intel HEX record length on line {lineno}")
+        if sum(record) & 0xFF:
+            raise ValueError(f"Intel HEX checksum mismatch on line {lineno}")
+        record_type = record[3]
+        data = record[4:-1]
+        if record_type == 0x00:
+            place(image, base + ((record[1] << 8) | record[2]), data)
+        elif record_type == 0x01:
+            break
+        elif record_type == 0x02:
+            base = int.from_bytes(data, 'big') << 4
+        elif record_type == 0x04:
+            base = int.from_bytes(data, 'big') << 16
+    return bytes(image)
+
+
+def decode_image(data, fmt):
+    """Turn the contents of an image file back into big-endian code"""
+    if fmt == 'raw-be':
+        code = data
+    elif fmt == 'raw-le':
+        if len(data) % 4 != 0:
+            raise ValueError("Binary file size must be multiple of 4 bytes")
+        code = swap_words(data)
+    elif fmt in ('hex', 'memh'):
+        code = parse_memh(data.decode('ascii'))
+    elif fmt == 'ihex':
+        code = parse_ihex(data.decode('ascii'))
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+    if len(code) % 4 != 0:
+        raise ValueError("Binary file size must be multiple of 4 bytes")
+    return code
+
+
+def read_image(path, fmt='raw-be'):
+    """Read an image file in the given format as big-endian code ('-' for stdin)"""
+    if path == '-':
+        return decode_image(sys.stdin.buffer.read(), fmt)
+    with open(path, 'rb') as f:
+        return decode_image(f.read(), fmt)
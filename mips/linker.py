@@ -0,0 +1,180 @@
+"""
+Relocatable object files and a linker for multi-file programs.
+
+An object holds one module's encoded words, its symbol table (every label
+it defines, as an offset into the module) and a relocation per j/jal and
+per branch to a label the module does not define. Local branches are
+PC-relative and need no relocation. Numeric targets are absolute
+addresses in the linked image, for branches as for j/jal: a branch to a
+number gets a relocation holding that address, so it still reaches it
+wherever the module is placed. Linking places objects one after another
+in the order given and patches each relocation with the final address;
+a module's own labels take precedence over other modules'.
+
+File layout: the header (magic, version, metadata length), UTF-8 JSON
+metadata with the symbols and relocations, then big-endian code.
+"""
+
+import json
+import struct
+from array import array
+
+from .core import (BRANCH_MNEMONICS, I_TYPE_INSTRUCTIONS, J_TYPE_INSTRUCTIONS, OPERAND_SYM,
+                  Assembler, AssemblyError, words_from_bytes, words_to_bytes)
+
+MAGIC = b'MOBJ'
+# Version 2 added absolute branch relocations; version 1 objects read unchanged
+VERSION = 2
+HEADER = struct.Struct('>4sHI')
+
+# Relocation kinds
+RELOC_BRANCH = 'branch'
+RELOC_JUMP = 'jump'
+# A branch to a numeric address: the relocation's symbol is the address
+RELOC_BRANCH_ABSOLUTE = 'branch-absolute'
+
+BRANCH_OPCODES = frozenset(I_TYPE_INSTRUCTIONS[name]['opcode'] for name in BRANCH_MNEMONICS)
+
+
+class ObjectFile:
+    """One assembled module: words, exported symbols, imports and relocations"""
+
+    def __init__(self, words, symbols, relocations, name=''):
+        self.words = words
+        self.symbols = symbols
+        self.relocations = relocations
+        self.name = name
+
+    @property
+    def imports(self):
+        """Symbols referenced but not defined by this module"""
+        return sorted({symbol for _, kind, symbol in self.relocations
+                       if kind != RELOC_BRANCH_ABSOLUTE and symbol not in self.symbols})
+
+    def to_bytes(self):
+        metadata = json.dumps({'symbols': self.symbols, 'imports': self.imports,
+                               'relocations': self.relocations},
+                              separators=(',', ':')).encode('utf-8')
+        return HEADER.pack(MAGIC, VERSION, len(metadata)) + metadata + words_to_bytes(self.words)
+
+    @classmethod
+    def from_bytes(cls, data, name=''):
+        if len(data) < HEADER.size:
+            raise ValueError(f"{name}: not an object file")
+        magic, version, size = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"{name}: not an object file")
+        if not 1 <= version <= VERSION:
+            raise ValueError(f"{name}: unsupported object version {version}")
+        metadata = json.loads(data[HEADER.size:HEADER.size + size].decode('utf-8'))
+        code = data[HEADER.size + size:]
+        if len(code) % 4 != 0:
+            raise ValueError(f"{name}: truncated object file")
+        relocations = [tuple(entry) for entry in metadata['relocations']]
+        return cls(words_from_bytes(code), metadata['symbols'], relocations, name)
+
+    def write(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def read(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read(), path)
+
+
+def assemble_object(lines, name=''):
+    """Assemble source lines to an ObjectFile, leaving undefined labels as imports"""
+    assembler = Assembler()
+    words = assembler.first_pass(lines)
+    labels = assembler.labels
+    relocations = []
+    for index, token in assembler.fixups:
+        symbol = token.values[-1] if token.kinds.endswith(OPERAND_SYM) else None
+        if token.mnemonic in J_TYPE_INSTRUCTIONS:
+            kind = RELOC_JUMP
+        elif token.mnemonic in I_TYPE_INSTRUCTIONS and symbol not in labels:
+            kind = RELOC_BRANCH
+        else:
+            kind = None
+        assembler.current_address = index * 4
+        try:
+            words[index] = assembler.encode_line(token)
+        except AssemblyError as e:
+            raise e.locate(token.text, assembler.line_numbers[index]) from e
+        if kind is not None and symbol is not None:
+            relocations.append((index, kind, symbol))
+
+    # Branches to numeric targets were encoded in the first pass relative
+    # to the module's own start; record the absolute address they name
+    patched = {index for index, _ in assembler.fixups}
+    for index, word in enumerate(words):
+        if word >> 26 in BRANCH_OPCODES and index not in patched:
+            offset = ((word & 0xFFFF) ^ 0x8000) - 0x8000
+            relocations.append((index, RELOC_BRANCH_ABSOLUTE, 4 * index + 4 + 4 * offset))
+    relocations.sort()
+    return ObjectFile(words, dict(labels), relocations, name)
+
+
+def assemble_object_file(input_file, output_file):
+    """Assemble a .asm file to a .o file, returning the ObjectFile"""
+    with open(input_file, 'r') as f:
+        obj = assemble_object(f, input_file)
+    obj.write(output_file)
+    return obj
+
+
+def link(objects):
+    """Link ObjectFiles in order into (big-endian code, global symbol table)"""
+    bases = []
+    address = 0
+    for obj in objects:
+        bases.append(address)
+        address += 4 * len(obj.words)
+
+    exports = {}
+    duplicates = set()
+    for obj, base in zip(objects, bases):
+        for symbol, offset in obj.symbols.items():
+            if symbol in exports:
+                duplicates.add(symbol)
+            else:
+                exports[symbol] = base + offset
+
+    words = array('I')
+    for obj, base in zip(objects, bases):
+        start = len(words)
+        words.extend(obj.words)
+        for index, kind, symbol in obj.relocations:
+            if kind == RELOC_BRANCH_ABSOLUTE:
+                target = symbol
+            elif symbol in obj.symbols:
+                target = base + obj.symbols[symbol]
+            elif symbol in duplicates:
+                raise ValueError(f"{obj.name}: symbol {symbol} is defined in more than one object")
+            elif symbol in exports:
+                target = exports[symbol]
+            else:
+                raise ValueError(f"{obj.name}: undefined symbol {symbol}")
+
+            word = words[start + index]
+            if kind == RELOC_JUMP:
+                words[start + index] = (word & 0xFC000000) | ((target >> 2) & 0x3FFFFFF)
+            else:
+                offset = (target - (base + 4 * index + 4)) // 4
+                if not -0x8000 <= offset < 0x8000:
+                    name = f"0x{symbol:x}" if kind == RELOC_BRANCH_ABSOLUTE else symbol
+                    raise ValueError(f"{obj.name}: branch to {name} is out of range")
+                words[start + index] = (word & 0xFFFF0000) | (offset & 0xFFFF)
+
+    symbols = {symbol: address for symbol, address in exports.items()
+               if symbol not in duplicates}
+    return words_to_bytes(words), symbols
+
+
+def link_files(input_files, output_file):
+    """Link .o files into a binary image, returning the instruction count"""
+    code, symbols = link([ObjectFile.read(path) for path in input_files])
+    with open(output_file, 'wb') as f:
+        f.write(code)
+    return len(code) // 4
@@ -0,0 +1,185 @@
+"""
+Execution profiler built on the simulator.
+
+Counting happens once per basic block, not per instruction: the run loop
+bumps an entry counter for the block and, for blocks that end in a
+branch, the branch's terminator bumps a taken counter when it decides to
+branch. Per-instruction counts, branch ratios and jal call counts are all
+derived from those two arrays after the run.
+"""
+
+import bisect
+import json
+from array import array
+
+from .core import BRANCH_NAMES, J_TYPE_INSTRUCTIONS, Assembler, Disassembler
+from .simulator import Simulator, _make_control
+
+JAL_OPCODE = J_TYPE_INSTRUCTIONS['jal']['opcode']
+
+
+class Profiler(Simulator):
+    def __init__(self, code, labels=None, line_numbers=None, source_lines=None, **kwargs):
+        super().__init__(code, **kwargs)
+        self.labels = labels or {}
+        self.line_numbers = line_numbers
+        self.source_lines = source_lines
+        pairs = sorted((address, name) for name, address in self.labels.items())
+        self.label_addresses = [address for address, _ in pairs]
+        self.label_names = [name for _, name in pairs]
+        count = len(self.words) + 1
+        # Indexed by block start instruction
+        self.block_counts = array('Q', [0]) * count
+        self.taken_counts = array('Q', [0]) * count
+
+    def build_block(self, pc):
+        """Build a block like Simulator.build_block, counting its branch's taken exits"""
+        body, terminator, length = super().build_block(pc)
+        end = (pc >> 2) + length - 1
+        if length and end < len(self.words) and self.words[end] >> 26 in BRANCH_NAMES:
+            word = self.words[end]
+            terminator = _make_control(BRANCH_NAMES[word >> 26], end * 4, word,
+                                       (self.taken_counts, pc >> 2))
+            self.blocks[pc] = (body, terminator, length)
+        return body, terminator, length
+
+    def run(self, max_steps=None):
+        """Run like Simulator.run while counting block entries"""
+        regs = self.regs
+        blocks = self.blocks
+        build_block = self.build_block
+        code_end = self.code_end
+        block_counts = self.block_counts
+        limit = max_steps if max_steps is not None else float('inf')
+        pc = self.pc
+        steps = 0
+        try:
+            while 0 <= pc < code_end:
+                block = blocks.get(pc)
+                if block is None:
+                    block = build_block(pc)
+                body, terminator, length = block
+                block_counts[pc >> 2] += 1
+                for op in body:
+                    op(regs)
+                pc = terminator(regs)
+                steps += length
+                if steps >= limit:
+                    break
+        finally:
+            self.pc = pc
+            self.steps += steps
+        return steps
+
+    def location(self, address):
+        """Describe an address relative to the nearest preceding label"""
+        i = bisect.bisect_right(self.label_addresses, address) - 1
+        if i < 0:
+            return ''
+        name = self.label_names[i]
+        offset = address - self.label_addresses[i]
+        return name if offset == 0 else f"{name}+0x{offset:x}"
+
+    def source(self, index):
+        """(line number, text) for an instruction, from the source or disassembly"""
+        if self.line_numbers is not None and self.source_lines is not None:
+            lineno = self.line_numbers[index]
+            return lineno, self.source_lines[lineno - 1].split('#')[0].strip()
+        disasm = Disassembler()
+        disasm.address = index * 4
+        return None, disasm.decode(self.words[index])
+
+    def results(self):
+        """Derive instruction, block, branch and call statistics as plain data"""
+        instruction_counts = array('Q', [0]) * len(self.words)
+        blocks = []
+        branches = {}
+        calls = {}
+        for address, (body, terminator, length) in self.blocks.items():
+            start = address >> 2
+            count = self.block_counts[start]
+            if not count:
+                continue
+            for index in range(start, start + length):
+                instruction_counts[index] += count
+            blocks.append({'start': address, 'length': length, 'count': count})
+
+            end = start + length - 1
+            if end >= len(self.words) or not self.is_control[end]:
+                continue
+            word = self.words[end]
+            opcode = word >> 26
+            if opcode in BRANCH_NAMES:
+                stats = branches.setdefault(end * 4, {'address': end * 4, 'executed': 0, 'taken': 0})
+                stats['executed'] += count
+                stats['taken'] += self.taken_counts[start]
+            elif opcode == JAL_OPCODE:
+                target = (word & 0x3FFFFFF) << 2
+                calls[target] = calls.get(target, 0) + count
+
+        instructions = []
+        for index, count in enumerate(instruction_counts):
+            if count:
+                lineno, text = self.source(index)
+                instructions.append({'address': index * 4, 'count': count, 'line': lineno,
+                                     'location': self.location(index * 4), 'source': text})
+        instructions.sort(key=lambda entry: -entry['count'])
+        blocks.sort(key=lambda entry: -entry['count'])
+        for entry in blocks:
+            entry['location'] = self.location(entry['start'])
+        branch_list = sorted(branches.values(), key=lambda entry: -entry['executed'])
+        for entry in branch_list:
+            entry['location'] = self.location(entry['address'])
+            entry['source'] = self.source(entry['address'] >> 2)[1]
+        call_list = [{'target': target, 'location': self.location(target), 'calls': count}
+                     for target, count in sorted(calls.items(), key=lambda item: -item[1])]
+
+        return {'steps': self.steps, 'instructions': instructions, 'blocks': blocks,
+                'branches': branch_list, 'calls': call_list}
+
+    def report(self, results=None, top=20):
+        """Format a hot-spot report"""
+        results = results or self.results()
+        steps = results['steps'] or 1
+        lines = [f"Executed {results['steps']} instructions", "", "Hot spots:",
+                 f"{'count':>12} {'%':>6}  {'address':>8}  {'location':<20} {'line':>5}  source"]
+        for entry in results['instructions'][:top]:
+            line = entry['line'] if entry['line'] is not None else ''
+            lines.append(f"{entry['count']:>12} {100 * entry['count'] / steps:>5.1f}%  "
+                         f"0x{entry['address']:06x}  {entry['location']:<20} {line:>5}  {entry['source']}")
+
+        if results['branches']:
+            lines += ["", "Branches:",
+                      f"{'executed':>12} {'taken':>12} {'taken%':>7}  {'address':>8}  {'location':<20} source"]
+            for entry in results['branches'][:top]:
+                ratio = 100 * entry['taken'] / entry['executed']
+                lines.append(f"{entry['executed']:>12} {entry['taken']:>12} {ratio:>6.1f}%  "
+                             f"0x{entry['address']:06x}  {entry['location']:<20} {entry['source']}")
+
+        if results['calls']:
+            lines += ["", "Calls:", f"{'calls':>12}  {'target':>8}  location"]
+            for entry in results['calls'][:top]:
+                lines.append(f"{entry['calls']:>12}  0x{entry['target']:06x}  {entry['location']}")
+        return '\n'.join(lines)
+
+
+def profile_file(path, max_steps=None, **kwargs):
+    """Build a Profiler for a .asm source (with line mapping) or a binary, and run it"""
+    if path.endswith('.asm'):
+        with open(path, 'r') as f:
+            text = f.read()
+        assembler = Assembler()
+        code = assembler.assemble_text(text)
+        profiler = Profiler(code, assembler.labels, assembler.line_numbers,
+                            text.splitlines(), **kwargs)
+    else:
+        with open(path, 'rb') as f:
+            profiler = Profiler(f.read(), **kwargs)
+    profiler.run(max_steps)
+    return profiler
+
+
+def write_json(results, path):
+    """Write profile results as JSON"""
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
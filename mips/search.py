@@ -0,0 +1,301 @@
+"""
+Instruction pattern search over binary images.
+
+A query is compiled to one combined (mask, value) pair over the encoded
+word, plus an optional signed immediate range and branch target that
+depend on more than fixed bits, and a word to exclude (sll leaves out
+the all-zero word, which disassembles as nop). Images are scanned
+straight from an mmap, vectorized with NumPy when it is installed.
+
+An optional index (IMAGE.idx beside the image) lists word offsets per
+instruction class, the opcode or, for opcode 0, the funct, so queries
+that fix the class only touch matching words. It is rebuilt whenever the
+image's size or mtime no longer match.
+"""
+
+import mmap
+import os
+import struct
+from array import array
+
+from .core import (R_TYPE_INSTRUCTIONS, I_TYPE_INSTRUCTIONS, J_TYPE_INSTRUCTIONS,
+                  SPECIAL_INSTRUCTIONS, REGISTERS, OPCODE_DECODERS,
+                  parse_int, words_from_bytes, words_to_bytes)
+
+# Bit ranges of the encoded fields: name -> (shift, width mask)
+FIELDS = {
+    'opcode': (26, 0x3F),
+    'rs': (21, 0x1F),
+    'rt': (16, 0x1F),
+    'rd': (11, 0x1F),
+    'shamt': (6, 0x1F),
+    'funct': (0, 0x3F),
+}
+
+OPCODE_MASK = 0xFC000000
+FUNCT_MASK = 0x3F
+
+# Instruction classes: opcodes 1-63 are their own class, opcode 0 splits by funct
+CLASS_COUNT = 128
+
+INDEX_MAGIC = b'MIDX'
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct('>4sHQQ')
+INDEX_COUNTS = struct.Struct(f'>{CLASS_COUNT}I')
+
+WORD = struct.Struct('>I')
+
+
+def instruction_class(word):
+    opcode = word >> 26
+    return opcode if opcode else 64 + (word & FUNCT_MASK)
+
+
+def parse_register(text):
+    """Register by name ($sp) or number"""
+    if text in REGISTERS:
+        return REGISTERS[text]
+    value = parse_int(text)
+    if not 0 <= value < 32:
+        raise ValueError(f"Unknown register: {text}")
+    return value
+
+
+def parse_range(text):
+    """Parse 'LO:HI', 'LO:', ':HI' or a single value into an inclusive signed range"""
+    if ':' not in text:
+        value = parse_int(text)
+        return value, value
+    low, high = text.split(':', 1)
+    return (parse_int(low) if low else -0x8000, parse_int(high) if high else 0x7FFF)
+
+
+def parse_mask(text):
+    """Parse 'MASK=VALUE' into a pair of ints"""
+    mask, sep, value = text.partition('=')
+    if not sep:
+        raise ValueError(f"Expected MASK=VALUE, got {text}")
+    return parse_int(mask), parse_int(value)
+
+
+class Query:
+    """Match on encoded fields: a combined mask/value plus immediate and target checks"""
+
+    def __init__(self):
+        self.mask = 0
+        self.value = 0
+        self.imm_range = None
+        self.branch_target = None
+        self.excluded = None
+        self.impossible = False
+
+    def require(self, mask, value):
+        """AND in a mask/value constraint"""
+        value &= mask
+        # Constraints on the same bits must agree
+        if (self.value ^ value) & self.mask & mask:
+            self.impossible = True
+        self.mask |= mask
+        self.value |= value
+
+    def require_field(self, name, value):
+        shift, width = FIELDS[name]
+        if not 0 <= value <= width:
+            raise ValueError(f"{name} out of range: {value}")
+        self.require(width << shift, value << shift)
+
+    @classmethod
+    def build(cls, mnemonic=None, opcode=None, funct=None, rs=None, rt=None, rd=None,
+              imm=None, target=None, masks=()):
+        """Compile search options into a Query"""
+        query = cls()
+        if mnemonic is not None:
+            mnemonic = mnemonic.lower()
+            if mnemonic in R_TYPE_INSTRUCTIONS:
+                query.require_field('opcode', 0)
+                query.require_field('funct', R_TYPE_INSTRUCTIONS[mnemonic]['funct'])
+                if mnemonic == 'sll':
+                    # The disassembler names the all-zero sll nop
+                    query.excluded = 0
+            elif mnemonic in I_TYPE_INSTRUCTIONS:
+                query.require_field('opcode', I_TYPE_INSTRUCTIONS[mnemonic]['opcode'])
+            elif mnemonic in J_TYPE_INSTRUCTIONS:
+                query.require_field('opcode', J_TYPE_INSTRUCTIONS[mnemonic]['opcode'])
+            elif mnemonic == 'lui':
+                query.require_field('opcode', SPECIAL_INSTRUCTIONS['lui']['opcode'])
+            elif mnemonic == 'nop':
+                query.require(0xFFFFFFFF, 0)
+            else:
+                raise ValueError(f"Unknown instruction: {mnemonic}")
+        for name, value in [('opcode', opcode), ('funct', funct), ('rs', rs),
+                            ('rt', rt), ('rd', rd)]:
+            if value is not None:
+                query.require_field(name, value)
+        if imm is not None:
+            query.imm_range = imm
+        if target is not None:
+            if mnemonic in J_TYPE_INSTRUCTIONS:
+                query.require(0x3FFFFFF, target >> 2)
+            elif mnemonic in ('beq', 'bne'):
+                query.branch_target = target
+            else:
+                raise ValueError("--target needs a jump or branch mnemonic")
+        for mask, value in masks:
+            query.require(mask, value)
+        return query
+
+    def classes(self):
+        """Instruction classes the query can match, or None if it does not fix one"""
+        if self.mask & OPCODE_MASK != OPCODE_MASK:
+            return None
+        opcode = self.value >> 26
+        if opcode:
+            return [opcode]
+        if self.mask & FUNCT_MASK == FUNCT_MASK:
+            return [64 + (self.value & FUNCT_MASK)]
+        return list(range(64, CLASS_COUNT))
+
+    def matches(self, word, address):
+        if (word & self.mask) != self.value or word == self.excluded:
+            return False
+        imm = ((word & 0xFFFF) ^ 0x8000) - 0x8000
+        if self.imm_range is not None:
+            low, high = self.imm_range
+            if not low <= imm <= high:
+                return False
+        if self.branch_target is not None:
+            return address + 4 + 4 * imm == self.branch_target
+        return True
+
+    def scan(self, data, base_address=0):
+        """Addresses of matching words in big-endian code"""
+        if self.impossible:
+            return []
+        try:
+            import numpy as np
+        except ImportError:
+            return [base_address + 4 * i for i, word in enumerate(words_from_bytes(data))
+                    if self.matches(word, base_address + 4 * i)]
+
+        words = np.frombuffer(data, dtype='>u4')
+        hits = (words & np.uint32(self.mask)) == np.uint32(self.value)
+        if self.excluded is not None:
+            hits &= words != np.uint32(self.excluded)
+        index = np.nonzero(hits)[0]
+        if self.imm_range is not None or self.branch_target is not None:
+            imm = ((words[index] & np.uint32(0xFFFF)).astype(np.int64) ^ 0x8000) - 0x8000
+            keep = np.ones(len(index), dtype=bool)
+            if self.imm_range is not None:
+                low, high = self.imm_range
+                keep &= (low <= imm) & (imm <= high)
+            if self.branch_target is not None:
+                keep &= base_address + 4 * index.astype(np.int64) + 4 + 4 * imm == self.branch_target
+            index = index[keep]
+        return (base_address + 4 * index).tolist()
+
+    def scan_indexed(self, data, offsets, base_address=0):
+        """Addresses of matching words, checking only the index's candidates"""
+        if self.impossible:
+            return []
+        unpack_from = WORD.unpack_from
+        matches = []
+        for i in sorted(offsets):
+            address = base_address + 4 * i
+            if self.matches(unpack_from(data, 4 * i)[0], address):
+                matches.append(address)
+        return matches
+
+
+def build_index(data):
+    """Group word offsets by instruction class: (counts, offsets array)"""
+    try:
+        import numpy as np
+    except ImportError:
+        buckets = [array('I') for _ in range(CLASS_COUNT)]
+        for i, word in enumerate(words_from_bytes(data)):
+            buckets[instruction_class(word)].append(i)
+        offsets = array('I')
+        for bucket in buckets:
+            offsets.extend(bucket)
+        return [len(bucket) for bucket in buckets], offsets
+
+    words = np.frombuffer(data, dtype='>u4')
+    opcode = words >> 26
+    classes = np.where(opcode != 0, opcode, 64 + (words & FUNCT_MASK))
+    order = np.argsort(classes, kind='stable').astype(np.uint32)
+    counts = np.bincount(classes, minlength=CLASS_COUNT)
+    return counts.tolist(), array('I', order.tobytes())
+
+
+def index_path(image_path):
+    return image_path + '.idx'
+
+
+def write_index(image_path, data):
+    """Build and save the index for an image, returning (counts, offsets)"""
+    counts, offsets = build_index(data)
+    stat = os.stat(image_path)
+    with open(index_path(image_path), 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime_ns))
+        f.write(INDEX_COUNTS.pack(*counts))
+        f.write(words_to_bytes(offsets))
+    return counts, offsets
+
+
+def read_index(image_path):
+    """Load an image's index, or None if it is missing or stale"""
+    try:
+        with open(index_path(image_path), 'rb') as f:
+            data = f.read()
+        stat = os.stat(image_path)
+    except OSError:
+        return None
+    if len(data) < INDEX_HEADER.size + INDEX_COUNTS.size:
+        return None
+    magic, version, size, mtime = INDEX_HEADER.unpack_from(data)
+    if (magic, version, size, mtime) != (INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime_ns):
+        return None
+    counts = INDEX_COUNTS.unpack_from(data, INDEX_HEADER.size)
+    offsets = words_from_bytes(data[INDEX_HEADER.size + INDEX_COUNTS.size:])
+    return counts, offsets
+
+
+def candidates(index, classes):
+    """Offsets of the words in the given instruction classes"""
+    counts, offsets = index
+    starts = [0]
+    for count in counts:
+        starts.append(starts[-1] + count)
+    result = array('I')
+    for cls in classes:
+        result.extend(offsets[starts[cls]:starts[cls + 1]])
+    return result
+
+
+def search_file(path, query, use_index=False):
+    """(address, word) for every word in an image matching a query"""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size % 4 != 0:
+            raise ValueError("Binary file size must be multiple of 4 bytes")
+        if size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            classes = query.classes() if use_index else None
+            if classes is None:
+                addresses = query.scan(mm)
+            else:
+                index = read_index(path) or write_index(path, mm)
+                addresses = query.scan_indexed(mm, candidates(index, classes))
+            return [(address, WORD.unpack_from(mm, address)[0]) for address in addresses]
+
+
+def format_match(path, address, word):
+    """grep-style line: path:address: word disassembly"""
+    return f"{path}:0x{address:x}: {word:08x}  {OPCODE_DECODERS[word >> 26](word, address)}"
+
+
+def search_files(paths, query, use_index=False):
+    """Yield (path, matches) for every image"""
+    for path in paths:
+        yield path, search_file(path, query, use_index)
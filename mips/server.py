@@ -0,0 +1,144 @@
+"""
+Persistent assembler/disassembler service.
+
+Requests and responses are length-prefixed frames: a 4-byte big-endian
+payload length followed by the payload.
+
+Request payload:  1 op byte (b'a' assemble, b'd' disassemble) + body
+Response payload: 1 status byte (0 ok, 1 error) + body
+
+Assemble bodies are UTF-8 source in and big-endian machine code out;
+disassemble bodies are machine code in and newline-separated UTF-8
+instructions out. Error bodies are a UTF-8 message.
+"""
+
+import asyncio
+import socket
+import struct
+
+from .core import DECODE_CACHE_SIZE, Assembler, Disassembler
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 7474
+
+# Largest payload accepted in either direction
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+OP_ASSEMBLE = b'a'
+OP_DISASSEMBLE = b'd'
+STATUS_OK = b'\x00'
+STATUS_ERROR = b'\x01'
+
+HEADER = struct.Struct('>I')
+
+# Shared by every request, so its decode cache stays warm for the life of
+# the server (requests run one at a time on the event loop)
+DISASSEMBLER = Disassembler(cache_size=DECODE_CACHE_SIZE)
+
+
+def handle_request(payload):
+    """Run one request payload and return the response payload"""
+    op, body = payload[:1], payload[1:]
+    try:
+        if op == OP_ASSEMBLE:
+            return STATUS_OK + Assembler().assemble_text(body.decode('utf-8'))
+        if op == OP_DISASSEMBLE:
+            lines = DISASSEMBLER.disassemble_bytes(body)
+            return STATUS_OK + '\n'.join(lines).encode('utf-8')
+        raise ValueError(f"Unknown operation: {op!r}")
+    except Exception as e:
+        return STATUS_ERROR + str(e).encode('utf-8')
+
+
+async def handle_connection(reader, writer):
+    """Serve requests on one connection until the client disconnects"""
+    try:
+        while True:
+            try:
+                header = await reader.readexactly(HEADER.size)
+            except asyncio.IncompleteReadError:
+                break
+            size, = HEADER.unpack(header)
+            if size > MAX_MESSAGE_SIZE:
+                break
+            payload = await reader.readexactly(size)
+            response = handle_request(payload)
+            writer.write(HEADER.pack(len(response)) + response)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(host=DEFAULT_HOST, port=DEFAULT_PORT, path=None):
+    """Start listening on a Unix socket path, or on host:port"""
+    if path:
+        return await asyncio.start_unix_server(handle_connection, path=path)
+    return await asyncio.start_server(handle_connection, host, port)
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, path=None):
+    """Run the server until interrupted"""
+    async def run():
+        server = await start_server(host, port, path)
+        address = path or f"{host}:{port}"
+        print(f"Serving on {address}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+class Client:
+    """Blocking client for the assembler service"""
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, path=None):
+        if path:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(path)
+        else:
+            self.sock = socket.create_connection((host, port))
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _recv_exactly(self, size):
+        """Read exactly size bytes from the socket"""
+        chunks = []
+        while size:
+            chunk = self.sock.recv(min(size, 1 << 20))
+            if not chunk:
+                raise ConnectionError("Server closed the connection")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def request(self, op, body):
+        """Send one request and return the response body"""
+        payload = op + body
+        self.sock.sendall(HEADER.pack(len(payload)) + payload)
+        size, = HEADER.unpack(self._recv_exactly(HEADER.size))
+        response = self._recv_exactly(size)
+        if response[:1] != STATUS_OK:
+            raise ValueError(response[1:].decode('utf-8'))
+        return response[1:]
+
+    def assemble(self, text):
+        """Assemble source text on the server"""
+        return self.request(OP_ASSEMBLE, text.encode('utf-8'))
+
+    def disassemble(self, data):
+        """Disassemble machine code on the server"""
+        text = self.request(OP_DISASSEMBLE, bytes(data)).decode('utf-8')
+        return text.split('\n') if text else []
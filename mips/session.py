@@ -0,0 +1,270 @@
+"""
+Incremental assembly for editors that re-assemble on every keystroke.
+
+An AssemblySession keeps the source lines, the label table and one word
+per instruction line. An edit replaces a range of lines: only the new
+lines are lexed and encoded, and outside them only label references
+that can have changed are re-encoded:
+
+- a j/jal whose label moved or was (re)defined
+- a branch whose label was (re)defined, or where exactly one of the
+  branch and its label moved (branches are PC-relative, so a branch and
+  a label that both shift keep their offset)
+
+A line that fails to assemble still occupies a word (0) so the
+addresses after it stay put while it is being typed; its error is
+reported as a diagnostic instead of being raised. Labels are owned by
+their first definition and later ones are reported as duplicates.
+"""
+
+from array import array
+from collections import Counter, namedtuple
+from itertools import compress
+
+from .core import (BRANCH_MNEMONICS, DUPLICATE_LABEL, ENCODERS, OPERAND_SYM, Assembler,
+                   AssemblyError, InstructionArray, tokenize_instruction, words_to_bytes)
+
+# Result of an edit: the session's words changed by replacing `removed`
+# words at `index` with `words` and then setting each (index, word) in
+# `patches` (indices after the replacement). diagnostics is every
+# AssemblyError in the source, by line.
+Change = namedtuple('Change', 'index removed words patches diagnostics')
+
+
+def lex_line(line):
+    """Lex one line into (label, token, error, emits_word)"""
+    code = line.partition('#')[0]
+    label = None
+    if ':' in code:
+        label, _, code = code.partition(':')
+        label = label.strip() or None
+    try:
+        token = tokenize_instruction(code)
+    except AssemblyError as e:
+        return label, None, e, 1
+    return label, token, None, 0 if token.mnemonic is None else 1
+
+
+class AssemblySession:
+    """Source lines plus their encoding, kept current under line-range edits"""
+
+    def __init__(self, lines=()):
+        self.assembler = Assembler()
+        self.labels = self.assembler.labels
+        self.definitions = Counter()
+        self.duplicates = set()
+        self.lines = []
+        self.line_labels = []
+        self.errors = []
+        self.error_count = 0
+        self.flags = bytearray()
+        self.words = array('I')
+        # Per word: (encoder, operand values, target, is_branch) for words
+        # that depend on a label or their own address, else None
+        self.refs = []
+        # label -> indices of words referring to it; rebuilt on demand
+        # after edits that move words
+        self.references = None
+        if lines:
+            self.edit(0, 0, lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def code(self):
+        """Current big-endian machine code"""
+        return words_to_bytes(self.words)
+
+    def instructions(self):
+        return InstructionArray(self.words)
+
+    def address_of(self, lineno):
+        """Address of the word for 1-based source line lineno"""
+        return self.flags.count(1, 0, lineno - 1) * 4
+
+    def replace_line(self, lineno, line):
+        """Replace one 1-based source line"""
+        return self.edit(lineno - 1, lineno, [line])
+
+    def edit(self, start, end, new_lines):
+        """Replace lines[start:end] (0-based) with new_lines and re-encode what that affects"""
+        if not 0 <= start <= end <= len(self.lines):
+            raise ValueError(f"Invalid line range: {start}-{end}")
+        if isinstance(new_lines, str):
+            new_lines = new_lines.splitlines()
+        flags = self.flags
+        labels = self.labels
+        first = flags.count(1, 0, start)
+        removed = flags.count(1, start, end)
+        old_names = [name for name in self.line_labels[start:end] if name]
+
+        # Lex the new lines, noting where each label they define would land
+        lexed = []
+        cache = {}
+        local = {}
+        address = first * 4
+        for line in new_lines:
+            entry = cache.get(line)
+            if entry is None:
+                entry = cache[line] = lex_line(line)
+            lexed.append(entry)
+            if entry[0] is not None and entry[0] not in local:
+                local[entry[0]] = address
+            address += 4 * entry[3]
+        added = address // 4 - first
+        shift = (added - removed) * 4
+
+        # Labels owned by lines after the edit move with them. Labels on the
+        # wordless lines just before the edit share the boundary address
+        # but stay put.
+        affected = set(old_names).union(local)
+        original = {name: labels.get(name) for name in affected}
+        shifted = set()
+        if shift:
+            boundary = (first + removed) * 4
+            shifted = {name for name, address in labels.items() if address >= boundary}
+            shifted -= affected
+            index = start - 1
+            while removed == 0 and index >= 0 and not flags[index]:
+                shifted.discard(self.line_labels[index])
+                index -= 1
+            labels.update({name: labels[name] + shift for name in shifted})
+
+        self.lines[start:end] = new_lines
+        self.line_labels[start:end] = [entry[0] for entry in lexed]
+        flags[start:end] = bytes(entry[3] for entry in lexed)
+        new_names = Counter(entry[0] for entry in lexed if entry[0] is not None)
+        self.definitions.subtract(old_names)
+        self.definitions.update(new_names)
+
+        # Re-resolve labels defined or undefined by the edit
+        redefined = set()
+        for name in affected:
+            count = self.definitions[name]
+            if count == 0:
+                del self.definitions[name]
+                labels.pop(name, None)
+            elif count == new_names[name]:
+                labels[name] = local[name]
+            else:
+                labels[name] = flags.count(1, 0, self.line_labels.index(name)) * 4
+            if count > 1:
+                self.duplicates.add(name)
+            else:
+                self.duplicates.discard(name)
+            if labels.get(name) != original[name]:
+                redefined.add(name)
+
+        words, refs, errors = self.encode_lines(lexed, first)
+        self.words[first:first + removed] = words
+        if shift:
+            self.references = None
+        elif self.references is not None:
+            self.update_references(first, self.refs[first:first + removed], refs)
+        self.refs[first:first + removed] = refs
+        self.error_count += (sum(1 for error in errors if error)
+                             - sum(1 for error in self.errors[start:end] if error))
+        self.errors[start:end] = errors
+
+        patches = []
+        if shift or redefined:
+            patches = self.reencode(first + added if shift else None, shifted, redefined)
+        return Change(first, removed, words, patches, self.diagnostics())
+
+    def encode_lines(self, lexed, first):
+        """Encode lexed lines starting at word index first"""
+        assembler = self.assembler
+        words = array('I')
+        refs = []
+        errors = []
+        address = first * 4
+        for label, token, error, emits in lexed:
+            if emits:
+                word = 0
+                ref = None
+                if token is not None:
+                    assembler.current_address = address
+                    try:
+                        word = assembler.encode_line(token)
+                    except AssemblyError as e:
+                        error = e
+                    else:
+                        branch = token.mnemonic in BRANCH_MNEMONICS
+                        if branch or OPERAND_SYM in token.kinds:
+                            ref = (ENCODERS[token.mnemonic][2], token.values,
+                                   token.values[-1], branch)
+                words.append(word)
+                refs.append(ref)
+                address += 4
+            errors.append(error)
+        return words, refs, errors
+
+    def reference_index(self):
+        """Map each label to the indices of the words that refer to it"""
+        if self.references is None:
+            references = self.references = {}
+            refs = self.refs
+            for index in compress(range(len(refs)), refs):
+                target = refs[index][2]
+                if isinstance(target, str):
+                    references.setdefault(target, set()).add(index)
+        return self.references
+
+    def update_references(self, first, old_refs, new_refs):
+        """Swap the words at first.. in the reference index, when no word moved"""
+        references = self.references
+        for index, ref in enumerate(old_refs, first):
+            if ref is not None and isinstance(ref[2], str):
+                references[ref[2]].discard(index)
+        for index, ref in enumerate(new_refs, first):
+            if ref is not None and isinstance(ref[2], str):
+                references.setdefault(ref[2], set()).add(index)
+
+    def reencode(self, moved_from, shifted, redefined):
+        """Re-encode references whose target moved relative to them; return changed (index, word)s
+
+        Words from index moved_from on have shifted (None if nothing did).
+        When no word and no label shifted, only references to redefined
+        labels can change, found by label.
+        """
+        assembler = self.assembler
+        words = self.words
+        refs = self.refs
+        if moved_from is None:
+            moved_from = len(refs)
+        if shifted or moved_from < len(refs):
+            candidates = compress(range(len(refs)), refs)
+        else:
+            references = self.reference_index()
+            candidates = sorted(set().union(*(references.get(name, ()) for name in redefined)))
+        moved = shifted | redefined
+        patches = []
+        for index in candidates:
+            encode, values, target, branch = refs[index]
+            if branch:
+                if target not in redefined and (target in shifted) == (index >= moved_from):
+                    continue
+            elif target not in moved:
+                continue
+            assembler.current_address = index * 4
+            word = encode(values, assembler)
+            if word != words[index]:
+                words[index] = word
+                patches.append((index, word))
+        return patches
+
+    def diagnostics(self):
+        """Every error in the source as AssemblyErrors, by line"""
+        if not self.error_count and not self.duplicates:
+            return []
+        lines = self.lines
+        errors = self.errors
+        result = [errors[i].locate(lines[i], i + 1) for i in compress(range(len(errors)), errors)]
+        for name in self.duplicates:
+            index = self.line_labels.index(name)
+            for _ in range(self.definitions[name] - 1):
+                index = self.line_labels.index(name, index + 1)
+                result.append(AssemblyError(f"Duplicate label: {name}", code=DUPLICATE_LABEL,
+                                            text=name).locate(lines[index], index + 1))
+        result.sort(key=lambda error: error.lineno)
+        return result
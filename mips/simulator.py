@@ -0,0 +1,311 @@
+"""
+Instruction-set simulator for the supported MIPS subset.
+
+The binary is predecoded once into one handler closure per instruction.
+Straight-line runs of handlers are grouped into basic blocks ending at a
+control transfer (beq, bne, j, jal, jr) and cached by start PC, so the
+run loop does one dict lookup per block rather than per instruction.
+
+Registers are a flat list of unsigned 32-bit ints and memory is one
+bytearray with the program loaded at address 0. Branches have no delay
+slot, matching how the assembler computes offsets. The program stops
+when the PC leaves the code, e.g. by returning through the initial $ra.
+
+A sw into the code re-decodes that word and drops the cached blocks
+holding it. The block doing the store still finishes with the handlers
+it started with, so a program that overwrites an instruction later in
+its own block sees the change only the next time that block is entered.
+"""
+
+import struct
+
+from .core import (R_TYPE_INSTRUCTIONS, I_TYPE_INSTRUCTIONS, J_TYPE_INSTRUCTIONS,
+                  SPECIAL_INSTRUCTIONS, REG_LIST, words_from_bytes)
+
+MASK = 0xFFFFFFFF
+DEFAULT_MEMORY_SIZE = 1 << 20
+
+# Initial $ra: returning from the top-level code lands outside memory and halts
+EXIT_ADDRESS = 0xFFFFFFFC
+
+WORD = struct.Struct('>I')
+
+# funct/opcode -> mnemonic, for choosing handlers
+FUNCT_NAMES = {info['funct']: name for name, info in R_TYPE_INSTRUCTIONS.items()}
+OPCODE_NAMES = {info['opcode']: name for name, info in I_TYPE_INSTRUCTIONS.items()}
+OPCODE_NAMES.update({info['opcode']: name for name, info in J_TYPE_INSTRUCTIONS.items()})
+OPCODE_NAMES[SPECIAL_INSTRUCTIONS['lui']['opcode']] = 'lui'
+
+CONTROL_MNEMONICS = frozenset(['beq', 'bne', 'j', 'jal', 'jr'])
+
+
+class SimulationError(RuntimeError):
+    """Fault raised by a simulated program"""
+
+
+def signed(value):
+    """Interpret a 32-bit register value as signed"""
+    return value - 0x100000000 if value & 0x80000000 else value
+
+
+def _nop(regs):
+    pass
+
+
+def _make_alu(name, rd, rs, rt, shamt):
+    """Build the handler for an R-type ALU instruction"""
+    if rd == 0:
+        # Writes to $zero are discarded
+        return _nop
+    if name == 'add':
+        def op(regs):
+            regs[rd] = (regs[rs] + regs[rt]) & MASK
+    elif name == 'sub':
+        def op(regs):
+            regs[rd] = (regs[rs] - regs[rt]) & MASK
+    elif name == 'and':
+        def op(regs):
+            regs[rd] = regs[rs] & regs[rt]
+    elif name == 'or':
+        def op(regs):
+            regs[rd] = regs[rs] | regs[rt]
+    elif name == 'xor':
+        def op(regs):
+            regs[rd] = regs[rs] ^ regs[rt]
+    elif name == 'slt':
+        def op(regs):
+            regs[rd] = 1 if signed(regs[rs]) < signed(regs[rt]) else 0
+    elif name == 'sll':
+        def op(regs):
+            regs[rd] = (regs[rt] << shamt) & MASK
+    elif name == 'srl':
+        def op(regs):
+            regs[rd] = regs[rt] >> shamt
+    else:
+        raise ValueError(f"No ALU handler for {name}")
+    return op
+
+
+def _make_immediate(name, rt, rs, imm, memory, code_end=0, invalidate=None):
+    """Build the handler for a non-branch I-type instruction
+
+    A sw below code_end calls invalidate with the address it wrote.
+    """
+    simm = imm - 0x10000 if imm & 0x8000 else imm
+    if name == 'sw':
+        pack_into = WORD.pack_into
+        def op(regs):
+            address = (regs[rs] + simm) & MASK
+            if address & 3 or address + 4 > len(memory):
+                raise SimulationError(f"Bad store address 0x{address:08x}")
+            pack_into(memory, address, regs[rt])
+            if address < code_end:
+                invalidate(address)
+        return op
+    if rt == 0:
+        return _nop
+    if name == 'lw':
+        unpack_from = WORD.unpack_from
+        def op(regs):
+            address = (regs[rs] + simm) & MASK
+            if address & 3 or address + 4 > len(memory):
+                raise SimulationError(f"Bad load address 0x{address:08x}")
+            regs[rt] = unpack_from(memory, address)[0]
+    elif name == 'addi':
+        def op(regs):
+            regs[rt] = (regs[rs] + simm) & MASK
+    elif name == 'slti':
+        def op(regs):
+            regs[rt] = 1 if signed(regs[rs]) < simm else 0
+    elif name == 'lui':
+        value = imm << 16
+        def op(regs):
+            regs[rt] = value
+    else:
+        raise ValueError(f"No handler for {name}")
+    return op
+
+
+def _make_control(name, pc, word, taken=None):
+    """Build the terminator for a control transfer; it returns the next PC
+
+    taken, if given, is a (counts, index) pair: a beq/bne bumps
+    counts[index] each time it takes its branch (the next PC cannot tell
+    when the target is the fall-through).
+    """
+    rs = (word >> 21) & 0x1F
+    rt = (word >> 16) & 0x1F
+    imm = word & 0xFFFF
+    fallthrough = pc + 4
+    if name in ('beq', 'bne'):
+        simm = imm - 0x10000 if imm & 0x8000 else imm
+        target = fallthrough + simm * 4
+        if taken is not None:
+            counts, index = taken
+            if name == 'beq':
+                def op(regs):
+                    if regs[rs] == regs[rt]:
+                        counts[index] += 1
+                        return target
+                    return fallthrough
+            else:
+                def op(regs):
+                    if regs[rs] != regs[rt]:
+                        counts[index] += 1
+                        return target
+                    return fallthrough
+        elif name == 'beq':
+            def op(regs):
+                return target if regs[rs] == regs[rt] else fallthrough
+        else:
+            def op(regs):
+                return target if regs[rs] != regs[rt] else fallthrough
+    elif name == 'jr':
+        def op(regs):
+            return regs[rs]
+    else:
+        target = (fallthrough & 0xF0000000) | ((word & 0x3FFFFFF) << 2)
+        if name == 'jal':
+            def op(regs):
+                regs[31] = fallthrough
+                return target
+        else:
+            def op(regs):
+                return target
+    return op
+
+
+def _make_fault(pc, word):
+    """Build a handler for a word the simulator cannot execute"""
+    def op(regs):
+        raise SimulationError(f"Unknown instruction 0x{word:08x} at 0x{pc:x}")
+    return op
+
+
+class Simulator:
+    def __init__(self, code, memory_size=DEFAULT_MEMORY_SIZE):
+        if len(code) % 4 != 0:
+            raise ValueError("Binary file size must be multiple of 4 bytes")
+        if len(code) > memory_size:
+            raise ValueError("Program does not fit in memory")
+        self.memory = bytearray(memory_size)
+        self.memory[:len(code)] = code
+        self.code_end = len(code)
+        self.regs = [0] * 32
+        self.regs[29] = memory_size - 4    # $sp
+        self.regs[31] = EXIT_ADDRESS       # $ra
+        self.pc = 0
+        self.steps = 0
+        self.words = words_from_bytes(code)
+        self.blocks = {}
+        self.predecode()
+
+    def predecode(self):
+        """Build one handler (or control terminator) per instruction word"""
+        decode = self.decode
+        self.handlers = handlers = []
+        self.is_control = is_control = []
+        for index, word in enumerate(self.words):
+            handler, control = decode(index * 4, word)
+            handlers.append(handler)
+            is_control.append(control)
+
+    def decode(self, pc, word):
+        """(handler, is control transfer) for the word at pc"""
+        opcode = word >> 26
+        if opcode == 0:
+            name = FUNCT_NAMES.get(word & 0x3F)
+        else:
+            name = OPCODE_NAMES.get(opcode)
+
+        if name in CONTROL_MNEMONICS:
+            return _make_control(name, pc, word), True
+        if name is None:
+            return _make_fault(pc, word), False
+        if opcode == 0:
+            return _make_alu(name, (word >> 11) & 0x1F, (word >> 21) & 0x1F,
+                             (word >> 16) & 0x1F, (word >> 6) & 0x1F), False
+        return _make_immediate(name, (word >> 16) & 0x1F, (word >> 21) & 0x1F, word & 0xFFFF,
+                               self.memory, self.code_end, self.invalidate), False
+
+    def invalidate(self, address):
+        """Re-decode the code word a store wrote at address and drop the blocks holding it"""
+        index = address >> 2
+        word = WORD.unpack_from(self.memory, address)[0]
+        if word == self.words[index]:
+            return
+        self.words[index] = word
+        self.handlers[index], self.is_control[index] = self.decode(address, word)
+        blocks = self.blocks
+        for pc in [pc for pc, (_, _, length) in blocks.items() if 0 <= index - (pc >> 2) < length]:
+            del blocks[pc]
+
+    def build_block(self, pc):
+        """Collect the basic block starting at pc and cache it
+
+        A block is (body, terminator, length): body is a tuple of handlers,
+        terminator returns the next PC, length counts both.
+        """
+        if pc & 3:
+            raise SimulationError(f"Misaligned PC 0x{pc:x}")
+        handlers = self.handlers
+        is_control = self.is_control
+        index = pc // 4
+        end = len(handlers)
+        start = index
+        while index < end and not is_control[index]:
+            index += 1
+
+        body = tuple(h for h in handlers[start:index] if h is not _nop)
+        if index < end:
+            terminator = handlers[index]
+            length = index - start + 1
+        else:
+            # Fell off the end of the code
+            exit_pc = index * 4
+            def terminator(regs):
+                return exit_pc
+            length = index - start
+
+        block = (body, terminator, length)
+        self.blocks[pc] = block
+        return block
+
+    def run(self, max_steps=None):
+        """Run until the PC leaves the code or max_steps is reached
+
+        Returns the number of instructions executed by this call. The step
+        limit is checked between blocks, so it can overshoot by one block.
+        """
+        regs = self.regs
+        blocks = self.blocks
+        build_block = self.build_block
+        code_end = self.code_end
+        limit = max_steps if max_steps is not None else float('inf')
+        pc = self.pc
+        steps = 0
+        try:
+            while 0 <= pc < code_end:
+                block = blocks.get(pc)
+                if block is None:
+                    block = build_block(pc)
+                body, terminator, length = block
+                for op in body:
+                    op(regs)
+                pc = terminator(regs)
+                steps += length
+                if steps >= limit:
+                    break
+        finally:
+            self.pc = pc
+            self.steps += steps
+        return steps
+
+    @property
+    def halted(self):
+        return not 0 <= self.pc < self.code_end
+
+    def register_dump(self):
+        """Format the non-zero registers, one per line"""
+        return '\n'.join(f"{REG_LIST[num]:>5} = 0x{value:08x} ({signed(value)})"
+                         for num, value in enumerate(self.regs) if value)
@@ -4,10 +4,30 @@ Run with: python -m pytest test_mips.py -v
 """
 
 import unittest
+import contextlib
 import struct
 import tempfile
 import os
-from main import Assembler, Disassembler
+import io
+import asyncio
+import threading
+import random
+from array import array
+from mips.core import (Assembler, Disassembler, Instruction, InstructionArray, tokenize_line,
+                       DecodeCache, DECODE_CACHE_SIZE, DECODE_CACHE_MIN_BYTES, ENCODERS, R_TYPE_INSTRUCTIONS, I_TYPE_INSTRUCTIONS, J_TYPE_INSTRUCTIONS)
+from mips import server
+from mips import batch
+from mips.cache import AssemblyCache
+from mips.simulator import Simulator, SimulationError
+from mips.profiler import Profiler
+from mips import cfg
+from mips import linker
+from mips import formats
+from mips import search
+from mips import diff
+from mips.session import AssemblySession
+import bench
+import fuzz
 
 
 class TestAssemblerRegisters(unittest.TestCase):
@@ -174,6 +194,11 @@ class TestDisassembler(unittest.TestCase):
         result = self.disasm.disassemble_r_type(0x00000000)
         self.assertEqual(result, 'nop')
 
+    def test_disassemble_srl_zero_is_not_nop(self):
+        result = self.disasm.disassemble_r_type(0x00000002)
+        self.assertEqual(result, 'srl $0, $0, 0')
+        self.assertEqual(Assembler().assemble_instruction(result), 0x00000002)
+
     def test_disassemble_addi(self):
         result = self.disasm.disassemble_i_type(0x21280064)
         self.assertEqual(result, 'addi $t0, $t1, 100')
@@ -183,6 +208,164 @@ class TestDisassembler(unittest.TestCase):
         self.assertEqual(result, 'lui $t0, 4660')  # 0x1234 = 4660
 
 
+class TestDecodeTables(unittest.TestCase):
+    """Test the opcode/funct dispatch tables"""
+
+    def setUp(self):
+        self.disasm = Disassembler()
+
+    def test_decode_dispatches_by_opcode(self):
+        self.assertEqual(self.disasm.decode(0x012A4020), 'add $t0, $t1, $t2')
+        self.assertEqual(self.disasm.decode(0x8FA80004), 'lw $t0, 4($sp)')
+        self.assertEqual(self.disasm.decode(0x3C081234), 'lui $t0, 4660')
+        self.assertEqual(self.disasm.decode(0x0C100000), 'jal 0x400000')
+
+    def test_decode_branch_uses_address(self):
+        # beq $t0, $t1, -1 at address 0x10 -> target 0x10
+        self.disasm.address = 0x10
+        self.assertEqual(self.disasm.decode(0x1109FFFF), 'beq $t0, $t1, 0x10')
+
+    def test_decode_branch_wraps_below_zero(self):
+        # beq $0, $0, -2 at address 0 -> target 0xfffffffc, which reassembles
+        self.assertEqual(self.disasm.decode(0x1000FFFE), 'beq $0, $0, 0xfffffffc')
+        self.assertEqual(Assembler().assemble_instruction('beq $0, $0, 0xfffffffc'), 0x1000FFFE)
+
+    def test_decode_unknown(self):
+        self.assertEqual(self.disasm.decode(0x0000003F), 'unknown_r 0x0000003f')
+        self.assertEqual(self.disasm.decode(0xFC000000), 'unknown_i 0xfc000000')
+
+
+class TestDecodeCache(unittest.TestCase):
+    """Test the disassembler's decode cache"""
+
+    def test_matches_uncached_decode(self):
+        data = bytes(random.Random(3).getrandbits(8) for _ in range(4 * 5000))
+        for base in (0, 0x400000, 0xFFFFF000):
+            expected = Disassembler().disassemble_bytes(data, base)
+            # A tiny cache rotates and bypasses blocks of one-off words
+            for size in (16, DECODE_CACHE_SIZE):
+                self.assertEqual(Disassembler(cache_size=size).disassemble_bytes(data, base),
+                                 expected)
+
+    def test_repeated_words_hit(self):
+        code = Assembler().assemble_lines(['addi $sp, $sp, -4', 'jr $ra', 'nop'] * 100)
+        disasm = Disassembler(cache_size=DECODE_CACHE_SIZE)
+        self.assertEqual(disasm.disassemble_bytes(code)[:3], ['addi $sp, $sp, -4', 'jr $ra', 'nop'])
+        stats = disasm.cache.stats()
+        self.assertEqual((stats['lookups'], stats['misses'], stats['entries']), (300, 3, 3))
+        self.assertEqual(disasm.cache.hit_rate, 0.99)
+
+    def test_branches_cache_prefix_only(self):
+        cache = DecodeCache()
+        self.assertEqual(cache.decode(0x1109FFFF, 0x10), 'beq $t0, $t1, 0x10')
+        self.assertEqual(cache.decode(0x1109FFFF, 0x20), 'beq $t0, $t1, 0x20')
+        self.assertEqual(cache.decode(0x11090001, 0x20), 'beq $t0, $t1, 0x28')
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_off_by_default(self):
+        self.assertIsNone(Disassembler().cache)
+
+    def test_large_stream_matches_uncached(self):
+        half = DECODE_CACHE_MIN_BYTES // 2
+        data = random.Random(5).getrandbits(8 * half).to_bytes(half, 'big') * 2
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'image.bin')
+            with open(path, 'wb') as f:
+                f.write(data)
+            output = os.path.join(tmpdir, 'image.asm')
+            with contextlib.redirect_stdout(io.StringIO()):
+                Disassembler().disassemble_stream(path, output)
+            with open(output) as f:
+                lines = f.read().splitlines()[2:]
+        self.assertEqual(lines, [f"    {line}" for line in Disassembler().disassemble_bytes(data)])
+
+    def test_scan_keeps_words_in_use(self):
+        cache = DecodeCache(size=64)
+        hot = array('I', [0x23BDFFFC, 0x03E00008] * 32)
+        cache.decode_words(hot + array('I', range(0x20000000, 0x20000000 + 62)))
+        # The table is full, so a scan of one-off words bypasses it
+        cache.decode_words(array('I', range(0x30000000, 0x30000000 + 5000)))
+        before = cache.misses
+        cache.decode_words(hot)
+        self.assertEqual(cache.misses, before)
+
+
+class TestEncodeTable(unittest.TestCase):
+    """Test the mnemonic to encoder table"""
+
+    def test_every_mnemonic_has_an_encoder(self):
+        names = set(R_TYPE_INSTRUCTIONS) | set(I_TYPE_INSTRUCTIONS) | set(J_TYPE_INSTRUCTIONS)
+        self.assertEqual(set(ENCODERS), names | {'lui', 'nop'})
+
+    def test_targets_accept_labels_and_addresses(self):
+        kinds, accepted, encode = ENCODERS['beq']
+        self.assertEqual(accepted, {'rrs', 'rri'})
+        asm = Assembler()
+        self.assertEqual(asm.assemble_lines(['x: beq $t0, $t1, x', 'beq $t0, $t1, 0']),
+                         struct.pack('>II', 0x1109FFFF, 0x1109FFFE))
+
+
+class TestBatchDisassembly(unittest.TestCase):
+    """Test bulk disassembly of whole buffers"""
+
+    def test_matches_per_word_decode(self):
+        words = [0x012A4020, 0x23BDFFFC, 0x1109FFFF, 0x0C100000,
+                 0x00000000, 0x1109FFFF, 0x23BDFFFC, 0xFC000000]
+        data = b''.join(struct.pack('>I', w) for w in words)
+        disasm = Disassembler()
+        expected = []
+        for i, word in enumerate(words):
+            disasm.address = 0x100 + 4 * i
+            expected.append(disasm.decode(word))
+        self.assertEqual(disasm.disassemble_words(data, 0x100), expected)
+
+    def test_rejects_partial_word(self):
+        with self.assertRaises(ValueError):
+            Disassembler().disassemble_words(b'\x00\x00\x00')
+
+
+class TestStreamingDisassembly(unittest.TestCase):
+    """Test chunked streaming disassembly"""
+
+    def test_chunks_split_mid_word(self):
+        data = struct.pack('>III', 0x012A4020, 0x1109FFFF, 0x03E00008)
+        chunks = [data[:3], data[3:9], data[9:]]
+        lines = []
+        for chunk_lines in Disassembler().iter_disassemble(chunks, 0x20):
+            lines.extend(chunk_lines)
+        self.assertEqual(lines, [
+            '    add $t0, $t1, $t2\n',
+            '    beq $t0, $t1, 0x24\n',
+            '    jr $ra\n',
+        ])
+
+    def test_trailing_partial_word(self):
+        with self.assertRaises(ValueError):
+            list(Disassembler().iter_disassemble([b'\x00' * 6]))
+
+
+class TestParallelDisassembly(unittest.TestCase):
+    """Test process pool disassembly"""
+
+    def test_matches_serial_output(self):
+        words = [0x012A4020, 0x1109FFFF, 0x23BDFFFC, 0x0C100000, 0x1500FFFB] * 7
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_file = os.path.join(tmpdir, 'image.bin')
+            with open(input_file, 'wb') as f:
+                f.write(b''.join(struct.pack('>I', w) for w in words))
+            serial = os.path.join(tmpdir, 'serial.asm')
+            parallel = os.path.join(tmpdir, 'parallel.asm')
+
+            Disassembler().disassemble(input_file, serial)
+            # 12-byte chunks put branches at non-zero base addresses
+            count = Disassembler().disassemble_parallel(input_file, parallel,
+                                                        jobs=2, chunk_size=12)
+            self.assertEqual(count, len(words))
+            with open(serial) as f1, open(parallel) as f2:
+                self.assertEqual(f1.read(), f2.read())
+
+
 class TestLabelResolution(unittest.TestCase):
     """Test label handling in assembler"""
 
@@ -202,6 +385,64 @@ class TestLabelResolution(unittest.TestCase):
         self.assertEqual(self.asm.labels['loop'], 4)
 
 
+class TestLexer(unittest.TestCase):
+    """Test single-pass source tokenization"""
+
+    def test_tokenize_line(self):
+        label, token = tokenize_line('loop: ADDI $t0, $t0, -1   # decrement\n')
+        self.assertEqual(label, 'loop')
+        self.assertEqual(token.mnemonic, 'addi')
+        self.assertEqual(token.kinds, 'rri')
+        self.assertEqual(token.values, (8, 8, -1))
+
+    def test_tokenize_memory_and_label_operands(self):
+        _, token = tokenize_line('lw $t0, -8($sp)')
+        self.assertEqual(token.kinds, 'rm')
+        self.assertEqual(token.values, (8, (-8, 29)))
+        _, token = tokenize_line('bne $t0, $zero, loop')
+        self.assertEqual(token.kinds, 'rrs')
+        self.assertEqual(token.values, (8, 0, 'loop'))
+
+    def test_blank_and_label_only_lines(self):
+        self.assertEqual(tokenize_line('   # comment')[1].mnemonic, None)
+        label, token = tokenize_line('done:')
+        self.assertEqual(label, 'done')
+        self.assertEqual(token.mnemonic, None)
+
+    def test_identical_lines_share_tokens(self):
+        asm = Assembler()
+        asm.first_pass(['    j done', '    j done', 'done: nop'])
+        (_, first), (_, second) = asm.fixups
+        self.assertIs(first, second)
+        self.assertEqual(list(asm.line_numbers), [1, 2, 3])
+
+    def test_invalid_operands(self):
+        with self.assertRaises(ValueError):
+            Assembler().assemble_instruction('add $t0, $t1, 5')
+        with self.assertRaises(ValueError):
+            Assembler().assemble_instruction('lw $t0, $sp')
+        with self.assertRaises(ValueError):
+            Assembler().assemble_instruction('add $t0, $t1')
+
+
+class TestTwoPassIR(unittest.TestCase):
+    """Test the encoded word array and fixup table"""
+
+    def test_only_label_references_need_fixups(self):
+        asm = Assembler()
+        words = asm.first_pass([
+            'start: addi $t0, $zero, 3',
+            'loop:  addi $t0, $t0, -1',
+            '       bne $t0, $zero, loop',
+            '       j start',
+        ])
+        self.assertEqual([index for index, _ in asm.fixups], [2, 3])
+        self.assertEqual(words[0], 0x20080003)
+        asm.second_pass()
+        # bne at 0x8 back to 0x4 -> offset -2; j to 0
+        self.assertEqual(list(words[2:]), [0x1500FFFE, 0x08000000])
+
+
 class TestRoundTrip(unittest.TestCase):
     """Test assembling and disassembling produces consistent results"""
 
@@ -239,6 +480,796 @@ class TestRoundTrip(unittest.TestCase):
             self.assertEqual(result, instr)
 
 
+class TestInMemoryAPI(unittest.TestCase):
+    """Test assembling and disassembling without files"""
+
+    def test_assemble_text(self):
+        code = Assembler().assemble_text('loop: add $t0, $t1, $t2\n      j loop\n')
+        self.assertEqual(code, struct.pack('>II', 0x012A4020, 0x08000000))
+
+    def test_assemble_lines_resets_labels(self):
+        asm = Assembler()
+        asm.assemble_lines(['old: nop'])
+        asm.assemble_lines(['new: nop'])
+        self.assertEqual(asm.labels, {'new': 0})
+
+    def test_disassemble_bytes(self):
+        data = memoryview(struct.pack('>II', 0x012A4020, 0x1109FFFF))
+        self.assertEqual(Disassembler().disassemble_bytes(data, 0x40),
+                         ['add $t0, $t1, $t2', 'beq $t0, $t1, 0x44'])
+
+    def test_error_carries_line(self):
+        with self.assertRaises(ValueError) as ctx:
+            Assembler().assemble_text('nop\n  add $t0, $bad, $t1\n')
+        self.assertEqual(ctx.exception.lineno, 2)
+        self.assertEqual(ctx.exception.line, 'add $t0, $bad, $t1')
+        self.assertEqual(ctx.exception.code, 'unknown-register')
+        self.assertEqual(ctx.exception.column, 12)
+
+
+class TestDiagnostics(unittest.TestCase):
+    """Test collecting every error in one run"""
+
+    SOURCE = ['start: addi $t0, $zero, 70000',
+              '       foo $t0, $t1',
+              'loop:  lw $t0, 4($sp)',
+              '       beq $t0, $t1, nowhere',
+              'start: sll $t0, $t1, 40',
+              '       j loop']
+
+    def test_collects_all_errors(self):
+        code, diagnostics = Assembler().assemble_checked(self.SOURCE)
+        self.assertEqual([(e.lineno, e.column, e.code) for e in diagnostics],
+                         [(1, 25, 'immediate-range'), (2, 8, 'unknown-instruction'),
+                          (4, 22, 'undefined-label'), (5, 1, 'duplicate-label'),
+                          (5, 22, 'immediate-range')])
+        # Failed lines keep a zero word so the rest still encodes in place
+        self.assertEqual(len(code), 24)
+        self.assertEqual(code[20:], Assembler().assemble_lines(['nop'] * 2 + ['loop: nop', 'j loop'])[12:])
+
+    def test_clean_source_matches_assembly(self):
+        source = list(bench.synthesize_lines(500, 'labels'))
+        code, diagnostics = Assembler().assemble_checked(source)
+        self.assertEqual(diagnostics, [])
+        self.assertEqual(code, Assembler().assemble_lines(source))
+
+    def test_branch_range(self):
+        source = ['beq $t0, $t1, far'] + ['nop'] * 0x8000 + ['far: nop']
+        _, diagnostics = Assembler().assemble_checked(source)
+        self.assertEqual([e.code for e in diagnostics], ['branch-range'])
+
+    def test_duplicate_label_first_wins_everywhere(self):
+        source = ['      beq $t0, $t1, dup', 'dup:  nop', 'dup:  nop', '      j dup']
+        code, diagnostics = Assembler().assemble_checked(source)
+        self.assertEqual([e.code for e in diagnostics], ['duplicate-label'])
+        self.assertEqual(code, Assembler().assemble_lines(source))
+        self.assertEqual(code, AssemblySession(source).code())
+        self.assertEqual(code, Assembler().assemble_lines(['beq $t0, $t1, dup', 'dup: nop', 'nop', 'j dup']))
+
+    def test_misaligned_target(self):
+        source = ['beq $t3, $t1, 3', 'j 0x102', 'bne $t0, $t1, 8']
+        _, diagnostics = Assembler().assemble_checked(source)
+        self.assertEqual([(e.lineno, e.column, e.code) for e in diagnostics],
+                         [(1, 15, 'misaligned-target'), (2, 3, 'misaligned-target')])
+
+    def test_to_dict(self):
+        _, diagnostics = Assembler().assemble_checked(['  addi $t0, $t0'])
+        self.assertEqual(diagnostics[0].to_dict(),
+                         {'line': 1, 'column': 3, 'code': 'operand-count',
+                          'message': 'addi expects 3 operands, got 2'})
+
+
+class TestInstructionModel(unittest.TestCase):
+    """Test the compact instruction records and arrays"""
+
+    SOURCE = ['start: addi $t0, $zero, -4', '       lw $t1, 8($sp)', '       nop',
+              '       bne $t0, $t1, start', '       jal start']
+
+    def test_decode_fields(self):
+        instr = Instruction.decode(0x012A4020, 0x10)
+        self.assertEqual((instr.mnemonic, instr.rd, instr.rs, instr.rt), ('add', 8, 9, 10))
+        self.assertEqual(Instruction.decode(0x2008FFFC).imm, -4)
+        self.assertEqual(Instruction.decode(0x0C000010).target, 0x40)
+
+    def test_encode_from_fields(self):
+        instr = Instruction('sw', rs=29, rt=8, imm=-8)
+        self.assertEqual(instr.encode(), 0xAFA8FFF8)
+        self.assertEqual(instr.format(), 'sw $t0, -8($sp)')
+        for word in [0x00000000, 0x012A4020, 0x1509FFFD, 0x3C081234, 0xFC000000]:
+            self.assertEqual(Instruction.decode(word).encode(), word)
+
+    def test_assemble_and_disassemble_arrays(self):
+        program = Assembler().assemble_instructions(self.SOURCE)
+        self.assertEqual([program.mnemonic(i) for i in range(len(program))],
+                         ['addi', 'lw', 'nop', 'bne', 'jal'])
+        self.assertEqual(program.count('nop'), 1)
+        self.assertEqual(list(program.column('imm'))[:2], [-4, 8])
+        self.assertEqual(program[3].address, 12)
+        self.assertEqual(program.nbytes, 5 * len(program))
+        lines = Disassembler().disassemble_instructions(program)
+        self.assertEqual(lines, Disassembler().disassemble_bytes(program.to_bytes()))
+
+
+class TestServer(unittest.TestCase):
+    """Test the length-prefixed assembler service"""
+
+    def test_handle_request(self):
+        response = server.handle_request(b'a' + b'add $t0, $t1, $t2')
+        self.assertEqual(response, b'\x00' + struct.pack('>I', 0x012A4020))
+        response = server.handle_request(b'd' + struct.pack('>I', 0x03E00008))
+        self.assertEqual(response, b'\x00jr $ra')
+        self.assertEqual(server.handle_request(b'a' + b'bogus $t0')[:1], b'\x01')
+
+    def test_client_roundtrip(self):
+        loop = asyncio.new_event_loop()
+        srv = loop.run_until_complete(server.start_server(port=0))
+        port = srv.sockets[0].getsockname()[1]
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+        try:
+            with server.Client(port=port) as client:
+                code = client.assemble('loop: addi $t0, $t0, 1\n      j loop\n')
+                self.assertEqual(client.disassemble(code), ['addi $t0, $t0, 1', 'j 0x0'])
+                with self.assertRaises(ValueError):
+                    client.assemble('bogus $t0')
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            srv.close()
+            loop.run_until_complete(srv.wait_closed())
+            loop.close()
+
+
+class TestBatch(unittest.TestCase):
+    """Test multi-file batch processing"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = self.tmpdir.name
+        os.makedirs(os.path.join(self.root, 'src', 'sub'))
+        self.good = [os.path.join(self.root, 'src', 'a.asm'),
+                     os.path.join(self.root, 'src', 'sub', 'b.asm')]
+        for path in self.good:
+            with open(path, 'w') as f:
+                f.write('add $t0, $t1, $t2\njr $ra\n')
+        self.bad = os.path.join(self.root, 'src', 'sub', 'c.asm')
+        with open(self.bad, 'w') as f:
+            f.write('add $t0, $nope, $t2\n')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_expand_inputs(self):
+        src = os.path.join(self.root, 'src')
+        self.assertEqual(batch.expand_inputs([src], '.asm'), [self.good[0], self.good[1], self.bad])
+        self.assertEqual(batch.expand_inputs([os.path.join(src, '*.asm')], '.asm'), [self.good[0]])
+        manifest = os.path.join(self.root, 'files.txt')
+        with open(manifest, 'w') as f:
+            f.write(f'# corpus\n{self.good[1]}\n\n')
+        self.assertEqual(batch.expand_inputs(['@' + manifest], '.asm'), [self.good[1]])
+
+    def test_run_batch_summary(self):
+        for jobs in (1, 2):
+            summary = batch.run_batch('assemble', [os.path.join(self.root, 'src')], jobs=jobs)
+            self.assertEqual(summary['files'], 3)
+            self.assertEqual(summary['instructions'], 4)
+            self.assertEqual([path for path, _ in summary['errors']], [self.bad])
+        with open(os.path.join(self.root, 'src', 'sub', 'b.bin'), 'rb') as f:
+            self.assertEqual(f.read(), struct.pack('>II', 0x012A4020, 0x03E00008))
+
+    def test_run_batch_formats(self):
+        src = os.path.join(self.root, 'src', '*.asm')
+        out = os.path.join(self.root, 'out')
+        summary = batch.run_batch('assemble', [src], out, image_format='memh')
+        self.assertEqual(summary['errors'], [])
+        image = batch.output_path(self.good[0], '.bin', out)
+        self.assertEqual(formats.read_image(image, 'memh'), struct.pack('>II', 0x012A4020, 0x03E00008))
+        summary = batch.run_batch('disassemble', [image], out, image_format='memh')
+        self.assertEqual((summary['instructions'], summary['errors']), (2, []))
+        with self.assertRaises(ValueError):
+            batch.run_batch('object', [src], out, image_format='memh')
+
+    def test_run_batch_labels(self):
+        image = os.path.join(self.root, 'loop.bin')
+        with open(image, 'wb') as f:
+            f.write(Assembler().assemble_lines(['loop: addi $t0, $t0, 1', 'j loop']))
+        out = os.path.join(self.root, 'out')
+        summary = batch.run_batch('disassemble', [os.path.join(self.root, '*.bin')], out,
+                                  labels=True)
+        self.assertEqual((summary['instructions'], summary['errors']), (2, []))
+        with open(batch.output_path(image, '.asm', out)) as f:
+            listing = f.read()
+        self.assertRegex(listing, r'(?m)^\w+:$')
+
+
+class TestAssemblyCache(unittest.TestCase):
+    """Test the content-addressed build cache"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_hit_returns_code_and_labels(self):
+        source = 'start: addi $t0, $t0, 1\n       j start\n'
+        first = Assembler(cache=AssemblyCache(self.tmpdir.name))
+        code = first.assemble_text(source)
+        self.assertEqual(first.cache.misses, 1)
+
+        second = Assembler(cache=AssemblyCache(self.tmpdir.name))
+        self.assertEqual(second.assemble_text(source), code)
+        self.assertEqual(second.cache.hits, 1)
+        self.assertEqual(second.labels, {'start': 0})
+        self.assertEqual(list(second.words), [0x21080001, 0x08000000])
+
+        # Any change to the text is a different entry
+        third = Assembler(cache=AssemblyCache(self.tmpdir.name))
+        third.assemble_text(source + 'nop\n')
+        self.assertEqual(third.cache.hits, 0)
+
+    def test_evicts_least_recently_used(self):
+        cache = AssemblyCache(self.tmpdir.name, max_bytes=100)
+        cache.put('a', b'\x00' * 60, {})
+        path_a = cache.path(cache.key('a'))
+        os.utime(path_a, (1, 1))
+        cache.put('b', b'\x00' * 60, {})
+        self.assertFalse(os.path.exists(path_a))
+        self.assertIsNotNone(cache.get('b'))
+
+    def test_put_keeps_running_total(self):
+        cache = AssemblyCache(self.tmpdir.name, max_bytes=1000)
+        cache.put('a', b'\x00' * 8, {})
+        # Below the bound, later puts add to the manifest without scanning
+        cache.entries = None
+        cache.put('b', b'\x00' * 12, {'x': 0})
+        sizes = [os.path.getsize(cache.path(cache.key(text))) for text in 'ab']
+        self.assertEqual(cache.read_total(), sum(sizes))
+
+    def test_corrupt_entry_is_a_miss(self):
+        cache = AssemblyCache(self.tmpdir.name)
+        source = 'nop\n'
+        path = cache.path(cache.key(source))
+        os.makedirs(os.path.dirname(path))
+        for data in [b'\x00', b'\x00\x00\x00\x05{"a":', b'\x00\x00\x00\x02{}\x00\x01']:
+            with open(path, 'wb') as f:
+                f.write(data)
+            self.assertIsNone(cache.get(source))
+        # Assembling replaces the corrupt entry
+        code = Assembler(cache=cache).assemble_text(source)
+        self.assertEqual(cache.get(source), (code, {}))
+
+    def test_unwritable_directory_does_not_fail_assembly(self):
+        # A regular file where the cache directory should be makes every store fail
+        blocker = os.path.join(self.tmpdir.name, 'blocker')
+        with open(blocker, 'w'):
+            pass
+        cache = AssemblyCache(os.path.join(blocker, 'cache'))
+        source = 'start: addi $t0, $t0, 1\n       j start\n'
+        code = Assembler(cache=cache).assemble_text(source)
+        self.assertEqual(code, Assembler().assemble_text(source))
+        self.assertEqual((cache.misses, cache.skipped), (1, 1))
+
+        input_file = os.path.join(self.tmpdir.name, 'prog.asm')
+        output_file = os.path.join(self.tmpdir.name, 'prog.bin')
+        with open(input_file, 'w') as f:
+            f.write(source)
+        result = batch.assemble_file(input_file, output_file, cache_dir=cache.directory)
+        self.assertEqual(result, (input_file, 2, None))
+        with open(output_file, 'rb') as f:
+            self.assertEqual(f.read(), code)
+
+    def test_rewrite_does_not_grow_running_total(self):
+        cache = AssemblyCache(self.tmpdir.name, max_bytes=1000)
+        cache.put('a', b'\x00' * 8, {})
+        cache.put('a', b'\x00' * 8, {})
+        cache.put('a', b'\x00' * 8, {})
+        self.assertEqual(cache.read_total(), os.path.getsize(cache.path(cache.key('a'))))
+
+    def test_identical_lines_encode_once(self):
+        asm = Assembler()
+        words = asm.first_pass(['addi $t0, $t0, 1'] * 3 + ['beq $t0, $t0, 0x0'] * 2)
+        # Branches are position dependent and must not be memoized
+        self.assertEqual(list(words), [0x21080001] * 3 + [0x1108FFFC, 0x1108FFFB])
+
+
+class TestSimulator(unittest.TestCase):
+    """Test program execution"""
+
+    def run_example(self, path):
+        with open(path) as f:
+            sim = Simulator(Assembler().assemble_text(f.read()))
+        sim.run()
+        self.assertTrue(sim.halted)
+        return sim
+
+    def test_examples(self):
+        self.assertEqual(self.run_example('examples/fibonacci.asm').regs[2], 55)
+        self.assertEqual(self.run_example('examples/gcd.asm').regs[2], 6)
+        self.assertEqual(self.run_example('examples/factorial.asm').regs[2], 720)
+
+    def test_memory_and_signed_arithmetic(self):
+        sim = Simulator(Assembler().assemble_text(
+            'addi $t0, $zero, -5\n'
+            'sw $t0, -4($sp)\n'
+            'lw $t1, -4($sp)\n'
+            'slt $t2, $t1, $zero\n'
+            'srl $t3, $t1, 28\n'
+            'addi $zero, $zero, 1\n'))
+        self.assertEqual(sim.run(), 6)
+        self.assertEqual(sim.regs[9], 0xFFFFFFFB)
+        self.assertEqual(sim.regs[10], 1)
+        self.assertEqual(sim.regs[11], 0xF)
+        self.assertEqual(sim.regs[0], 0)
+
+    def test_jal_and_step_limit(self):
+        code = Assembler().assemble_text('loop: jal sub\n      j loop\nsub: jr $ra\n')
+        sim = Simulator(code)
+        sim.run(max_steps=30)
+        self.assertFalse(sim.halted)
+        self.assertEqual(sim.regs[31], 4)
+
+    def test_store_into_code_redecodes(self):
+        source = ['       addi $t1, $zero, 2',
+                  'loop:  jal patch',
+                  '       lui $t0, 0x2002',
+                  '       addi $t0, $t0, 7',
+                  '       sw $t0, 0x20($zero)',     # patch: addi $v0, $zero, 7
+                  '       addi $t1, $t1, -1',
+                  '       bne $t1, $zero, loop',
+                  '       j end',
+                  'patch: addi $v0, $v0, 1',
+                  '       jr $ra',
+                  'end:']
+        for simulator in (Simulator, Profiler):
+            sim = simulator(Assembler().assemble_lines(source))
+            sim.run()
+            self.assertTrue(sim.halted)
+            # The second call runs the rewritten instruction, not the first one's handler
+            self.assertEqual(sim.regs[2], 7)
+            self.assertEqual(sim.words[8], 0x20020007)
+
+    def test_faults(self):
+        with self.assertRaises(SimulationError):
+            Simulator(struct.pack('>I', 0xFC000000)).run()
+        with self.assertRaises(SimulationError):
+            Simulator(Assembler().assemble_text('lw $t0, 2($zero)')).run()
+
+
+class TestProfiler(unittest.TestCase):
+    """Test execution profiling"""
+
+    SOURCE = [
+        'main:   addi $s0, $zero, 5',
+        'again:  jal work',
+        '        addi $s0, $s0, -1',
+        '        bne $s0, $zero, again',
+        '        j end',
+        'work:   addi $t0, $t0, 1',
+        '        jr $ra',
+        'end:',
+    ]
+
+    def setUp(self):
+        asm = Assembler()
+        code = asm.assemble_lines(self.SOURCE)
+        self.profiler = Profiler(code, asm.labels, asm.line_numbers, self.SOURCE)
+        self.profiler.run()
+        self.results = self.profiler.results()
+
+    def test_instruction_counts(self):
+        counts = {entry['address']: entry['count'] for entry in self.results['instructions']}
+        self.assertEqual(counts, {0x0: 1, 0x4: 5, 0x8: 5, 0xc: 5, 0x10: 1, 0x14: 5, 0x18: 5})
+        self.assertEqual(self.results['steps'], sum(counts.values()))
+        hottest = self.results['instructions'][0]
+        self.assertEqual(hottest['count'], 5)
+        self.assertIsNotNone(hottest['line'])
+
+    def test_branches_and_calls(self):
+        branch, = self.results['branches']
+        self.assertEqual((branch['address'], branch['executed'], branch['taken']), (0xc, 5, 4))
+        self.assertEqual(branch['location'], 'again+0x8')
+        self.assertEqual(self.results['calls'], [{'target': 0x14, 'location': 'work', 'calls': 5}])
+        self.assertIn('Hot spots:', self.profiler.report(self.results))
+
+    def test_branch_to_fallthrough_counts_taken(self):
+        source = ['      addi $t1, $zero, 3',
+                  'loop: beq $t0, $t0, next',
+                  'next: bne $t0, $t1, next2',
+                  'next2: addi $t0, $t0, 1',
+                  '      bne $t0, $t1, loop']
+        profiler = Profiler(Assembler().assemble_lines(source))
+        profiler.run()
+        taken = {entry['address']: (entry['executed'], entry['taken'])
+                 for entry in profiler.results()['branches']}
+        self.assertEqual(taken, {0x4: (3, 3), 0x8: (3, 3), 0x10: (3, 2)})
+
+
+class TestControlFlow(unittest.TestCase):
+    """Test control-flow recovery and label synthesis"""
+
+    SOURCE = [
+        'main:   addi $a0, $zero, 5',
+        '        jal fact',
+        '        j end',
+        'fact:   addi $v0, $zero, 1',
+        'loop:   beq $a0, $zero, done',
+        '        addi $a0, $a0, -1',
+        '        j loop',
+        'done:   jr $ra',
+        'end:    nop',
+    ]
+
+    def setUp(self):
+        self.code = Assembler().assemble_lines(self.SOURCE)
+        self.graph = cfg.recover(self.code)
+
+    def test_blocks_and_labels(self):
+        self.assertEqual(list(self.graph.starts), [0x0, 0x8, 0xc, 0x10, 0x14, 0x1c, 0x20])
+        self.assertEqual(self.graph.labels, {0xc: 'F_000c', 0x10: 'L_0010',
+                                             0x1c: 'L_001c', 0x20: 'L_0020'})
+        self.assertEqual(self.graph.successors[3], [(0x1c, cfg.EDGE_BRANCH),
+                                                    (0x14, cfg.EDGE_FALLTHROUGH)])
+
+    def test_functions(self):
+        self.assertEqual(self.graph.entries, [0x0, 0xc])
+        self.assertEqual(list(self.graph.block_functions), [0x0, 0x0, 0xc, 0xc, 0xc, 0xc, 0x0])
+
+    def test_labeled_listing_reassembles(self):
+        listing = ''.join(self.graph.listing())
+        self.assertIn('    beq $a0, $0, L_001c\n', listing)
+        self.assertIn('    jal F_000c\n', listing)
+        self.assertEqual(Assembler().assemble_text(listing), self.code)
+
+    def test_export(self):
+        data = self.graph.to_dict()
+        self.assertEqual([f['name'] for f in data['functions']], ['entry', 'F_000c'])
+        self.assertEqual(len(data['blocks']), 7)
+        out = io.StringIO()
+        self.graph.write_dot(out)
+        self.assertIn('b0 -> bc [style=dotted];', out.getvalue())
+
+
+class TestLinker(unittest.TestCase):
+    """Test relocatable objects and linking"""
+
+    MAIN = ['main: addi $a0, $zero, 3', '      jal count', '      j end']
+    LIB = ['count: addi $a0, $a0, -1', 'loop:  bne $a0, $zero, loop', '       jr $ra', 'end:   nop']
+
+    def test_link_matches_single_source(self):
+        objects = [linker.assemble_object(self.MAIN, 'main'), linker.assemble_object(self.LIB, 'lib')]
+        code, symbols = linker.link(objects)
+        self.assertEqual(code, Assembler().assemble_lines(self.MAIN + self.LIB))
+        self.assertEqual(symbols['count'], 12)
+
+    def test_object_contents(self):
+        obj = linker.assemble_object(self.MAIN)
+        self.assertEqual(obj.imports, ['count', 'end'])
+        self.assertEqual(obj.relocations, [(1, linker.RELOC_JUMP, 'count'),
+                                           (2, linker.RELOC_JUMP, 'end')])
+        # Local branches are PC-relative and need no relocation
+        self.assertEqual(linker.assemble_object(self.LIB).relocations, [])
+
+    def test_absolute_branch_relocated_at_nonzero_base(self):
+        main = ['main: addi $a0, $zero, 3', '      jal count', '      nop']
+        lib = ['count: beq $a0, $zero, 0x4', '       bne $a0, $zero, count', '       jr $ra']
+        obj = linker.assemble_object(lib, 'lib')
+        self.assertEqual(obj.relocations, [(0, linker.RELOC_BRANCH_ABSOLUTE, 0x4)])
+        self.assertEqual(obj.imports, [])
+        loaded = linker.ObjectFile.from_bytes(obj.to_bytes())
+        # lib is linked at 0xc, and its branch still reaches 0x4
+        code, _ = linker.link([linker.assemble_object(main, 'main'), loaded])
+        self.assertEqual(code, Assembler().assemble_lines(main + lib))
+        self.assertEqual(Disassembler().disassemble_bytes(code)[3], 'beq $a0, $0, 0x4')
+
+    def test_object_serialization(self):
+        obj = linker.assemble_object(self.MAIN)
+        loaded = linker.ObjectFile.from_bytes(obj.to_bytes())
+        self.assertEqual(loaded.words, obj.words)
+        self.assertEqual(loaded.symbols, obj.symbols)
+        self.assertEqual(loaded.relocations, obj.relocations)
+        with self.assertRaises(ValueError):
+            linker.ObjectFile.from_bytes(b'\x00' * 16)
+
+    def test_local_labels_do_not_clash(self):
+        loop = ['loop: bne $a0, $zero, loop', '      j loop']
+        code, _ = linker.link([linker.assemble_object(loop), linker.assemble_object(loop)])
+        self.assertEqual(code[8:], Assembler().assemble_lines(['nop', 'nop'] + loop)[8:])
+
+    def test_undefined_symbol(self):
+        with self.assertRaises(ValueError) as cm:
+            linker.link([linker.assemble_object(self.MAIN, 'main.o')])
+        self.assertIn('undefined symbol count', str(cm.exception))
+
+
+class TestAssemblySession(unittest.TestCase):
+    """Test incremental re-assembly"""
+
+    SOURCE = ['start: addi $t0, $zero, 3',
+              'loop:  addi $t0, $t0, -1',
+              '       bne $t0, $zero, loop',
+              '       j end',
+              '       nop',
+              'end:   jr $ra']
+
+    def apply(self, words, change):
+        words = list(words)
+        words[change.index:change.index + change.removed] = change.words
+        for index, word in change.patches:
+            words[index] = word
+        return words
+
+    def test_matches_full_assembly(self):
+        session = AssemblySession(self.SOURCE)
+        self.assertEqual(session.code(), Assembler().assemble_lines(self.SOURCE))
+
+    def test_edit_in_place(self):
+        session = AssemblySession(self.SOURCE)
+        change = session.replace_line(5, '       sub $t1, $t1, $t1')
+        self.assertEqual((change.index, change.removed, change.patches), (4, 1, []))
+        self.assertEqual(change.words.tolist(), [0x01294822])
+
+    def test_insert_moves_targets(self):
+        session = AssemblySession(self.SOURCE)
+        before = session.words.tolist()
+        source = self.SOURCE[:1] + ['       nop'] + self.SOURCE[1:]
+        change = session.edit(1, 1, ['       nop'])
+        self.assertEqual(session.code(), Assembler().assemble_lines(source))
+        self.assertEqual(self.apply(before, change), session.words.tolist())
+        # The branch moved with its label; only the jump to end changed
+        self.assertEqual([index for index, _ in change.patches], [4])
+
+    def test_delete_and_relabel(self):
+        session = AssemblySession(self.SOURCE)
+        before = session.words.tolist()
+        change = session.edit(1, 2, ['top:   addi $t0, $t0, -1', '       nop'])
+        source = ['start: addi $t0, $zero, 3', 'top:   addi $t0, $t0, -1', '       nop'] + self.SOURCE[2:]
+        self.assertEqual(self.apply(before, change), session.words.tolist())
+        # loop is gone, so the branch resolves like the assembler's undefined label
+        self.assertEqual(session.code(), Assembler().assemble_lines(source))
+
+    def test_diagnostics(self):
+        session = AssemblySession(self.SOURCE)
+        change = session.replace_line(2, 'loop:  addi $t0, $t0,')
+        self.assertEqual(len(session.words), 6)
+        self.assertEqual([(e.lineno, str(e)) for e in change.diagnostics],
+                         [(2, 'addi expects 3 operands, got 2')])
+        change = session.replace_line(5, 'end: nop')
+        self.assertEqual([(e.lineno, str(e)) for e in change.diagnostics],
+                         [(2, 'addi expects 3 operands, got 2'), (6, 'Duplicate label: end')])
+        change = session.edit(1, 2, ['loop:  addi $t0, $t0, -1'])
+        change = session.edit(5, 6, [])
+        self.assertEqual(change.diagnostics, [])
+        self.assertEqual(session.code(), Assembler().assemble_lines(self.SOURCE[:4] + ['end: nop']))
+
+    def test_edit_at_end_moves_trailing_label(self):
+        session = AssemblySession(['beq $t0, $t1, done', 'addi $t0, $t0, 1',
+                                   'addi $t0, $t0, 2', 'done:'])
+        session.edit(2, 3, [])
+        self.assertEqual(session.code(), Assembler().assemble_lines(session.lines))
+
+    def test_random_edits(self):
+        rng = random.Random(1)
+        # A trailing label after the last word moves when words are added
+        # or removed at the end
+        lines = list(bench.synthesize_lines(200, 'labels')) + ['end:\n']
+        pool = lines[:-1] + ['\n', 'extra:\n', '    j extra\n', '    beq $t0, $t1, 0x40\n',
+                             '    beq $t0, $t1, end\n', '    j end\n']
+        session = AssemblySession(lines)
+        for _ in range(300):
+            start = rng.randrange(len(lines) + 1)
+            end = min(len(lines), start + rng.choice([0, 1, 2]))
+            new_lines = [rng.choice(pool) for _ in range(rng.choice([0, 1, 2]))]
+            candidate = lines[:start] + new_lines + lines[end:]
+            labels = [line.split(':')[0] for line in candidate if ':' in line]
+            if len(labels) != len(set(labels)):
+                continue
+            before = session.words.tolist()
+            change = session.edit(start, end, new_lines)
+            lines = candidate
+            self.assertEqual(self.apply(before, change), session.words.tolist())
+            self.assertEqual(session.code(), Assembler().assemble_lines(lines))
+
+
+class TestImageFormats(unittest.TestCase):
+    """Test output encodings and their readers"""
+
+    CODE = struct.pack('>3I', 0x012A4020, 0x8FA80004, 0x0C100000)
+
+    def test_every_format_roundtrips(self):
+        for fmt in formats.FORMATS:
+            encoded = formats.encode_image(self.CODE, fmt)
+            if not isinstance(encoded, bytes):
+                encoded = ''.join(encoded).encode('ascii')
+            self.assertEqual(formats.decode_image(encoded, fmt), self.CODE, fmt)
+
+    def test_encodings(self):
+        self.assertEqual(formats.encode_image(self.CODE, 'raw-le')[:4], bytes.fromhex('20402a01'))
+        self.assertEqual(''.join(formats.encode_image(self.CODE, 'hex')),
+                         '012a4020\n8fa80004\n0c100000\n')
+        records = ''.join(formats.encode_image(self.CODE, 'ihex')).split()
+        self.assertEqual(records, [':0C000000012A40208FA800040C10000012', ':00000001FF'])
+
+    def test_memh_addresses_and_comments(self):
+        text = '// image\n@1 0000000a // second word\n@0\n00000001\n'
+        self.assertEqual(formats.parse_memh(text), struct.pack('>2I', 1, 10))
+
+    def test_ihex_checksum(self):
+        with self.assertRaises(ValueError):
+            formats.parse_ihex(':0400000001020304F1\n')
+
+    def test_cli_writes_and_reads_format(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            source = os.path.join(tmpdir, 'prog.asm')
+            image = os.path.join(tmpdir, 'prog.hex')
+            listing = os.path.join(tmpdir, 'prog.out.asm')
+            with open(source, 'w') as f:
+                f.write('add $t0, $t1, $t2\nlw $t0, 4($sp)\n')
+            Assembler().assemble(source, image, 'memh')
+            Disassembler().disassemble(image, listing, input_format='memh')
+            with open(listing) as f:
+                self.assertIn('    lw $t0, 4($sp)\n', f.read())
+
+
+class TestImageDiff(unittest.TestCase):
+    """Test word-level image comparison"""
+
+    def words(self, *values):
+        return struct.pack(f'>{len(values)}I', *values)
+
+    def apply(self, old, new, hunks):
+        result, position = b'', 0
+        for tag, i1, i2, j1, j2 in hunks:
+            result += old[4 * position:4 * i1] + new[4 * j1:4 * j2]
+            position = i2
+        return result + old[4 * position:]
+
+    def test_identical(self):
+        code = self.words(*range(100))
+        self.assertEqual(diff.diff_words(code, bytes(code)), [])
+
+    def test_replaced_words(self):
+        old = self.words(*range(100))
+        new = self.words(*([0, 1, 99] + list(range(3, 50)) + [7, 7] + list(range(52, 100))))
+        self.assertEqual(diff.diff_words(old, new),
+                         [('replace', 2, 3, 2, 3), ('replace', 50, 52, 50, 52)])
+
+    def test_insert_and_delete(self):
+        old = self.words(*range(1000))
+        new = self.words(*(list(range(10)) + [5000, 5001] + list(range(10, 700)) + list(range(703, 1000))))
+        hunks = diff.diff_words(old, new)
+        self.assertEqual(hunks, [('insert', 10, 10, 10, 12), ('delete', 700, 703, 702, 702)])
+        self.assertEqual(self.apply(old, new, hunks), new)
+        # Same length overall: the shifted stretch is not reported as changed
+        new = self.words(*(list(range(10)) + [5000] + list(range(10, 700)) + list(range(701, 1000))))
+        self.assertEqual(diff.summarize(diff.diff_words(old, new)),
+                         {'hunks': 2, 'replaced': 0, 'deleted': 1, 'inserted': 1})
+
+    def test_random_edits(self):
+        rng = random.Random(3)
+        for _ in range(200):
+            old = [rng.randrange(4) for _ in range(rng.randrange(50))]
+            new = list(old)
+            for _ in range(rng.randrange(5)):
+                position = rng.randrange(len(new) + 1)
+                new[position:position + rng.randrange(3)] = [rng.randrange(4)] * rng.randrange(3)
+            old, new = self.words(*old), self.words(*new)
+            for max_cost in (diff.MAX_COST, 1):
+                self.assertEqual(self.apply(old, new, diff.diff_words(old, new, max_cost)), new)
+
+    def test_format_hunk(self):
+        old = Assembler().assemble_lines(['add $t0, $t1, $t2', 'jr $ra'])
+        new = Assembler().assemble_lines(['add $t0, $t1, $t2', 'nop', 'jr $ra'])
+        hunk, = diff.diff_words(old, new)
+        self.assertEqual(list(diff.format_hunk(old, new, hunk)),
+                         ['@@ -0x4,0 +0x4,1 @@ insert', '+0x4: 00000000  nop'])
+
+
+class TestSearch(unittest.TestCase):
+    """Test instruction pattern search"""
+
+    SOURCE = ['main: sw $t0, 8($sp)', '      jal func', '      sw $t1, 8($t2)',
+              '      beq $t0, $zero, main', 'func: addi $t0, $t0, -3', '      jr $ra']
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'image.bin')
+        with open(self.path, 'wb') as f:
+            f.write(Assembler().assemble_lines(self.SOURCE))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def find(self, use_index=False, **options):
+        query = search.Query.build(**options)
+        return [address for address, word in search.search_file(self.path, query, use_index)]
+
+    def test_fields(self):
+        self.assertEqual(self.find(mnemonic='sw', rs=29), [0x0])
+        self.assertEqual(self.find(mnemonic='sw'), [0x0, 0x8])
+        self.assertEqual(self.find(rt=8), [0x0, 0x10])
+
+    def test_targets_and_immediates(self):
+        self.assertEqual(self.find(mnemonic='jal', target=0x10), [0x4])
+        self.assertEqual(self.find(mnemonic='beq', target=0x0), [0xc])
+        self.assertEqual(self.find(mnemonic='addi', imm=search.parse_range(':-1')), [0x10])
+        self.assertEqual(self.find(mnemonic='addi', imm=search.parse_range('0:')), [])
+
+    def test_mask_value(self):
+        self.assertEqual(self.find(masks=[search.parse_mask('0xFC000000=0x0C000000')]), [0x4])
+        query = search.Query.build(mnemonic='jal', masks=[(0xFC000000, 0)])
+        self.assertTrue(query.impossible)
+
+    def test_sll_excludes_nop(self):
+        with open(self.path, 'wb') as f:
+            f.write(Assembler().assemble_lines(['nop', 'sll $t0, $t1, 2', 'nop', 'sll $zero, $zero, 1']))
+        self.assertEqual(self.find(mnemonic='sll'), [0x4, 0xc])
+        self.assertEqual(self.find(True, mnemonic='sll'), [0x4, 0xc])
+        self.assertEqual(self.find(mnemonic='nop'), [0x0, 0x8])
+        query = search.Query.build(mnemonic='sll')
+        for address, word in search.search_file(self.path, query):
+            self.assertIn('sll', search.format_match(self.path, address, word))
+
+    def test_index(self):
+        self.assertEqual(self.find(True, mnemonic='jr'), [0x14])
+        self.assertTrue(os.path.exists(search.index_path(self.path)))
+        self.assertEqual(self.find(True, mnemonic='sw', rs=29), [0x0])
+        # A rewritten image makes the index stale
+        with open(self.path, 'wb') as f:
+            f.write(Assembler().assemble_lines(['jr $ra', 'jr $ra']))
+        os.utime(self.path, ns=(0, 1))
+        self.assertIsNone(search.read_index(self.path))
+        self.assertEqual(self.find(True, mnemonic='jr'), [0x0, 0x4])
+
+
+class TestBenchmarkSources(unittest.TestCase):
+    """Test the benchmark source synthesizer"""
+
+    def test_synthesized_source_roundtrips(self):
+        for shape in bench.SHAPES:
+            lines = list(bench.synthesize_lines(500, shape, seed=1))
+            self.assertEqual(len(lines), 500)
+            code = Assembler().assemble_lines(lines)
+            disassembled = Disassembler().disassemble_bytes(code)
+            self.assertEqual(Assembler().assemble_lines(disassembled), code)
+
+    def test_main_reexports_library(self):
+        import main
+        self.assertIs(main.Assembler, Assembler)
+        self.assertIs(main.Disassembler, Disassembler)
+
+    def test_cli_loads_subsystems_lazily(self):
+        imports = bench.import_profile()
+        self.assertEqual(imports['eager'], [])
+        # The package itself is library-only: no CLI, no argparse
+        self.assertEqual(imports['library'], [])
+
+    def test_mix_is_normalized(self):
+        mix = bench.parse_mix('r=2,i=1,j=1')
+        self.assertAlmostEqual(mix['r'], 0.5)
+        self.assertAlmostEqual(sum(mix.values()), 1.0)
+
+
+class TestFuzzer(unittest.TestCase):
+    """Test the roundtrip fuzzer"""
+
+    def test_batches_roundtrip(self):
+        for mode in fuzz.CHECKS:
+            checked, failures = fuzz.CHECKS[mode](0, 0, 2000)
+            self.assertEqual(checked, 2000)
+            self.assertEqual(failures, [])
+
+    def test_words_cover_every_instruction(self):
+        words = fuzz.random_words(random.Random(0), 2000)
+        names = {fuzz.mnemonic_of(word) for word in words}
+        self.assertEqual(names, set(ENCODERS))
+
+    def test_minimize_keeps_instruction(self):
+        # unknown_r never reassembles; funct 1 is the smallest unknown one
+        word, address = fuzz.minimize(0x012A403F, 0x1000)
+        self.assertEqual((word, address), (0x00000001, 0))
+
+
 class TestFileIO(unittest.TestCase):
     """Test file-based assembly and disassembly"""
 
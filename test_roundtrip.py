@@ -4,38 +4,39 @@ Run with: python3 test_roundtrip.py
 """
 
 import os
-import tempfile
-from main import Assembler, Disassembler
+from mips import Assembler, Disassembler
+from mips import diff
 
 
-def test_roundtrip(input_file):
-    """Test that assembling, disassembling, and reassembling produces identical binary."""
-    name = os.path.basename(input_file).replace('.asm', '')
+def roundtrip(input_file):
+    """Assemble, disassemble and reassemble a source, returning both binaries."""
+    with open(input_file, 'r') as f:
+        source = f.read()
+
+    # Step 1: Assemble original
+    original_data = Assembler().assemble_text(source)
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        original_bin = os.path.join(tmpdir, f'{name}_original.bin')
-        disasm_asm = os.path.join(tmpdir, f'{name}_disasm.asm')
-        reassembled_bin = os.path.join(tmpdir, f'{name}_reassembled.bin')
+    # Step 2: Disassemble
+    disassembled = Disassembler().disassemble_bytes(original_data)
 
-        # Step 1: Assemble original
-        asm = Assembler()
-        asm.assemble(input_file, original_bin)
+    # Step 3: Reassemble
+    reassembled_data = Assembler().assemble_lines(disassembled)
 
-        # Step 2: Disassemble
-        disasm = Disassembler()
-        disasm.disassemble(original_bin, disasm_asm)
+    return original_data, reassembled_data
 
-        # Step 3: Reassemble
-        asm2 = Assembler()
-        asm2.assemble(disasm_asm, reassembled_bin)
 
-        # Step 4: Compare binaries
-        with open(original_bin, 'rb') as f:
-            original_data = f.read()
-        with open(reassembled_bin, 'rb') as f:
-            reassembled_data = f.read()
+def test_roundtrip(input_file):
+    """Test that assembling, disassembling, and reassembling produces identical binary."""
+    original_data, reassembled_data = roundtrip(input_file)
+    return original_data == reassembled_data
+
 
-        return original_data == reassembled_data
+def print_differences(input_file):
+    """Show the instructions that changed across the roundtrip."""
+    original_data, reassembled_data = roundtrip(input_file)
+    for hunk in diff.diff_words(original_data, reassembled_data):
+        for line in diff.format_hunk(original_data, reassembled_data, hunk):
+            print(f"    {line}")
 
 
 def main():
@@ -53,6 +54,7 @@ def main():
                 passed += 1
             else:
                 print("FAILED")
+                print_differences('fizzbuzz.asm')
                 failed += 1
         except Exception as e:
             print(f"ERROR: {e}")
@@ -70,6 +72,7 @@ def main():
                         passed += 1
                     else:
                         print("FAILED")
+                        print_differences(filepath)
                         failed += 1
                 except Exception as e:
                     print(f"ERROR: {e}")